@@ -1,12 +1,39 @@
-app.py# app.py - SOT TDM System - Fixed for Deployment
+# app.py - SOT TDM System - Fixed for Deployment
+from startup import startup
 import os
+import time
 import secrets
-from datetime import datetime
-from flask import Flask, request, jsonify, session, redirect, url_for, render_template_string
+from datetime import datetime, timezone
+from flask import Flask, request, jsonify, session, redirect, url_for, render_template_string, g, Response
 from flask_cors import CORS
-from config import logger, bot_active
-from database import init_db, fix_existing_keys, validate_api_key, get_global_stats, get_leaderboard, get_db_connection
-from discord_bot import test_discord_token, register_commands, handle_interaction
+from config import (
+    logger, DISCORD_GUILD_ID, METRICS_TOKEN, SQL_PROFILER,
+    SCHEDULER_ENABLED, DB_OPTIMIZE_INTERVAL, WAL_CHECKPOINT_INTERVAL, TICKET_SWEEP_INTERVAL,
+    ORPHAN_TICKET_MINUTES, METRICS_FLUSH_INTERVAL, INTERACTION_CACHE_TTL, HEALTH_CHECK_INTERVAL,
+    BALANCE_MAX_PLAYERS, HISTORY_MAX_POINTS, PERCENTILE_REFRESH_INTERVAL, LEADERBOARD_MAX_LIMIT,
+    SEASON_ARCHIVE_INTERVAL, season_bounds
+)
+from database import (
+    init_db, fix_existing_keys, validate_api_key, get_global_stats, get_leaderboard, get_db_connection,
+    optimize_database, checkpoint_wal, sweep_orphan_tickets,
+    is_bot_active, purge_shared_claims, backfill_derived_tables, finish_match, get_lobby_players,
+    get_player_history, HISTORY_STEPS, bump_version, get_leaderboard_page, LEADERBOARD_SQL,
+    get_window_leaderboard_page, WINDOW_SQL, get_head_to_head
+)
+from ratings import replay_ratings
+from balancer import balance_players
+from percentiles import player_percentiles, refresh_percentiles
+from stats_snapshot import stats_snapshot, refresh_stats_snapshot
+from window_boards import window_boards, refresh_window_boards, WINDOWS
+from seasons import archive_seasons, archived_seasons, get_season_leaderboard_page, SEASON_METRICS
+from circuit_breaker import get_breaker_states
+from concurrency import bot_budget, run_in_background
+from metrics import begin_request, end_request, render_prometheus, flush_worker_metrics
+from scheduler import scheduler
+from health import health_checker, UNHEALTHY
+from sql_profiler import profiler
+from tracing import begin_trace, end_trace, get_traces, get_trace
+# discord_bot (and requests under it) is imported on first use so it stays off the cold start path
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(32))
@@ -20,6 +47,8 @@ CORS(app, supports_credentials=True)
 # Get port from environment or use default
 port = int(os.environ.get("PORT", 10000))
 
+startup.record('imports', startup.started)
+
 # =============================================================================
 # UTILITY FUNCTIONS
 # =============================================================================
@@ -51,11 +80,46 @@ def delete_player(player_id):
         conn.execute('DELETE FROM players WHERE id = ?', (player_id,))
         conn.commit()
         conn.close()
+        stats_snapshot.remove_player(player_id, bump_version('player_stats'))
         return True
     except Exception as e:
         logger.error(f"Error deleting player {player_id}: {e}")
         return False
 
+# =============================================================================
+# REQUEST METRICS AND TRACING
+# =============================================================================
+
+@app.before_request
+def start_request_metrics():
+    """Start per-request latency, DB and Discord timing and the request's trace"""
+    g.metrics_endpoint = request.endpoint or 'unmatched'
+    begin_request(g.metrics_endpoint)
+    begin_trace(g.metrics_endpoint, request.method, request.path)
+
+@app.after_request
+def record_response_status(response):
+    """Remember the status for the teardown hook"""
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    """Record the request, including ones that raised"""
+    if 'metrics_endpoint' in g:
+        status = g.get('metrics_status', 500)
+        end_request(g.metrics_endpoint, request.method, status)
+        end_trace(status)
+
+@app.before_request
+def require_ready():
+    """Hold traffic with a 503 until the schema exists"""
+    if startup.ready or request.endpoint in ['health', 'ready', 'prometheus_metrics']:
+        return
+    response = jsonify({"success": False, "error": "Starting up, try again shortly"})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 # =============================================================================
 # SESSION MANAGEMENT
 # =============================================================================
@@ -63,7 +127,7 @@ def delete_player(player_id):
 @app.before_request
 def before_request():
     """Check session before each request"""
-    if request.endpoint in ['home', 'api_validate_key', 'health', 'api_stats', 'api_leaderboard', 'logout', 'interactions']:
+    if request.endpoint in ['home', 'api_validate_key', 'health', 'api_stats', 'api_leaderboard', 'logout', 'interactions', 'prometheus_metrics', 'ready', 'api_report_match', 'api_balance_teams', 'api_player_history', 'api_seasons', 'api_season_leaderboard', 'api_head_to_head']:
         return
     
     if 'user_key' not in session:
@@ -348,7 +412,7 @@ def home():
         </script>
     </body>
     </html>
-    ''', bot_active=bot_active)
+    ''', bot_active=is_bot_active())
 
 @app.route('/api/validate-key', methods=['POST'])
 def api_validate_key():
@@ -412,6 +476,7 @@ def dashboard():
     kd = total_kills / total_deaths
     total_games = wins + losses
     win_rate = (wins / total_games * 100) if total_games > 0 else 0
+    standing = player_percentiles.standing(total_kills, total_deaths, wins, losses)
     
     # Get leaderboard
     leaderboard_data = get_leaderboard(10)
@@ -698,12 +763,14 @@ def dashboard():
                     <div class="stat-label">K/D Ratio</div>
                     <div class="stat-value">{{ "%.2f"|format(kd) }}</div>
                     <div class="stat-detail">{{ total_kills }} kills / {{ total_deaths }} deaths</div>
+                    {% if standing.kd %}<div class="stat-detail">Top {{ standing.kd }}% K/D · top {{ standing.kills }}% kills</div>{% endif %}
                 </div>
                 
                 <div class="stat-card">
                     <div class="stat-label">Win Rate</div>
                     <div class="stat-value">{{ "%.1f"|format(win_rate) }}%</div>
                     <div class="stat-detail">{{ wins }} wins / {{ losses }} losses</div>
+                    {% if standing.win_rate %}<div class="stat-detail">Top {{ standing.win_rate }}% of players</div>{% endif %}
                 </div>
                 
                 <div class="stat-card">
@@ -807,8 +874,8 @@ def dashboard():
     </html>
     ''', user_data=user_data, session=session, leaderboard_data=leaderboard_data, 
         total_kills=total_kills, total_deaths=total_deaths, wins=wins, losses=losses,
-        kd=kd, total_games=total_games, win_rate=win_rate, user_rank=user_rank,
-        bot_active=bot_active)
+        kd=kd, total_games=total_games, win_rate=win_rate, user_rank=user_rank, standing=standing,
+        bot_active=is_bot_active())
 
 @app.route('/admin')
 def admin_dashboard():
@@ -1153,7 +1220,7 @@ def admin_dashboard():
     </body>
     </html>
     ''', total_players=total_players, total_kills=total_kills, total_games=total_games, 
-        admins=admins, players=players, bot_active=bot_active)
+        admins=admins, players=players, bot_active=is_bot_active())
 
 @app.route('/admin/players/<int:player_id>', methods=['DELETE'])
 def admin_delete_player(player_id):
@@ -1168,23 +1235,90 @@ def admin_delete_player(player_id):
     else:
         return jsonify({"success": False, "error": "Failed to delete player"})
 
+@app.route('/admin/sql-profile')
+def admin_sql_profile():
+    """SQL statement profile (admin only, needs SQL_PROFILER=1)"""
+    if 'user_data' not in session or not session['user_data'].get('is_admin'):
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    
+    if not SQL_PROFILER:
+        return jsonify({"success": False, "error": "SQL profiler is disabled; set SQL_PROFILER=1"}), 404
+    
+    sort = request.args.get('sort', 'total_ms')
+    limit = request.args.get('limit', 50, type=int)
+    statements = profiler.report(sort, limit)
+    
+    if request.args.get('reset'):
+        profiler.reset()
+    
+    return jsonify({"success": True, "statements": statements})
+
+@app.route('/admin/ratings/replay', methods=['POST'])
+def admin_replay_ratings():
+    """Recompute every rating from the match history (admin only)"""
+    if 'user_data' not in session or not session['user_data'].get('is_admin'):
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    
+    try:
+        summary = replay_ratings(get_db_connection())
+        # Every rating moved; workers reload their snapshots
+        bump_version('player_stats')
+        return jsonify({"success": True, "replay": summary})
+    except Exception as e:
+        logger.error(f"Rating replay error: {e}")
+        return jsonify({"success": False, "error": "Replay failed"}), 500
+
+@app.route('/admin/seasons/archive', methods=['POST'])
+def admin_archive_seasons():
+    """Archive every finished season now instead of waiting for the job (admin only)"""
+    if 'user_data' not in session or not session['user_data'].get('is_admin'):
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    
+    archived = archive_seasons()
+    if archived is None:
+        return jsonify({"success": False, "error": "Archive failed"}), 500
+    return jsonify({"success": True, "archived": archived})
+
+@app.route('/admin/traces')
+def admin_traces():
+    """Recent kept traces, newest first (admin only)"""
+    if 'user_data' not in session or not session['user_data'].get('is_admin'):
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    
+    limit = request.args.get('limit', 50, type=int)
+    min_ms = request.args.get('min_ms', 0, type=float)
+    return jsonify({"success": True, "traces": get_traces(limit, min_ms)})
+
+@app.route('/admin/traces/<trace_id>')
+def admin_trace(trace_id):
+    """One trace with all of its spans (admin only)"""
+    if 'user_data' not in session or not session['user_data'].get('is_admin'):
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    
+    trace = get_trace(trace_id)
+    if not trace:
+        return jsonify({"success": False, "error": "Trace not found"}), 404
+    return jsonify({"success": True, "trace": trace})
+
 # =============================================================================
 # API ENDPOINTS
 # =============================================================================
 
 @app.route('/api/stats')
 def api_stats():
-    """Get global stats"""
+    """Get global stats, or one guild's with ?guild="""
     try:
-        stats = get_global_stats()
+        guild = request.args.get('guild') or None
+        stats = get_global_stats(guild)
         return jsonify({
             "status": "success",
             "data": {
+                "guild": guild,
                 "total_players": stats['total_players'],
                 "total_kills": stats['total_kills'],
                 "total_games": stats['total_games'],
                 "avg_kd": stats['avg_kd'],
-                "bot_active": bot_active
+                "bot_active": is_bot_active()
             },
             "timestamp": datetime.utcnow().isoformat()
         })
@@ -1197,9 +1331,37 @@ def api_stats():
 
 @app.route('/api/leaderboard')
 def api_leaderboard():
-    """Get leaderboard data"""
+    """Get a leaderboard page: ?metric=kd|kills|wins|winrate|prestige|rating&offset=&limit=&guild=
+    
+    &window=day|week|season ranks by that window's matches (kd, kills, wins, winrate)
+    instead of lifetime totals.
+    """
+    window = request.args.get('window') or None
+    if window is not None and window not in WINDOWS:
+        return jsonify({
+            "status": "error",
+            "message": f"window must be one of {', '.join(WINDOWS)}"
+        }), 400
+    metrics = WINDOW_SQL if window else LEADERBOARD_SQL
+    metric = request.args.get('metric') or request.args.get('sort') or ('kills' if window else 'kd')
+    if metric not in metrics:
+        return jsonify({
+            "status": "error",
+            "message": f"metric must be one of {', '.join(metrics)}"
+        }), 400
+    
     try:
-        leaderboard = get_leaderboard(10)
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 10)), 1), LEADERBOARD_MAX_LIMIT)
+    except ValueError:
+        return jsonify({"status": "error", "message": "offset and limit must be integers"}), 400
+    guild = request.args.get('guild') or None
+    
+    try:
+        if window:
+            total, leaderboard = get_window_leaderboard_page(window, metric, offset, limit, guild)
+        else:
+            total, leaderboard = get_leaderboard_page(metric, offset, limit, guild)
         
         # Remove API keys from response for security
         for player in leaderboard:
@@ -1208,6 +1370,11 @@ def api_leaderboard():
         
         return jsonify({
             "status": "success",
+            "metric": metric,
+            "window": window,
+            "offset": offset,
+            "limit": limit,
+            "total": total,
             "data": leaderboard,
             "timestamp": datetime.utcnow().isoformat()
         })
@@ -1218,30 +1385,220 @@ def api_leaderboard():
             "message": "Failed to get leaderboard"
         }), 500
 
-@app.route('/health')
-def health():
-    """Health check endpoint"""
+@app.route('/api/h2h')
+def api_head_to_head():
+    """One player's record against another: ?a=<discord id>&b=<discord id>"""
+    player_a, player_b = request.args.get('a'), request.args.get('b')
+    if not player_a or not player_b or player_a == player_b:
+        return jsonify({"status": "error", "message": "a and b must be two different player ids"}), 400
+    
+    record = get_head_to_head(player_a, player_b)
+    if record is None:
+        return jsonify({"status": "error", "message": "These players haven't played against each other"}), 404
+    return jsonify({"status": "success", "data": record})
+
+@app.route('/api/seasons')
+def api_seasons():
+    """The current season and every archived one"""
+    number, starts_at, ends_at = season_bounds()
     try:
-        # Test database connection
-        conn = get_db_connection()
-        conn.execute('SELECT 1')
-        conn.close()
-        
-        return jsonify({
-            "status": "healthy",
-            "service": "SOT TDM System",
-            "bot_active": bot_active,
-            "database": "connected",
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        archived = archived_seasons(get_db_connection())
     except Exception as e:
-        logger.error(f"Health check error: {e}")
+        logger.error(f"API seasons error: {e}")
+        return jsonify({"status": "error", "message": "Failed to get seasons"}), 500
+    
+    return jsonify({
+        "status": "success",
+        "current": {"number": number, "starts_at": starts_at, "ends_at": ends_at},
+        "archived": archived
+    })
+
+@app.route('/api/seasons/<int:number>/leaderboard')
+def api_season_leaderboard(number):
+    """A season's leaderboard: ?metric=kills|kd|wins|winrate|rating&offset=&limit=
+    
+    The current season comes from the rolling season board (rating from the
+    live ratings); finished ones from their archive file.
+    """
+    metric = request.args.get('metric') or 'kills'
+    if metric not in SEASON_METRICS:
         return jsonify({
-            "status": "unhealthy",
-            "service": "SOT TDM System",
-            "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
-        }), 500
+            "status": "error",
+            "message": f"metric must be one of {', '.join(SEASON_METRICS)}"
+        }), 400
+    
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 10)), 1), LEADERBOARD_MAX_LIMIT)
+    except ValueError:
+        return jsonify({"status": "error", "message": "offset and limit must be integers"}), 400
+    
+    current = season_bounds()[0]
+    if number == current and metric == 'rating':
+        total, leaderboard = get_leaderboard_page('rating', offset, limit)
+        for player in leaderboard:
+            player.pop('api_key', None)
+    elif number == current:
+        total, leaderboard = get_window_leaderboard_page('season', metric, offset, limit)
+    else:
+        page = get_season_leaderboard_page(number, metric, offset, limit)
+        if page is None:
+            return jsonify({"status": "error", "message": f"Season {number} is not archived"}), 404
+        total, leaderboard = page
+    
+    return jsonify({
+        "status": "success",
+        "season": number,
+        "metric": metric,
+        "offset": offset,
+        "limit": limit,
+        "total": total,
+        "data": leaderboard,
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+def parse_match_time(value):
+    """ISO 8601 (a trailing Z or any offset) -> UTC 'YYYY-MM-DD HH:MM:SS', None if absent, False if malformed
+    
+    matches.ended_at is compared as text (season archiving), so it's always stored in this form.
+    """
+    if value in (None, ''):
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    except ValueError:
+        return False
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+@app.route('/api/matches', methods=['POST'])
+def api_report_match():
+    """Report a finished match (game server, authenticated with an admin API key)"""
+    reporter = validate_api_key(request.headers.get('X-API-Key', '').strip().upper())
+    if not reporter or not reporter.get('is_admin'):
+        return jsonify({"success": False, "error": "Admin API key required"}), 403
+    
+    data = request.get_json(silent=True) or {}
+    match_id = str(data.get('match_id', '')).strip()
+    stats = data.get('stats') or []
+    if not match_id or not stats:
+        return jsonify({"success": False, "error": "match_id and stats are required"}), 400
+    
+    try:
+        team1 = data.get('team1_players') or [str(s['player_id']) for s in stats if int(s['team']) == 1]
+        team2 = data.get('team2_players') or [str(s['player_id']) for s in stats if int(s['team']) == 2]
+        team1_score = int(data.get('team1_score', 0))
+        team2_score = int(data.get('team2_score', 0))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"success": False, "error": "Malformed stats"}), 400
+    
+    started_at, ended_at = parse_match_time(data.get('started_at')), parse_match_time(data.get('ended_at'))
+    if started_at is False or ended_at is False:
+        return jsonify({"success": False, "error": "started_at and ended_at must be ISO 8601 timestamps"}), 400
+    
+    changes = finish_match(match_id, team1, team2, team1_score, team2_score, stats, started_at, ended_at)
+    if changes is False:
+        return jsonify({"success": False, "error": "Could not record match"}), 500
+    if changes is None:
+        return jsonify({"success": True, "duplicate": True})
+    
+    conn = get_db_connection()
+    version = bump_version('player_stats')
+    player_ids = [str(p) for p in team1 + team2]
+    player_percentiles.observe_players(conn, player_ids, version)
+    stats_snapshot.refresh_players(conn, player_ids, version)
+    window_boards.refresh_players(conn, player_ids, version)
+    
+    from discord_bot import send_score_update
+    run_in_background('score_webhook', send_score_update, match_id, team1_score, team2_score, team1, team2)
+    return jsonify({"success": True, "ratings": changes})
+
+@app.route('/api/teams/balance', methods=['POST'])
+def api_balance_teams():
+    """Split registered players into two even teams by rating or K/D"""
+    data = request.get_json(silent=True) or {}
+    player_ids = list(dict.fromkeys(str(pid) for pid in data.get('players') or []))
+    metric = data.get('metric', 'rating')
+    
+    if metric not in ('rating', 'kd'):
+        return jsonify({"success": False, "error": "metric must be rating or kd"}), 400
+    if len(player_ids) < 2 or len(player_ids) > BALANCE_MAX_PLAYERS:
+        return jsonify({"success": False, "error": f"Send between 2 and {BALANCE_MAX_PLAYERS} player ids"}), 400
+    
+    players = get_lobby_players(player_ids)
+    found = {player['discord_id'] for player in players}
+    missing = [pid for pid in player_ids if pid not in found]
+    if missing:
+        return jsonify({"success": False, "error": "Unknown players", "missing": missing}), 404
+    
+    return jsonify(dict(balance_players(players, metric), success=True))
+
+RANGE_UNITS = {'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+def parse_range(value, default='30d'):
+    """'24h', '7d', '12w' -> seconds, or None if malformed"""
+    value = (value or default).strip().lower()
+    if len(value) < 2 or value[-1] not in RANGE_UNITS or not value[:-1].isdigit():
+        return None
+    return int(value[:-1]) * RANGE_UNITS[value[-1]]
+
+@app.route('/api/players/<player_id>/history')
+def api_player_history(player_id):
+    """A player's stats over time, read from the coarsest-needed rollup"""
+    span_seconds = parse_range(request.args.get('range'))
+    if not span_seconds:
+        return jsonify({"success": False, "error": "range must look like 24h, 30d or 12w"}), 400
+    
+    step = request.args.get('step', 'auto')
+    if step == 'auto':
+        # Finest rollup that fits in HISTORY_MAX_POINTS buckets
+        step = next((name for name, width in HISTORY_STEPS.items()
+                     if span_seconds / width <= HISTORY_MAX_POINTS), 'week')
+    elif step != 'match' and step not in HISTORY_STEPS:
+        return jsonify({"success": False, "error": f"step must be auto, match or one of {', '.join(HISTORY_STEPS)}"}), 400
+    elif step in HISTORY_STEPS and span_seconds / HISTORY_STEPS[step] > HISTORY_MAX_POINTS:
+        return jsonify({"success": False, "error": f"More than {HISTORY_MAX_POINTS} points; use a coarser step"}), 400
+    
+    since = int(time.time()) - span_seconds
+    # One extra point tells whether the per-match history was cut short
+    points = get_player_history(player_id, since, step, HISTORY_MAX_POINTS + 1)
+    truncated = len(points) > HISTORY_MAX_POINTS
+    return jsonify({
+        "success": True,
+        "player_id": player_id,
+        "step": step,
+        "since": datetime.utcfromtimestamp(since).isoformat(),
+        "points": points[-HISTORY_MAX_POINTS:],
+        "truncated": truncated
+    })
+
+@app.route('/health')
+def health():
+    """Health check endpoint (liveness), served from the background checker; ?deep=1 checks inline"""
+    result = health_checker.get(deep=request.args.get('deep') == '1')
+    return jsonify(dict(
+        result,
+        service="SOT TDM System",
+        bot_active=result["checks"]["bot"].get("active", False),
+        discord_breakers=get_breaker_states(),
+        bot_budget=bot_budget.snapshot(),
+        scheduler=scheduler.get_stats(),
+        timestamp=datetime.utcnow().isoformat()
+    )), 503 if result["status"] == UNHEALTHY else 200
+
+@app.route('/ready')
+def ready():
+    """Readiness: 200 once the schema exists, with the startup phase report"""
+    report = startup.snapshot()
+    return jsonify(dict(report, status="ready" if report["ready"] else "starting")), 200 if report["ready"] else 503
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus metrics, merged across threads and workers"""
+    if METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+        return jsonify({"error": "Unauthorized"}), 401
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
 
 # =============================================================================
 # DISCORD INTERACTIONS ENDPOINT
@@ -1250,6 +1607,8 @@ def health():
 @app.route('/interactions', methods=['POST'])
 def interactions():
     """Handle Discord interactions"""
+    from discord_bot import handle_interaction
+    
     try:
         data = request.json
         if not data:
@@ -1265,52 +1624,101 @@ def interactions():
 # STARTUP - DELAYED INITIALIZATION
 # =============================================================================
 
-def initialize_system():
-    """Initialize system components after app is ready"""
-    import time
-    import threading
-    
-    def startup_task():
-        """Run startup tasks in background"""
-        time.sleep(2)  # Wait for app to be fully ready
+def purge_interaction_cache():
+    from discord_bot import purge_interaction_cache
+    return purge_interaction_cache()
+
+def start_scheduler():
+    """Register periodic maintenance; DB jobs run once per host, the rest in every worker"""
+    scheduler.add('optimize_database', optimize_database, DB_OPTIMIZE_INTERVAL)
+    scheduler.add('checkpoint_wal', checkpoint_wal, WAL_CHECKPOINT_INTERVAL)
+    # Startup doesn't wait on the history backfills; a no-op once they've run
+    scheduler.add('backfill_derived_tables', backfill_derived_tables, SEASON_ARCHIVE_INTERVAL, initial_delay=5)
+    scheduler.add('archive_seasons', archive_seasons, SEASON_ARCHIVE_INTERVAL, initial_delay=300)
+    scheduler.add('sweep_orphan_tickets', lambda: sweep_orphan_tickets(ORPHAN_TICKET_MINUTES),
+                  TICKET_SWEEP_INTERVAL, initial_delay=60)
+    scheduler.add('purge_interaction_cache', purge_interaction_cache, 60, leader_only=False)
+    scheduler.add('purge_shared_claims', lambda: purge_shared_claims(INTERACTION_CACHE_TTL), 300)
+    # Every worker answers /health from its own cached results
+    scheduler.add('health_checks', health_checker.refresh, HEALTH_CHECK_INTERVAL,
+                  leader_only=False, initial_delay=0)
+    # Keeps /metrics fresh for workers that sit idle between requests
+    scheduler.add('refresh_percentiles', refresh_percentiles, PERCENTILE_REFRESH_INTERVAL,
+                  leader_only=False, initial_delay=0)
+    scheduler.add('refresh_stats_snapshot', refresh_stats_snapshot, PERCENTILE_REFRESH_INTERVAL,
+                  leader_only=False, initial_delay=0)
+    scheduler.add('refresh_window_boards', refresh_window_boards, PERCENTILE_REFRESH_INTERVAL,
+                  leader_only=False, initial_delay=0)
+    scheduler.add('flush_worker_metrics', flush_worker_metrics, METRICS_FLUSH_INTERVAL * 5,
+                  jitter=0.2, leader_only=False)
+    scheduler.start()
+
+def deferred_startup(schema_ready):
+    """Startup work that doesn't gate traffic: key fixes and Discord checks"""
+    try:
+        attempt = 1
+        while not schema_ready and attempt < 5:
+            time.sleep(attempt)
+            with startup.phase('schema_retry'):
+                schema_ready = init_db()
+            attempt += 1
+        if not schema_ready:
+            logger.error("❌ Database schema could not be created - staying unready")
+            return
+        startup.mark_ready()
         
-        try:
-            # Initialize database
-            logger.info("🔄 Initializing database...")
-            init_db()
-            
-            # Fix any existing API keys
+        with startup.phase('fix_keys'):
             fixed_keys = fix_existing_keys()
-            if fixed_keys > 0:
-                logger.info(f"✅ Fixed {fixed_keys} API keys")
-            
-            # Test Discord connection
-            logger.info("🔄 Testing Discord connection...")
+        if fixed_keys > 0:
+            logger.info(f"✅ Fixed {fixed_keys} API keys")
+        
+        with startup.phase('discord_import'):
+            from discord_bot import test_discord_token, register_commands
+        
+        logger.info("🔄 Testing Discord connection...")
+        with startup.phase('discord_check'):
             bot_status = test_discord_token()
-            
-            if bot_status:
-                logger.info("✅ Discord bot connected")
-                
-                # Register commands (non-blocking)
-                def register_commands_task():
-                    time.sleep(1)
-                    if register_commands():
-                        logger.info("✅ Discord commands registered")
-                    else:
-                        logger.warning("⚠️ Failed to register Discord commands")
-                
-                threading.Thread(target=register_commands_task, daemon=True).start()
+        
+        if bot_status:
+            logger.info("✅ Discord bot connected")
+            # Skipped when the command definitions are unchanged
+            with startup.phase('register_commands'):
+                registered = register_commands(DISCORD_GUILD_ID or None)
+            if registered:
+                logger.info("✅ Discord commands registered")
             else:
-                logger.warning("⚠️ Discord bot offline - continuing without bot features")
-            
-            logger.info(f"✅ SOT TDM System initialized on port {port}")
-            
-        except Exception as e:
-            logger.error(f"❌ Startup error: {e}")
-            logger.info("⚠️ System started with reduced functionality")
+                logger.warning("⚠️ Failed to register Discord commands")
+        else:
+            logger.warning("⚠️ Discord bot offline - continuing without bot features")
+        
+        logger.info(f"✅ SOT TDM System initialized on port {port}: {startup.summary()}")
+        
+    except Exception as e:
+        logger.error(f"❌ Startup error: {e}")
+        logger.info("⚠️ System started with reduced functionality")
+
+def initialize_system():
+    """Create the schema before serving; defer everything that can wait"""
+    import atexit
+    import threading
+    
+    # CREATE IF NOT EXISTS is a few milliseconds, so the first request always has tables
+    logger.info("🔄 Initializing database...")
+    with startup.phase('schema'):
+        schema_ready = init_db()
+    if schema_ready:
+        startup.mark_ready()
+    
+    if SCHEDULER_ENABLED:
+        with startup.phase('scheduler'):
+            start_scheduler()
+        atexit.register(scheduler.stop)
+    
+    if SQL_PROFILER:
+        atexit.register(profiler.dump)
     
-    # Start background initialization
-    threading.Thread(target=startup_task, daemon=True).start()
+    threading.Thread(target=deferred_startup, args=(schema_ready,), name='startup', daemon=True).start()
+    logger.info(f"🚀 Startup {(time.perf_counter() - startup.started) * 1000:.0f}ms: {startup.summary()}")
 
 # Initialize system when app starts
 initialize_system()
@@ -0,0 +1,185 @@
+# balancer.py - Split a lobby into two even teams of near-equal strength
+"""
+Team sizes differ by at most one and the objective is the smallest gap between
+the teams' total strength (a rating or a K/D per player).
+
+Lobbies up to BALANCE_EXACT_LIMIT players are solved exactly by meeting in the
+middle: each half of the lobby enumerates its subsets by size, and every
+subset of the first half is paired with the closest-summing subset of the
+second that completes a team. Larger lobbies use the balanced
+Karmarkar-Karp differencing heuristic followed by pairwise-swap local search.
+"""
+import time
+import heapq
+from bisect import bisect_left
+from itertools import combinations
+from config import BALANCE_EXACT_LIMIT
+
+def team_gap(values, team1):
+    """Absolute difference between team1's total and everyone else's"""
+    total = sum(values)
+    picked = sum(values[i] for i in team1)
+    return abs(total - 2 * picked)
+
+# =============================================================================
+# EXACT
+# =============================================================================
+
+def brute_force(values):
+    """Try every team; the reference the faster methods are measured against"""
+    n = len(values)
+    total = sum(values)
+    size = (n + 1) // 2
+    if n % 2:
+        teams = combinations(range(n), size)
+    else:
+        # Fixing player 0 on team 1 skips mirror images
+        teams = ((0,) + rest for rest in combinations(range(1, n), size - 1))
+    best, best_team = None, None
+    for team1 in teams:
+        gap = abs(total - 2 * sum(values[i] for i in team1))
+        if best is None or gap < best:
+            best, best_team = gap, team1
+    return list(best_team)
+
+def subset_sums(values, offset):
+    """Every subset of values as {size: [(sum, mask), ...]} sorted by sum"""
+    by_size = {}
+    count = len(values)
+    sums = [0.0] * (1 << count)
+    sizes = [0] * (1 << count)
+    for mask in range(1, 1 << count):
+        low = mask & -mask
+        bit = low.bit_length() - 1
+        sums[mask] = sums[mask ^ low] + values[bit]
+        sizes[mask] = sizes[mask ^ low] + 1
+    for mask in range(1 << count):
+        by_size.setdefault(sizes[mask], []).append((sums[mask], mask << offset))
+    for entries in by_size.values():
+        entries.sort()
+    return by_size
+
+def meet_in_the_middle(values):
+    """Exact even split in O(2^(n/2) * n) instead of C(n, n/2)"""
+    n = len(values)
+    size = (n + 1) // 2
+    half = n // 2
+    target = sum(values) / 2
+    left = subset_sums(values[:half], 0)
+    right = subset_sums(values[half:], half)
+    right_keys = {k: [s for s, _ in entries] for k, entries in right.items()}
+    
+    best, best_mask = None, 0
+    for k, entries in left.items():
+        need = size - k
+        if need not in right:
+            continue
+        keys, candidates = right_keys[need], right[need]
+        for left_sum, left_mask in entries:
+            i = bisect_left(keys, target - left_sum)
+            for j in (i - 1, i):
+                if 0 <= j < len(keys):
+                    gap = abs(target - left_sum - keys[j])
+                    if best is None or gap < best:
+                        best, best_mask = gap, left_mask | candidates[j][1]
+    return [i for i in range(n) if best_mask >> i & 1]
+
+# =============================================================================
+# HEURISTIC
+# =============================================================================
+
+def karmarkar_karp(values):
+    """Balanced largest differencing: keeps team sizes even while differencing"""
+    order = sorted(range(len(values)), key=lambda i: values[i], reverse=True)
+    if len(order) % 2:
+        order.append(None)  # a zero-strength ghost pads the odd player out
+    
+    # Each entry is (-difference, counter, heavier side, lighter side)
+    heap = []
+    for n, (a, b) in enumerate(zip(order[0::2], order[1::2])):
+        weight_b = values[b] if b is not None else 0.0
+        heapq.heappush(heap, (-(values[a] - weight_b), n, [a], [b] if b is not None else []))
+    counter = len(heap)
+    while len(heap) > 1:
+        diff1, _, heavy1, light1 = heapq.heappop(heap)
+        diff2, _, heavy2, light2 = heapq.heappop(heap)
+        # Put the larger difference against the smaller one
+        heapq.heappush(heap, (diff1 - diff2, counter, heavy1 + light2, light1 + heavy2))
+        counter += 1
+    team1, team2 = heap[0][2], heap[0][3]
+    return team1 if len(team1) >= len(team2) else team2
+
+def local_search(values, team1):
+    """Swap one player from each side while it narrows the gap"""
+    n = len(values)
+    team1 = set(team1)
+    gap = sum(values[i] for i in team1) * 2 - sum(values)
+    improved = True
+    while improved:
+        improved = False
+        best = abs(gap)
+        best_swap = None
+        for a in team1:
+            for b in range(n):
+                if b in team1:
+                    continue
+                moved = gap - 2 * (values[a] - values[b])
+                if abs(moved) < best - 1e-9:
+                    best, best_swap = abs(moved), (a, b)
+        if best_swap is not None:
+            a, b = best_swap
+            team1.remove(a)
+            team1.add(b)
+            gap -= 2 * (values[a] - values[b])
+            improved = True
+    return sorted(team1)
+
+# =============================================================================
+# ENTRY POINT
+# =============================================================================
+
+def balance(values):
+    """Split players (given by strength) into two teams
+    
+    Returns (team1_indices, team2_indices, gap, method); team 1 gets the extra
+    player in an odd lobby.
+    """
+    n = len(values)
+    if n < 2:
+        return list(range(n)), [], float(sum(values)), "trivial"
+    
+    values = [float(v) for v in values]
+    if n <= BALANCE_EXACT_LIMIT:
+        team1, method = meet_in_the_middle(values), "exact"
+    else:
+        team1, method = local_search(values, karmarkar_karp(values)), "karmarkar-karp"
+    
+    chosen = set(team1)
+    team2 = [i for i in range(n) if i not in chosen]
+    return sorted(team1), team2, team_gap(values, team1), method
+
+def balance_players(players, metric):
+    """Balance player rows (dicts with discord_id, name and the metric)
+    
+    Returns a JSON-ready summary of both teams.
+    """
+    started = time.perf_counter()
+    values = [player[metric] for player in players]
+    team1, team2, gap, method = balance(values)
+    
+    def side(indices):
+        total = sum(values[i] for i in indices)
+        return {
+            "players": [players[i] for i in indices],
+            "total": round(total, 2),
+            "mean": round(total / len(indices), 2) if indices else 0.0
+        }
+    
+    return {
+        "metric": metric,
+        "method": method,
+        "team1": side(team1),
+        "team2": side(team2),
+        "difference": round(gap, 2),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+    }
@@ -0,0 +1,98 @@
+# bench/balance_bench.py - Team balancer speed and quality against brute force
+"""
+For each lobby size, balances random lobbies with brute force, the exact
+meet-in-the-middle search and Karmarkar-Karp with local search, and reports
+p50/max latency plus how far each method's gap is from the optimum.
+
+    python -m bench.balance_bench --sizes 4-20 --lobbies 30 --json bench_balance.json
+
+Brute force is skipped above --brute-limit players; its cost doubles with
+every two players added.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from balancer import brute_force, meet_in_the_middle, karmarkar_karp, local_search, team_gap
+
+METHODS = {
+    "brute_force": brute_force,
+    "exact": meet_in_the_middle,
+    "karmarkar_karp": lambda values: local_search(values, karmarkar_karp(values))
+}
+
+def random_lobby(rng, size, metric):
+    if metric == 'kd':
+        return [round(rng.lognormvariate(0, 0.5), 2) for _ in range(size)]
+    return [round(rng.gauss(1500, 200), 1) for _ in range(size)]
+
+def parse_sizes(spec):
+    if '-' in spec:
+        low, high = spec.split('-')
+        return list(range(int(low), int(high) + 1))
+    return [int(size) for size in spec.split(',')]
+
+def run_size(size, lobbies, metric, brute_limit, rng):
+    """Time every method on the same lobbies; gaps are relative to the best found"""
+    samples = {name: [] for name in METHODS}
+    excess = {name: [] for name in METHODS}
+    
+    for _ in range(lobbies):
+        values = random_lobby(rng, size, metric)
+        gaps = {}
+        for name, method in METHODS.items():
+            if name == "brute_force" and size > brute_limit:
+                continue
+            started = time.perf_counter()
+            team1 = method(values)
+            samples[name].append((time.perf_counter() - started) * 1000)
+            gaps[name] = team_gap(values, team1)
+        # The exact search is the optimum whether or not brute force ran
+        optimum = gaps["exact"]
+        for name, gap in gaps.items():
+            excess[name].append(max(0.0, gap - optimum))
+    
+    result = {}
+    for name in METHODS:
+        if not samples[name]:
+            continue
+        times = sorted(samples[name])
+        result[name] = {
+            "p50_ms": round(times[len(times) // 2], 3),
+            "max_ms": round(times[-1], 3),
+            "optimal": sum(1 for e in excess[name] if e < 1e-6),
+            "mean_excess": round(sum(excess[name]) / len(excess[name]), 3)
+        }
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the team balancer against brute force")
+    parser.add_argument('--sizes', default='4-20', help="range like 4-20 or a list like 8,10,20")
+    parser.add_argument('--lobbies', type=int, default=30, help="random lobbies per size")
+    parser.add_argument('--metric', choices=['rating', 'kd'], default='rating')
+    parser.add_argument('--brute-limit', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="write results to this path")
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    results = {}
+    print(f"{'players':>7}  {'method':<15} {'p50 ms':>9} {'max ms':>9} {'optimal':>8} {'mean excess':>12}")
+    for size in parse_sizes(args.sizes):
+        results[size] = run_size(size, args.lobbies, args.metric, args.brute_limit, rng)
+        for name, row in results[size].items():
+            print(f"{size:>7}  {name:<15} {row['p50_ms']:>9.3f} {row['max_ms']:>9.3f} "
+                  f"{row['optimal']:>4}/{args.lobbies:<3} {row['mean_excess']:>12.3f}")
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"metric": args.metric, "lobbies": args.lobbies, "results": results}, f, indent=2)
+        print(f"Wrote {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+# bench/bench_suite.py - End-to-end benchmarks for database.py and the app routes
+"""
+Seeds a fresh database at each scale, then times the hot database functions
+and the main routes through Flask's test client.
+
+    python -m bench.bench_suite --scales 10k,100k --json bench_results.json
+    python -m bench.bench_suite --scales 10k --baseline bench_results.json
+
+With --baseline, every target is compared against the saved run and the
+command exits non-zero when one regresses by more than --threshold.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.seed_data import SCALES, seed
+
+def time_calls(func, iterations, warmup=2):
+    """Run func repeatedly and summarize its latency in milliseconds"""
+    for _ in range(warmup):
+        func()
+    
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "mean_ms": round(sum(samples) / len(samples), 3),
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "max_ms": round(samples[-1], 3)
+    }
+
+def run_scale(scale, iterations, workdir):
+    """Seed one scale and benchmark every target against it"""
+    import database
+    import app as app_module
+    
+    db_path = os.path.join(workdir, f"bench_{scale}.db")
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    
+    sizes = SCALES[scale]
+    database.close_db_connection()
+    counts = seed(db_path, sizes["players"], sizes["matches"], sizes["tickets"])
+    database.DATABASE = db_path
+    database.close_db_connection()
+    
+    conn = database.get_db_connection()
+    keys = [row['api_key'] for row in conn.execute('SELECT api_key FROM players')]
+    admin = conn.execute('SELECT * FROM players WHERE is_admin = 1 LIMIT 1').fetchone()
+    player = conn.execute('SELECT * FROM players WHERE is_admin = 0 LIMIT 1').fetchone()
+    rng = random.Random(7)
+    
+    client = app_module.app.test_client()
+    
+    def login(row):
+        with client.session_transaction() as session:
+            session['user_key'] = row['api_key']
+            session['user_data'] = {key: row[key] for key in row.keys()}
+    
+    def get(path):
+        response = client.get(path, base_url='https://localhost')
+        assert response.status_code == 200, f"{path} returned {response.status_code}"
+    
+    def as_player(path):
+        def call():
+            login(player)
+            get(path)
+        return call
+    
+    def as_admin(path):
+        def call():
+            login(admin)
+            get(path)
+        return call
+    
+    targets = {
+        "validate_api_key": lambda: database.validate_api_key(rng.choice(keys)),
+        "get_leaderboard": lambda: database.get_leaderboard(10),
+        "get_global_stats": database.get_global_stats,
+        "get_all_players": app_module.get_all_players,
+        "GET /dashboard": as_player('/dashboard'),
+        "GET /admin": as_admin('/admin'),
+        "GET /api/stats": lambda: get('/api/stats'),
+        "GET /api/leaderboard": lambda: get('/api/leaderboard'),
+        "GET /health": lambda: get('/health')
+    }
+    
+    # Whole-table targets get fewer iterations at large scales
+    heavy = {"get_all_players", "GET /admin"}
+    results = {}
+    for name, func in targets.items():
+        count = max(3, iterations // 10) if name in heavy and scale != "10k" else iterations
+        results[name] = time_calls(func, count)
+        print(f"  {scale:>5} {name:<22} mean {results[name]['mean_ms']:>9.2f}ms  "
+              f"p95 {results[name]['p95_ms']:>9.2f}ms")
+    
+    database.close_db_connection()
+    return {"rows": counts, "targets": results}
+
+def compare(results, baseline, threshold):
+    """Print per-target deltas against a baseline run; returns the regressions"""
+    regressions = []
+    for scale, scale_results in results["scales"].items():
+        base_scale = baseline.get("scales", {}).get(scale)
+        if not base_scale:
+            continue
+        for name, current in scale_results["targets"].items():
+            base = base_scale["targets"].get(name)
+            if not base or not base["mean_ms"]:
+                continue
+            delta = (current["mean_ms"] - base["mean_ms"]) / base["mean_ms"]
+            flag = "REGRESSION" if delta > threshold else ""
+            print(f"  {scale:>5} {name:<22} {base['mean_ms']:>9.2f}ms -> {current['mean_ms']:>9.2f}ms "
+                  f"({delta:+.1%}) {flag}")
+            if flag:
+                regressions.append((scale, name, delta))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark database.py and app routes at several data scales")
+    parser.add_argument('--scales', default='10k,100k', help=f"comma-separated, from {', '.join(SCALES)}")
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--workdir', default=None, help="where seeded databases go (default: temp dir)")
+    parser.add_argument('--json', help="write results to this path")
+    parser.add_argument('--baseline', help="compare against a previous --json file")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative slowdown that counts as a regression")
+    args = parser.parse_args()
+    
+    scales = [s.strip() for s in args.scales.split(',') if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        parser.error(f"unknown scales: {', '.join(unknown)}")
+    
+    workdir = args.workdir or tempfile.mkdtemp(prefix='sot_tdm_bench_')
+    # Keep the app's startup thread away from any real sot_tdm.db in the cwd
+    os.environ.setdefault('DATABASE_PATH', os.path.join(workdir, 'bench_startup.db'))
+    results = {
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "iterations": args.iterations,
+        "scales": {}
+    }
+    
+    for scale in scales:
+        print(f"Seeding and benchmarking {scale}...")
+        results["scales"][scale] = run_scale(scale, args.iterations, workdir)
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"Comparison against {args.baseline}:")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
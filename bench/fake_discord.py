@@ -0,0 +1,256 @@
+# bench/fake_discord.py - Local stand-in for the Discord REST API and webhooks
+"""
+Serves just enough of the Discord API for the bot paths we benchmark:
+users/@me, guild info/members/roles/channels, channel messages and deletes,
+application command registration and webhook posts.
+
+    python -m bench.fake_discord --port 8787 --latency-ms 80 --jitter-ms 40 \\
+        --rate-limit-rate 0.02 --error-rate 0.01
+
+Then run the app against it:
+
+    DISCORD_TOKEN=fake DISCORD_CLIENT_ID=1000 \\
+    DISCORD_API_BASE=http://127.0.0.1:8787/api/v10 \\
+    TICKET_WEBHOOK=http://127.0.0.1:8787/webhooks/1/fake python app.py
+"""
+import re
+import json
+import time
+import random
+import argparse
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+API_PREFIX = '/api/v10'
+BOT_USER_ID = '1000'
+OWNER_ID = '1'
+ADMIN_ROLE = '900'
+MEMBER_ROLE = '901'
+
+class FakeDiscordState:
+    """In-memory guilds, channels and messages shared by all handler threads"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snowflakes = itertools.count(10 ** 17)
+        self.channels = {}  # channel_id -> channel
+        self.messages = {}  # channel_id -> [message]
+        self.commands = {}  # scope -> [command]
+        self.request_counts = {}
+    
+    def next_id(self):
+        with self.lock:
+            return str(next(self.snowflakes))
+    
+    def count(self, route):
+        with self.lock:
+            self.request_counts[route] = self.request_counts.get(route, 0) + 1
+
+class Settings:
+    """Latency and fault injection knobs"""
+    latency_ms = 0.0
+    jitter_ms = 0.0
+    error_rate = 0.0
+    rate_limit_rate = 0.0
+    retry_after = 1.0
+    bucket_limit = 50
+
+state = FakeDiscordState()
+settings = Settings()
+
+def guild_payload(guild_id):
+    return {"id": guild_id, "name": f"Guild {guild_id}", "owner_id": OWNER_ID}
+
+def member_payload(user_id):
+    # Users whose id ends in 0 are admins, everyone else is a plain member
+    roles = [ADMIN_ROLE] if user_id.endswith('0') else [MEMBER_ROLE]
+    return {"user": {"id": user_id, "username": f"user{user_id}"}, "roles": roles}
+
+def roles_payload(guild_id):
+    return [
+        {"id": guild_id, "name": "@everyone", "permissions": "0"},
+        {"id": ADMIN_ROLE, "name": "Admin", "permissions": str(0x8)},
+        {"id": MEMBER_ROLE, "name": "Member", "permissions": str(0x400)}
+    ]
+
+class FakeDiscordHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_GET(self):
+        self.dispatch('GET')
+    
+    def do_POST(self):
+        self.dispatch('POST')
+    
+    def do_PUT(self):
+        self.dispatch('PUT')
+    
+    def do_PATCH(self):
+        self.dispatch('PATCH')
+    
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+    
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return None
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return None
+    
+    def send(self, status, body=None, headers=None):
+        payload = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+    
+    def dispatch(self, method):
+        body = self.read_json()
+        path = self.path.split('?', 1)[0]
+        route = re.sub(r'/\d+', '/:id', path)
+        state.count(f"{method} {route}")
+        
+        delay = settings.latency_ms + random.uniform(-settings.jitter_ms, settings.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        
+        rate_headers = {
+            "X-RateLimit-Limit": str(settings.bucket_limit),
+            "X-RateLimit-Remaining": str(random.randint(0, settings.bucket_limit - 1)),
+            "X-RateLimit-Reset-After": f"{settings.retry_after:.3f}",
+            "X-RateLimit-Bucket": route
+        }
+        
+        if random.random() < settings.rate_limit_rate:
+            rate_headers["X-RateLimit-Remaining"] = "0"
+            rate_headers["Retry-After"] = f"{settings.retry_after:.3f}"
+            self.send(429, {"message": "You are being rate limited.", "retry_after": settings.retry_after,
+                            "global": False}, rate_headers)
+            return
+        
+        if random.random() < settings.error_rate:
+            self.send(500, {"message": "Internal Server Error", "code": 0}, rate_headers)
+            return
+        
+        if path.startswith('/webhooks/'):
+            self.send(204, None, rate_headers)
+            return
+        
+        if not path.startswith(API_PREFIX):
+            self.send(404, {"message": "404: Not Found", "code": 0})
+            return
+        
+        status, payload = self.route(method, path[len(API_PREFIX):], body)
+        self.send(status, payload, rate_headers)
+    
+    def route(self, method, path, body):
+        parts = path.strip('/').split('/')
+        
+        if parts == ['users', '@me']:
+            return 200, {"id": BOT_USER_ID, "username": "FakeBot", "bot": True}
+        
+        if parts[0] == 'users' and len(parts) == 2:
+            return 200, {"id": parts[1], "username": f"user{parts[1]}", "avatar": None}
+        
+        if parts[0] == 'applications' and parts[-1] == 'commands':
+            scope = '/'.join(parts[:-1])
+            if method == 'PUT':
+                commands = [dict(c, id=state.next_id(), application_id=parts[1], version='1') for c in body or []]
+                with state.lock:
+                    state.commands[scope] = commands
+                return 200, commands
+            with state.lock:
+                return 200, state.commands.get(scope, [])
+        
+        if parts[0] == 'guilds' and len(parts) >= 2:
+            guild_id = parts[1]
+            if len(parts) == 2:
+                return 200, guild_payload(guild_id)
+            if parts[2] == 'members' and len(parts) == 4:
+                return 200, member_payload(parts[3])
+            if parts[2] == 'roles':
+                return 200, roles_payload(guild_id)
+            if parts[2] == 'channels':
+                if method == 'POST':
+                    channel = dict(body or {}, id=state.next_id(), guild_id=guild_id)
+                    with state.lock:
+                        state.channels[channel['id']] = channel
+                        state.messages[channel['id']] = []
+                    return 201, channel
+                with state.lock:
+                    return 200, [c for c in state.channels.values() if c.get('guild_id') == guild_id]
+        
+        if parts[0] == 'channels' and len(parts) >= 2:
+            channel_id = parts[1]
+            with state.lock:
+                exists = channel_id in state.channels
+            if not exists:
+                return 404, {"message": "Unknown Channel", "code": 10003}
+            
+            if len(parts) == 2:
+                if method == 'DELETE':
+                    with state.lock:
+                        channel = state.channels.pop(channel_id)
+                        state.messages.pop(channel_id, None)
+                    return 200, channel
+                with state.lock:
+                    return 200, state.channels[channel_id]
+            
+            if parts[2] == 'messages':
+                if len(parts) == 4 and method == 'DELETE':
+                    with state.lock:
+                        state.messages[channel_id] = [m for m in state.messages[channel_id] if m['id'] != parts[3]]
+                    return 204, None
+                if method == 'POST':
+                    message = dict(body or {}, id=state.next_id(), channel_id=channel_id)
+                    with state.lock:
+                        state.messages[channel_id].append(message)
+                    return 200, message
+                with state.lock:
+                    return 200, list(reversed(state.messages[channel_id][-50:]))
+        
+        return 404, {"message": "404: Not Found", "code": 0}
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake Discord REST and webhook server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--latency-ms', type=float, default=80.0, help="mean added latency per request")
+    parser.add_argument('--jitter-ms', type=float, default=30.0, help="uniform +/- jitter around the mean")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Retry-After seconds on injected 429s")
+    args = parser.parse_args()
+    
+    settings.latency_ms = args.latency_ms
+    settings.jitter_ms = args.jitter_ms
+    settings.error_rate = args.error_rate
+    settings.rate_limit_rate = args.rate_limit_rate
+    settings.retry_after = args.retry_after
+    
+    server = ThreadingHTTPServer((args.host, args.port), FakeDiscordHandler)
+    server.daemon_threads = True
+    print(f"Fake Discord API on http://{args.host}:{args.port}{API_PREFIX} "
+          f"(latency {args.latency_ms}±{args.jitter_ms}ms, 429 {args.rate_limit_rate:.1%}, 5xx {args.error_rate:.1%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for route, count in sorted(state.request_counts.items()):
+            print(f"{count:8d}  {route}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+# bench/interactions_bench.py - Replay realistic interactions against /interactions
+"""
+Sends a weighted mix of slash command interactions to a running app at a fixed
+concurrency and reports p50/p95/p99 latency per command and overall.
+
+    python -m bench.interactions_bench --target http://127.0.0.1:10000 \\
+        --requests 2000 --concurrency 8 --json bench_interactions.json
+
+Start the app against bench/fake_discord.py so no real Discord calls are made.
+"""
+import re
+import json
+import time
+import random
+import argparse
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+# Relative frequency of each command in the replayed mix
+COMMAND_MIX = {
+    "ping": 20,
+    "profile": 25,
+    "key": 15,
+    "register": 15,
+    "ticket": 10,
+    "close": 8,
+    "update-keys": 4,
+    "setup-keys": 3
+}
+
+TICKET_ISSUES = [
+    ("Bug Report", "Scoreboard shows the wrong kills after a respawn"),
+    ("Account Issue", "My API key stopped working after I changed my name"),
+    ("Technical Support", "Client can't connect to the dashboard"),
+    ("Feature Request", "Could we get a weekly leaderboard?"),
+    ("Other", "Question about the next tournament")
+]
+
+snowflakes = itertools.count(2 * 10 ** 17)
+snowflake_lock = threading.Lock()
+
+def next_snowflake():
+    with snowflake_lock:
+        return str(next(snowflakes))
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+class InteractionFactory:
+    """Builds interaction payloads that look like what Discord delivers"""
+    
+    def __init__(self, guild_id, users, seed=None):
+        self.guild_id = guild_id
+        self.users = users
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.open_tickets = []  # (channel_id, user_id)
+        self.names = list(COMMAND_MIX)
+        self.weights = [COMMAND_MIX[name] for name in self.names]
+    
+    def pick_command(self):
+        with self.lock:
+            return self.random.choices(self.names, self.weights)[0]
+    
+    def remember_ticket(self, channel_id, user_id):
+        with self.lock:
+            self.open_tickets.append((channel_id, user_id))
+    
+    def build(self, command):
+        with self.lock:
+            user_id = self.random.choice(self.users)
+            channel_id = next_snowflake()
+            options = []
+            
+            if command == "register":
+                options = [{"name": "name", "type": 3, "value": f"Pirate{self.random.randint(1, 99999)}"}]
+            elif command == "ticket":
+                category, issue = self.random.choice(TICKET_ISSUES)
+                options = [
+                    {"name": "issue", "type": 3, "value": issue},
+                    {"name": "category", "type": 3, "value": category}
+                ]
+            elif command == "close" and self.open_tickets:
+                channel_id, user_id = self.open_tickets.pop(self.random.randrange(len(self.open_tickets)))
+        
+        return {
+            "id": next_snowflake(),
+            "application_id": "1000",
+            "type": 2,
+            "token": f"fake-token-{next_snowflake()}",
+            "version": 1,
+            "guild_id": self.guild_id,
+            "channel_id": channel_id,
+            "member": {
+                "user": {"id": user_id, "username": f"user{user_id}", "global_name": f"User {user_id}"},
+                "roles": []
+            },
+            "data": {"id": next_snowflake(), "name": command, "type": 1, "options": options}
+        }
+
+session_local = threading.local()
+
+def get_session():
+    if not hasattr(session_local, 'session'):
+        session_local.session = requests.Session()
+    return session_local.session
+
+def send_one(target, factory, duplicate_rate, timeout):
+    """Send one interaction (possibly twice, as a redelivery) and time it"""
+    command = factory.pick_command()
+    payload = factory.build(command)
+    deliveries = 2 if random.random() < duplicate_rate else 1
+    
+    results = []
+    for _ in range(deliveries):
+        started = time.perf_counter()
+        try:
+            response = get_session().post(f"{target}/interactions", json=payload, timeout=timeout)
+            ok = response.status_code == 200
+            body = response.json() if ok else {}
+        except (requests.RequestException, ValueError):
+            ok, body = False, {}
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        results.append((command, elapsed_ms, ok))
+    
+    content = body.get("data", {}).get("content", "") if ok else ""
+    if command == "ticket":
+        match = re.search(r"<#(\d+)>", content)
+        if match:
+            factory.remember_ticket(match.group(1), payload["member"]["user"]["id"])
+    
+    return results
+
+def summarize(samples, wall_seconds):
+    """Latency summary per command plus an 'all' row"""
+    by_command = {}
+    for command, elapsed_ms, ok in samples:
+        by_command.setdefault(command, []).append((elapsed_ms, ok))
+    by_command["all"] = [(elapsed_ms, ok) for _, elapsed_ms, ok in samples]
+    
+    summary = {}
+    for command, rows in by_command.items():
+        latencies = sorted(ms for ms, _ in rows)
+        summary[command] = {
+            "count": len(rows),
+            "errors": sum(1 for _, ok in rows if not ok),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2) if latencies else 0.0
+        }
+    summary["all"]["throughput_rps"] = round(len(samples) / wall_seconds, 2) if wall_seconds else 0.0
+    return summary
+
+def print_summary(summary):
+    print(f"{'command':<12} {'count':>7} {'errors':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for command in sorted(summary, key=lambda c: (c == "all", c)):
+        row = summary[command]
+        print(f"{command:<12} {row['count']:>7} {row['errors']:>7} {row['p50_ms']:>7.1f}ms "
+              f"{row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms {row['max_ms']:>7.1f}ms")
+    print(f"throughput: {summary['all']['throughput_rps']} req/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay Discord interactions against /interactions")
+    parser.add_argument('--target', default='http://127.0.0.1:10000')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--users', type=int, default=200, help="distinct Discord users in the mix")
+    parser.add_argument('--guild', default='5000')
+    parser.add_argument('--duplicate-rate', type=float, default=0.0, help="fraction of interactions delivered twice")
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', help="write the summary as JSON to this path")
+    args = parser.parse_args()
+    
+    users = [str(3 * 10 ** 17 + i) for i in range(args.users)]
+    factory = InteractionFactory(args.guild, users, args.seed)
+    target = args.target.rstrip('/')
+    
+    samples = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(send_one, target, factory, args.duplicate_rate, args.timeout)
+                   for _ in range(args.requests)]
+        for future in futures:
+            samples.extend(future.result())
+    wall_seconds = time.perf_counter() - started
+    
+    summary = summarize(samples, wall_seconds)
+    print_summary(summary)
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"config": vars(args), "results": summary}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
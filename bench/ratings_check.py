@@ -0,0 +1,77 @@
+# bench/ratings_check.py - Incremental ratings against a full-history replay
+"""
+Seeds a database, replays every rating, then finishes more matches through
+finish_match (each with an unregistered player in it) and replays again.
+The replay must land on the ratings the incremental updates produced, and
+the NumPy and sequential replays must agree.
+
+    python -m bench.ratings_check --players 1000 --matches 1500 --extra 40
+
+Exits non-zero when any rating differs by more than --tolerance.
+"""
+import os
+import sys
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.seed_data import seed
+
+def ratings(conn):
+    return {row[0]: row[1] for row in conn.execute('SELECT discord_id, rating FROM players')}
+
+def max_difference(a, b):
+    return max((abs(a[pid] - b.get(pid, a[pid])) for pid in a), default=0.0)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that incremental ratings match a full replay")
+    parser.add_argument('--players', type=int, default=1000)
+    parser.add_argument('--matches', type=int, default=1500)
+    parser.add_argument('--extra', type=int, default=40, help="matches finished incrementally after the first replay")
+    parser.add_argument('--tolerance', type=float, default=1e-6)
+    args = parser.parse_args()
+    
+    import database
+    from ratings import replay_ratings, replay_numpy, replay_python, load_history
+    
+    workdir = tempfile.mkdtemp(prefix='ratings_check_')
+    db_path = os.path.join(workdir, 'sot_tdm.db')
+    seed(db_path, args.players, args.matches, 0)
+    database.DATABASE = db_path
+    database.close_db_connection()
+    conn = database.get_db_connection()
+    replay_ratings(conn)
+    
+    rng = random.Random(7)
+    ids = [row[0] for row in conn.execute('SELECT discord_id FROM players')]
+    for n in range(args.extra):
+        picked = rng.sample(ids, 5) + ["ghost"]
+        team1, team2 = picked[:3], picked[3:]
+        stats = [{"player_id": pid, "team": 1 if pid in team1 else 2, "kills": rng.randint(0, 9),
+                  "deaths": rng.randint(0, 9)} for pid in picked]
+        database.finish_match(f"ratings-check-{n}", team1, team2, rng.randint(0, 5), rng.randint(0, 5), stats)
+    
+    incremental = ratings(conn)
+    summary = replay_ratings(conn)
+    replayed = ratings(conn)
+    drift = max_difference(incremental, replayed)
+    print(f"{summary['matches']} matches ({summary['engine']}): incremental vs replay max difference {drift:.2e}")
+    failed = drift > args.tolerance
+    
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    if numpy is not None:
+        history, registered = load_history(conn), set(ids)
+        engines = max_difference({pid: r for pid, (r, _) in replay_python(history, registered).items()},
+                                 {pid: r for pid, (r, _) in replay_numpy(history, registered, numpy).items()})
+        print(f"numpy vs sequential replay max difference {engines:.2e}")
+        failed = failed or engines > args.tolerance
+    
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+# bench/seed_data.py - Synthetic data generator for sot_tdm.db
+"""
+Seeds the database with players, tickets, finished matches and per-match
+stats drawn from skewed, skill-driven distributions, so benchmarks see data
+shaped like a real community rather than uniform noise.
+
+    python -m bench.seed_data --players 10000 --matches 50000 --tickets 2000
+    python -m bench.seed_data --scale 1m --db /tmp/sot_tdm_1m.db
+
+Player lifetime totals are aggregated from the generated match_stats rows, so
+totals and per-match history agree.
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Preset sizes; match_stats rows come out at roughly matches x 7
+SCALES = {
+    "10k": {"players": 1000, "matches": 1500, "tickets": 200},
+    "100k": {"players": 10000, "matches": 15000, "tickets": 2000},
+    "1m": {"players": 100000, "matches": 150000, "tickets": 20000}
+}
+
+TEAM_SIZES = [2, 3, 4, 5]
+TEAM_SIZE_WEIGHTS = [15, 25, 35, 25]
+TICKET_CATEGORY_WEIGHTS = {
+    "Bug Report": 35,
+    "Account Issue": 25,
+    "Technical Support": 20,
+    "Feature Request": 12,
+    "Other": 8
+}
+NAME_PARTS = ["Salty", "Kraken", "Barrel", "Cannon", "Sloop", "Gold", "Skull", "Reaper",
+              "Storm", "Anchor", "Plank", "Rum", "Siren", "Fort", "Mega", "Ghost"]
+SEED_DAYS = 180
+
+def random_name(rng, index):
+    return f"{rng.choice(NAME_PARTS)}{rng.choice(NAME_PARTS)}{index}"
+
+def random_key(rng, alphabet="ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"):
+    return 'GOB-' + ''.join(rng.choice(alphabet) for _ in range(20))
+
+def poisson(rng, mean):
+    """Small-mean Poisson sample (Knuth), good enough for per-match kill counts"""
+    if mean > 30:
+        return max(0, int(rng.gauss(mean, mean ** 0.5)))
+    limit = pow(2.718281828459045, -mean)
+    k, p = 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+def build_players(rng, count, start):
+    """Players with a heavy-tailed skill and activity level"""
+    players = []
+    for i in range(count):
+        players.append({
+            "discord_id": str(4 * 10 ** 17 + i),
+            "name": random_name(rng, i),
+            "skill": rng.lognormvariate(0, 0.35),
+            # A few players play constantly, most rarely (Pareto activity)
+            "activity": rng.paretovariate(1.3),
+            "created": start + timedelta(seconds=rng.randint(0, SEED_DAYS * 86400)),
+            "kills": 0, "deaths": 0, "wins": 0, "losses": 0
+        })
+    return players
+
+def seed(db_path, players_count, matches_count, tickets_count, seed_value=42, batch_size=5000):
+    """Generate and insert the synthetic data set; returns row counts"""
+    from config import generate_secure_key
+    import database
+    
+    rng = random.Random(seed_value)
+    database.DATABASE = db_path
+    database.init_db()
+    
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA journal_mode = MEMORY')
+    
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=SEED_DAYS)
+    players = build_players(rng, players_count, start)
+    
+    # Cumulative activity weights so busy players show up in far more matches
+    weights = []
+    total = 0.0
+    for player in players:
+        total += player["activity"]
+        weights.append(total)
+    
+    match_rows = []
+    stat_rows = []
+    stats_total = 0
+    started = time.perf_counter()
+    
+    def flush():
+        conn.executemany('''
+            INSERT INTO matches (match_id, team1_players, team2_players, team1_score, team2_score,
+                                 status, winner, started_at, ended_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', match_rows)
+        conn.executemany('''
+            INSERT INTO match_stats (match_id, player_id, player_name, team, kills, deaths, assists)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', stat_rows)
+        conn.commit()
+        match_rows.clear()
+        stat_rows.clear()
+    
+    for m in range(matches_count):
+        team_size = rng.choices(TEAM_SIZES, TEAM_SIZE_WEIGHTS)[0]
+        picked = set()
+        while len(picked) < min(team_size * 2, len(players)):
+            picked.add(rng.choices(range(len(players)), cum_weights=weights)[0])
+        picked = list(picked)
+        rng.shuffle(picked)
+        teams = (picked[:len(picked) // 2], picked[len(picked) // 2:])
+        
+        strength = [sum(players[i]["skill"] for i in team) for team in teams]
+        team1_wins = rng.random() < strength[0] / (strength[0] + strength[1])
+        match_started = start + timedelta(seconds=rng.randint(0, SEED_DAYS * 86400 - 3600))
+        match_id = f"M{m:08d}"
+        
+        scores = [0, 0]
+        for team_index, team in enumerate(teams):
+            opponents = strength[1 - team_index]
+            for i in team:
+                player = players[i]
+                kills = poisson(rng, 4.0 * player["skill"] * team_size / max(opponents, 0.1))
+                deaths = poisson(rng, 4.0 * opponents / team_size / player["skill"])
+                assists = poisson(rng, 1.5)
+                scores[team_index] += kills
+                player["kills"] += kills
+                player["deaths"] += deaths
+                won = team1_wins == (team_index == 0)
+                player["wins" if won else "losses"] += 1
+                stat_rows.append((match_id, player["discord_id"], player["name"], team_index + 1,
+                                  kills, deaths, assists))
+        
+        match_rows.append((
+            match_id,
+            json.dumps([players[i]["discord_id"] for i in teams[0]]),
+            json.dumps([players[i]["discord_id"] for i in teams[1]]),
+            scores[0], scores[1], 'finished', 'team1' if team1_wins else 'team2',
+            match_started.isoformat(' '),
+            (match_started + timedelta(minutes=rng.randint(8, 30))).isoformat(' ')
+        ))
+        stats_total += len(picked)
+        
+        if len(stat_rows) >= batch_size:
+            flush()
+    flush()
+    
+    api_keys = set()
+    player_rows = []
+    for player in players:
+        key = random_key(rng)
+        while key in api_keys:
+            key = generate_secure_key()
+        api_keys.add(key)
+        player_rows.append((
+            player["discord_id"], player["name"], None, player["name"], key, '5000',
+            player["created"].isoformat(' '), player["kills"], player["deaths"],
+            player["wins"], player["losses"], 1 if rng.random() < 0.01 else 0,
+            player["created"].isoformat(' ')
+        ))
+    for offset in range(0, len(player_rows), batch_size):
+        conn.executemany('''
+            INSERT INTO players (discord_id, discord_name, discord_avatar, in_game_name, api_key, server_id,
+                                 key_created, total_kills, total_deaths, wins, losses, is_admin, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', player_rows[offset:offset + batch_size])
+    conn.commit()
+    
+    categories = list(TICKET_CATEGORY_WEIGHTS)
+    category_weights = list(TICKET_CATEGORY_WEIGHTS.values())
+    ticket_rows = []
+    for t in range(tickets_count):
+        player = players[rng.choices(range(len(players)), cum_weights=weights)[0]]
+        created = start + timedelta(seconds=rng.randint(0, SEED_DAYS * 86400))
+        closed = rng.random() < 0.7
+        ticket_rows.append((
+            f"T-S{t:07d}", player["discord_id"], player["name"], "Synthetic ticket",
+            rng.choices(categories, category_weights)[0], str(5 * 10 ** 17 + t),
+            'closed' if closed else 'open', created.isoformat(' '),
+            (created + timedelta(hours=rng.randint(1, 72))).isoformat(' ') if closed else None
+        ))
+    conn.executemany('''
+        INSERT INTO tickets (ticket_id, discord_id, discord_name, issue, category, channel_id,
+                             status, created_at, resolved_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', ticket_rows)
+    conn.commit()
+    conn.close()
+    
+    counts = {
+        "players": players_count,
+        "matches": matches_count,
+        "match_stats": stats_total,
+        "tickets": tickets_count,
+        "seconds": round(time.perf_counter() - started, 2)
+    }
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed sot_tdm.db with synthetic players, matches and tickets")
+    parser.add_argument('--db', default=None, help="database path (default: config.DATABASE)")
+    parser.add_argument('--scale', choices=sorted(SCALES), help="preset sizes, overridden by explicit counts")
+    parser.add_argument('--players', type=int)
+    parser.add_argument('--matches', type=int)
+    parser.add_argument('--tickets', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--force', action='store_true', help="delete an existing database file first")
+    args = parser.parse_args()
+    
+    from config import DATABASE
+    db_path = args.db or DATABASE
+    sizes = dict(SCALES[args.scale or "10k"])
+    for key in ("players", "matches", "tickets"):
+        if getattr(args, key) is not None:
+            sizes[key] = getattr(args, key)
+    
+    if os.path.exists(db_path):
+        if not args.force:
+            parser.error(f"{db_path} already exists; pass --force to replace it")
+        os.remove(db_path)
+    
+    counts = seed(db_path, sizes["players"], sizes["matches"], sizes["tickets"], args.seed)
+    print(json.dumps(dict(counts, db=db_path)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# bench/snapshot_bench.py - Columnar stats snapshot against the equivalent SQL
+"""
+Seeds (or reuses) a database, loads the NumPy snapshot and times the same
+sorts, filters and aggregates both ways.
+
+    python -m bench.snapshot_bench --players 100000 --matches 150000 --db /tmp/snapshot.db
+
+Both sides return rows as dicts, so the SQL numbers include the same row
+materialization the app pays for.
+"""
+import os
+import sys
+import json
+import sqlite3
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.seed_data import seed
+from bench.bench_suite import time_calls
+from database import add_column
+from stats_snapshot import StatsSnapshot, SELECT_COLUMNS
+
+SQL_KEYS = {
+    "kd": "CAST(total_kills AS FLOAT) / MAX(total_deaths, 1)",
+    "kills": "total_kills",
+    "wins": "wins",
+    "prestige": "prestige",
+    "rating": "rating",
+    "win_rate": "CASE WHEN wins + losses > 0 THEN CAST(wins AS FLOAT) / (wins + losses) ELSE 0 END"
+}
+
+# name: (sort, limit, offset, min_kills, min_games, rated_only)
+QUERIES = {
+    "leaderboard_kd": ("kd", 10, 0, 1, 0, False),
+    "leaderboard_rating": ("rating", 10, 0, 0, 0, True),
+    "wins_page_20": ("wins", 50, 1000, 0, 10, False),
+    "win_rate_min_games": ("win_rate", 25, 0, 0, 20, False),
+    "prestige": ("prestige", 10, 0, 0, 0, False)
+}
+
+def sql_query(conn, sort, limit, offset, min_kills, min_games, rated_only):
+    where = ["1"]
+    if min_kills:
+        where.append(f"total_kills >= {int(min_kills)}")
+    if min_games:
+        where.append(f"wins + losses >= {int(min_games)}")
+    if rated_only:
+        where.append("rating_games > 0")
+    rows = conn.execute(f'''
+        SELECT {", ".join(SELECT_COLUMNS)} FROM players
+        WHERE {" AND ".join(where)}
+        ORDER BY {SQL_KEYS[sort]} DESC, total_kills DESC
+        LIMIT ? OFFSET ?
+    ''', (limit, offset)).fetchall()
+    return [dict(zip(SELECT_COLUMNS, row)) for row in rows]
+
+def sql_aggregate(conn):
+    return conn.execute('''
+        SELECT COUNT(*), SUM(total_kills), SUM(total_deaths), SUM(wins), SUM(losses) FROM players
+    ''').fetchone()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the columnar stats snapshot against SQLite")
+    parser.add_argument('--players', type=int, default=100000)
+    parser.add_argument('--matches', type=int, default=150000)
+    parser.add_argument('--db', default=None, help="reuse this database if it exists (default: temp file)")
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--json', help="write results to this path")
+    args = parser.parse_args()
+    
+    db_path = args.db or os.path.join(os.environ.get('TMPDIR', '/tmp'), f"snapshot_{args.players}.db")
+    if not os.path.exists(db_path):
+        print(f"Seeding {args.players} players / {args.matches} matches into {db_path}...")
+        seed(db_path, args.players, args.matches, 0)
+    
+    conn = sqlite3.connect(db_path)
+    add_column(conn, 'players', 'rating', 'REAL DEFAULT 1500')
+    add_column(conn, 'players', 'rating_games', 'INTEGER DEFAULT 0')
+    # Seeded players have no rated games; spread some synthetic ratings
+    conn.execute('UPDATE players SET rating = 1300 + id % 400, rating_games = id % 3 WHERE rating_games = 0')
+    conn.commit()
+    
+    snapshot = StatsSnapshot()
+    results = {"players": conn.execute('SELECT COUNT(*) FROM players').fetchone()[0]}
+    results["load"] = time_calls(lambda: snapshot.load(conn), 3, warmup=0)
+    
+    for name, params in QUERIES.items():
+        sort, limit, offset, min_kills, min_games, rated_only = params
+        expected = [row["id"] for row in sql_query(conn, *params)]
+        _, rows = snapshot.query(sort, True, limit, offset, min_kills, min_games, rated_only)
+        results[name] = {
+            "sql": time_calls(lambda: sql_query(conn, *params), args.iterations),
+            "snapshot": time_calls(lambda: snapshot.query(sort, True, limit, offset, min_kills, min_games, rated_only),
+                                   args.iterations),
+            # Rows tied on both sort keys may legitimately come back in another order
+            "same_rows": len(set(expected) & {row["id"] for row in rows}) / max(len(expected), 1)
+        }
+    
+    results["aggregate"] = {
+        "sql": time_calls(lambda: sql_aggregate(conn), args.iterations),
+        "snapshot": time_calls(snapshot.aggregate, args.iterations)
+    }
+    some_ids = [row[0] for row in conn.execute('SELECT discord_id FROM players ORDER BY RANDOM() LIMIT 10')]
+    results["refresh_10_players"] = time_calls(lambda: snapshot.refresh_players(conn, some_ids), args.iterations)
+    
+    print(f"{results['players']} players; snapshot load p50 {results['load']['p50_ms']:.1f}ms")
+    print(f"{'query':<22} {'sql p50':>10} {'snapshot p50':>13} {'speedup':>8} {'same rows':>10}")
+    for name in list(QUERIES) + ["aggregate"]:
+        row = results[name]
+        speedup = row["sql"]["p50_ms"] / max(row["snapshot"]["p50_ms"], 1e-6)
+        same = f"{row['same_rows']:.0%}" if "same_rows" in row else ""
+        print(f"{name:<22} {row['sql']['p50_ms']:>8.2f}ms {row['snapshot']['p50_ms']:>11.2f}ms {speedup:>7.1f}x {same:>10}")
+    print(f"refresh 10 players p50 {results['refresh_10_players']['p50_ms']:.2f}ms")
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.json}")
+
+if __name__ == '__main__':
+    main()
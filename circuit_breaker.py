@@ -0,0 +1,92 @@
+# circuit_breaker.py - Circuit breakers for Discord API route classes
+import re
+import time
+import threading
+from config import DISCORD_BREAKER_FAILURES, DISCORD_BREAKER_RESET, logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+class CircuitBreaker:
+    """Fails fast after repeated failures, then lets a single probe through"""
+    
+    def __init__(self, name, failure_threshold=DISCORD_BREAKER_FAILURES, reset_timeout=DISCORD_BREAKER_RESET):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.probe_in_flight = False
+        self.probe_started = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+    
+    def allow(self):
+        """Whether a call may go through right now"""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            
+            # A probe that never reported back is given up on after another reset period
+            if self.state == HALF_OPEN and (not self.probe_in_flight or now - self.probe_started >= self.reset_timeout):
+                self.probe_in_flight = True
+                self.probe_started = now
+                return True
+            
+            self.rejected += 1
+            return False
+    
+    def record_success(self):
+        with self.lock:
+            if self.state != CLOSED:
+                logger.info(f"Circuit {self.name} closed")
+            self.state = CLOSED
+            self.failures = 0
+            self.probe_in_flight = False
+    
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit {self.name} open after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.probe_in_flight = False
+    
+    def snapshot(self):
+        with self.lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "rejected": self.rejected
+            }
+
+# One breaker per route class, created on first use
+breakers = {}
+breakers_lock = threading.Lock()
+
+def route_class(endpoint):
+    """Collapse an API path to its route class, e.g. /guilds/:id/members/:id"""
+    path = endpoint.split('?', 1)[0]
+    return re.sub(r'/\d+', '/:id', path)
+
+def get_breaker(name):
+    """Get or create the breaker for a route class"""
+    with breakers_lock:
+        if name not in breakers:
+            breakers[name] = CircuitBreaker(name)
+        return breakers[name]
+
+def get_breaker_states():
+    """Snapshot of every breaker, for /health"""
+    with breakers_lock:
+        current = list(breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in current}
@@ -0,0 +1,133 @@
+# concurrency.py - Parallel fan-out for independent Discord calls
+import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from metrics import current_timings, bind_timings
+from tracing import current_context, bind_context, span
+from config import DISCORD_FANOUT_WORKERS, DISCORD_FANOUT_TIMEOUT, BOT_MAX_CONCURRENCY, BOT_BUDGET_WAIT, logger
+
+# Shared pool for Discord REST and webhook calls that don't depend on each other
+executor = ThreadPoolExecutor(max_workers=DISCORD_FANOUT_WORKERS, thread_name_prefix='discord-fanout')
+
+def timed_call(name, func, *args, timings=None, context=None):
+    """Run a call, returning (result, elapsed_ms); errors are logged and yield None"""
+    # Charge DB and Discord time, and trace spans, to the request that fanned out
+    bind_timings(timings)
+    bind_context(context)
+    started = time.perf_counter()
+    try:
+        with span('fanout', name):
+            result = func(*args)
+    except Exception as e:
+        logger.error(f"Fan-out call {name} failed: {e}")
+        result = None
+    finally:
+        bind_timings(None)
+        bind_context(None)
+    return result, (time.perf_counter() - started) * 1000
+
+def fan_out(calls, timeout=DISCORD_FANOUT_TIMEOUT):
+    """Run independent calls in parallel under one shared deadline
+    
+    calls maps a name to (func, *args). Returns (results, timings) keyed by name.
+    A call that misses the deadline gets a None result and finishes unobserved.
+    """
+    deadline = time.monotonic() + timeout
+    timings = current_timings()
+    context = current_context()
+    futures = {
+        name: executor.submit(timed_call, name, func, *args, timings=timings, context=context)
+        for name, (func, *args) in calls.items()
+    }
+    
+    results = {}
+    timings = {}
+    for name, future in futures.items():
+        try:
+            results[name], timings[name] = future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeout:
+            logger.warning(f"Fan-out call {name} missed the {timeout}s deadline")
+            results[name], timings[name] = None, timeout * 1000
+    
+    return results, timings
+
+def run_in_background(name, func, *args):
+    """Run a call off the critical path on the shared pool"""
+    return executor.submit(timed_call, name, func, *args)
+
+class CommandTimer:
+    """Critical-path timing for one slash command"""
+    
+    def __init__(self, command):
+        self.command = command
+        self.started = time.perf_counter()
+        self.steps = []
+    
+    @contextmanager
+    def step(self, name):
+        """Time a sequential step"""
+        started = time.perf_counter()
+        try:
+            with span('step', f"/{self.command} {name}"):
+                yield
+        finally:
+            self.steps.append((name, (time.perf_counter() - started) * 1000, None))
+    
+    def parallel(self, calls, timeout=DISCORD_FANOUT_TIMEOUT):
+        """Fan out calls and record the group as a single step"""
+        started = time.perf_counter()
+        with span('step', f"/{self.command} parallel"):
+            results, timings = fan_out(calls, timeout)
+        self.steps.append(('parallel', (time.perf_counter() - started) * 1000, timings))
+        return results
+    
+    def report(self):
+        """Log the critical path and return its total latency in ms"""
+        total_ms = (time.perf_counter() - self.started) * 1000
+        
+        parts = []
+        for name, elapsed_ms, branches in self.steps:
+            if branches:
+                inner = " | ".join(f"{branch} {ms:.0f}ms" for branch, ms in branches.items())
+                parts.append(f"[{inner}] {elapsed_ms:.0f}ms")
+            else:
+                parts.append(f"{name} {elapsed_ms:.0f}ms")
+        
+        logger.info(f"⏱️ /{self.command} critical path {total_ms:.0f}ms: {' → '.join(parts)}")
+        return total_ms
+
+class WorkBudget:
+    """Bounded concurrency budget that sheds work after a short wait instead of queueing it"""
+    
+    def __init__(self, name, limit, wait=0):
+        self.name = name
+        self.limit = limit
+        self.wait = wait
+        self.semaphore = threading.BoundedSemaphore(limit)
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.shed = 0
+    
+    def try_acquire(self):
+        """Take a slot, waiting at most self.wait seconds for one to free up"""
+        if not self.semaphore.acquire(timeout=self.wait):
+            with self.lock:
+                self.shed += 1
+            logger.warning(f"{self.name} budget exhausted ({self.limit} in use) - shedding")
+            return False
+        with self.lock:
+            self.in_use += 1
+        return True
+    
+    def release(self):
+        with self.lock:
+            self.in_use -= 1
+        self.semaphore.release()
+    
+    def snapshot(self):
+        with self.lock:
+            return {"limit": self.limit, "in_use": self.in_use, "shed": self.shed}
+
+# Slash command work, kept separate from dashboard and API requests
+bot_budget = WorkBudget("bot", BOT_MAX_CONCURRENCY, BOT_BUDGET_WAIT)
@@ -1,25 +1,119 @@
 # config.py - Configuration and utilities
 import os
+import time
+import calendar
 import secrets
 import logging
 import string
+import tempfile
+from log_pipeline import LogPipeline, parse_sample_rates
 
 # Discord Configuration
 DISCORD_TOKEN = os.environ.get('DISCORD_TOKEN', '')
 DISCORD_CLIENT_ID = os.environ.get('DISCORD_CLIENT_ID', '')
 DISCORD_PUBLIC_KEY = os.environ.get('DISCORD_PUBLIC_KEY', '')
 ADMIN_ROLE_ID = os.environ.get('ADMIN_ROLE_ID', '')
+# Discord REST base URL; point at bench/fake_discord.py for local benchmarking
+DISCORD_API_BASE = os.environ.get('DISCORD_API_BASE', 'https://discord.com/api/v10').rstrip('/')
+# Register slash commands to this guild only (instant updates while iterating)
+DISCORD_GUILD_ID = os.environ.get('DISCORD_GUILD_ID', '')
 
 # Webhooks
 TICKET_WEBHOOK = os.environ.get('TICKET_WEBHOOK', '')
 SCORE_WEBHOOK = os.environ.get('SCORE_WEBHOOK', '')
 
-# Database
-DATABASE = 'sot_tdm.db'
+# Parallel Discord calls (worker threads, shared deadline in seconds)
+DISCORD_FANOUT_WORKERS = int(os.environ.get('DISCORD_FANOUT_WORKERS', '8'))
+DISCORD_FANOUT_TIMEOUT = float(os.environ.get('DISCORD_FANOUT_TIMEOUT', '2.5'))
+
+# Circuit breakers per Discord route class (consecutive failures to open, seconds before a probe)
+DISCORD_BREAKER_FAILURES = int(os.environ.get('DISCORD_BREAKER_FAILURES', '5'))
+DISCORD_BREAKER_RESET = float(os.environ.get('DISCORD_BREAKER_RESET', '30'))
+
+# Request threads slash commands may occupy; the rest stay free for web pages.
+# A command waits up to BOT_BUDGET_WAIT seconds for a slot before being shed.
+BOT_MAX_CONCURRENCY = int(os.environ.get('BOT_MAX_CONCURRENCY', '2'))
+BOT_BUDGET_WAIT = float(os.environ.get('BOT_BUDGET_WAIT', '1.0'))
+
+# Duplicate interaction deliveries (cache size, TTL seconds, wait for in-flight seconds)
+INTERACTION_CACHE_SIZE = int(os.environ.get('INTERACTION_CACHE_SIZE', '1024'))
+INTERACTION_CACHE_TTL = int(os.environ.get('INTERACTION_CACHE_TTL', '900'))
+INTERACTION_DUPLICATE_WAIT = float(os.environ.get('INTERACTION_DUPLICATE_WAIT', '2.0'))
+
+# Metrics: per-worker snapshots are merged from this directory on /metrics
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'sot_tdm_metrics'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '2.0'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# SQL profiler (opt-in); the report is written to SQL_PROFILE_PATH on shutdown
+SQL_PROFILER = os.environ.get('SQL_PROFILER', '').lower() in ('1', 'true', 'yes')
+SQL_PROFILE_PATH = os.environ.get('SQL_PROFILE_PATH', '')
+
+# Request tracing: traces slower than TRACE_SLOW_MS, failed ones and a TRACE_SAMPLE_RATE
+# fraction of the rest are kept in a ring buffer (and TRACE_FILE, rotated, if set)
+TRACE_ENABLED = os.environ.get('TRACE_ENABLED', '1').lower() in ('1', 'true', 'yes')
+TRACE_SLOW_MS = float(os.environ.get('TRACE_SLOW_MS', '500'))
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0.01'))
+TRACE_BUFFER_SIZE = int(os.environ.get('TRACE_BUFFER_SIZE', '200'))
+TRACE_MAX_SPANS = int(os.environ.get('TRACE_MAX_SPANS', '500'))
+TRACE_FILE = os.environ.get('TRACE_FILE', '')
+
+# Scheduler: maintenance intervals in seconds; leader-only jobs run in whichever
+# worker holds the flock on SCHEDULER_LOCK_PATH
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '1').lower() in ('1', 'true', 'yes')
+SCHEDULER_LOCK_PATH = os.environ.get('SCHEDULER_LOCK_PATH', os.path.join(tempfile.gettempdir(), 'sot_tdm_scheduler.lock'))
+DB_OPTIMIZE_INTERVAL = float(os.environ.get('DB_OPTIMIZE_INTERVAL', '3600'))
+WAL_CHECKPOINT_INTERVAL = float(os.environ.get('WAL_CHECKPOINT_INTERVAL', '300'))
+TICKET_SWEEP_INTERVAL = float(os.environ.get('TICKET_SWEEP_INTERVAL', '600'))
+ORPHAN_TICKET_MINUTES = int(os.environ.get('ORPHAN_TICKET_MINUTES', '30'))
+
+# Health checks run in the background every HEALTH_CHECK_INTERVAL seconds
+HEALTH_CHECK_INTERVAL = float(os.environ.get('HEALTH_CHECK_INTERVAL', '5'))
+HEALTH_MIN_FREE_MB = int(os.environ.get('HEALTH_MIN_FREE_MB', '100'))
+
+# Logging: JSON lines (LOG_FORMAT=text for local runs), bounded queue, per-logger
+# sampling of INFO records as "logger=rate,..." (0.1 keeps 1 in 10)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+LOG_SAMPLE = os.environ.get('LOG_SAMPLE', 'config.auth=0.1')
+
+# Team Elo ratings; new players use the provisional K for their first games
+RATING_INITIAL = float(os.environ.get('RATING_INITIAL', '1500'))
+RATING_K = float(os.environ.get('RATING_K', '24'))
+RATING_PROVISIONAL_K = float(os.environ.get('RATING_PROVISIONAL_K', '48'))
+RATING_PROVISIONAL_GAMES = int(os.environ.get('RATING_PROVISIONAL_GAMES', '10'))
 
-# Bot Status
-bot_active = False
-bot_info = {}
+# Team balancer: largest lobby accepted, and the size up to which the split is exact
+BALANCE_MAX_PLAYERS = int(os.environ.get('BALANCE_MAX_PLAYERS', '20'))
+BALANCE_EXACT_LIMIT = int(os.environ.get('BALANCE_EXACT_LIMIT', '20'))
+
+# Leaderboards: largest API page, games needed to appear on the win rate board, /leaderboard page size
+LEADERBOARD_MAX_LIMIT = int(os.environ.get('LEADERBOARD_MAX_LIMIT', '100'))
+LEADERBOARD_MIN_GAMES = int(os.environ.get('LEADERBOARD_MIN_GAMES', '5'))
+LEADERBOARD_PAGE_SIZE = int(os.environ.get('LEADERBOARD_PAGE_SIZE', '10'))
+
+# Seasons: SEASON_LENGTH_DAYS long, numbered from 1 at SEASON_EPOCH (a UTC date)
+SEASON_EPOCH = os.environ.get('SEASON_EPOCH', '2026-01-05')
+SEASON_LENGTH_DAYS = int(os.environ.get('SEASON_LENGTH_DAYS', '28'))
+
+# Player history charts: most points one request may return
+HISTORY_MAX_POINTS = int(os.environ.get('HISTORY_MAX_POINTS', '500'))
+
+# Percentile standings: KLL sketch size (rank error about 1.7/k) and how often
+# workers check whether their sketches are stale, in seconds
+PERCENTILE_SKETCH_K = int(os.environ.get('PERCENTILE_SKETCH_K', '256'))
+PERCENTILE_REFRESH_INTERVAL = int(os.environ.get('PERCENTILE_REFRESH_INTERVAL', '30'))
+
+# Database
+DATABASE = os.environ.get('DATABASE_PATH', 'sot_tdm.db')
+# Finished seasons' matches move to one SQLite file each in this directory,
+# once the season has been over for SEASON_ARCHIVE_GRACE_HOURS (late reports)
+SEASON_ARCHIVE_DIR = os.environ.get('SEASON_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(DATABASE)), 'seasons'))
+SEASON_ARCHIVE_GRACE_HOURS = int(os.environ.get('SEASON_ARCHIVE_GRACE_HOURS', '24'))
+SEASON_ARCHIVE_INTERVAL = int(os.environ.get('SEASON_ARCHIVE_INTERVAL', '3600'))
+# Seconds a worker may serve shared state (bot status, cache versions) from memory
+SHARED_STATE_TTL = float(os.environ.get('SHARED_STATE_TTL', '1.0'))
 
 # Constants
 TOXIC_PING_RESPONSES = [
@@ -38,6 +132,10 @@ NORMAL_PING_RESPONSES = [
     "Ready!"
 ]
 
+# Key database channel name in Discord and its admin_channels.channel_type
+KEY_DATABASE_CHANNEL_NAME = 'api-key-database'
+KEY_DATABASE_CHANNEL_TYPE = 'key-database'
+
 TICKET_CATEGORIES = [
     {"name": "Bug Report", "color": 0xe74c3c},
     {"name": "Feature Request", "color": 0x3498db},
@@ -52,12 +150,36 @@ def generate_secure_key():
     alphabet = string.ascii_uppercase + string.digits
     return 'GOB-' + ''.join(secrets.choice(alphabet) for _ in range(20))
 
+def generate_ticket_id():
+    """Generate ticket ID: T- + 8 random uppercase alphanumeric characters"""
+    alphabet = string.ascii_uppercase + string.digits
+    return 'T-' + ''.join(secrets.choice(alphabet) for _ in range(8))
+
+def season_bounds(ts=None):
+    """(number, start, end) of the season holding ts, in epoch seconds"""
+    epoch = calendar.timegm(time.strptime(SEASON_EPOCH, '%Y-%m-%d'))
+    length = SEASON_LENGTH_DAYS * 86400
+    ts = int(time.time() if ts is None else ts)
+    number = (ts - epoch) // length
+    start = epoch + number * length
+    return number + 1, start, start + length
+
 def setup_logging():
-    """Setup logging"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s'
+    """Setup logging: records are queued here and written by a background listener"""
+    global log_pipeline
+    log_pipeline = LogPipeline(
+        level=getattr(logging, LOG_LEVEL, logging.INFO),
+        json_format=LOG_FORMAT != 'text',
+        queue_size=LOG_QUEUE_SIZE,
+        sample_rates=parse_sample_rates(LOG_SAMPLE)
     )
     return logging.getLogger(__name__)
 
+def get_logging_stats():
+    return log_pipeline.get_stats()
+
+log_pipeline = None
 logger = setup_logging()
+# High-volume messages get their own child loggers so LOG_SAMPLE can thin them
+auth_logger = logger.getChild('auth')
+command_logger = logger.getChild('commands')
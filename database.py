@@ -1,24 +1,122 @@
 # database.py - Database setup and management
+import json
 import sqlite3
-from config import DATABASE, logger
+import calendar
+import time
+from config import (
+    DATABASE, SQL_PROFILER, SHARED_STATE_TTL, RATING_INITIAL, LEADERBOARD_MIN_GAMES, logger, auth_logger
+)
+from metrics import add_db_time
+from sql_profiler import profiler
+from tracing import add_span
+from ratings import apply_match
+from stats_snapshot import stats_snapshot
+from window_boards import window_boards, window_start, WINDOWS
+import os
 import threading
 from datetime import datetime
 
 # Thread-local storage for database connections
 local_storage = threading.local()
 
+def observe_db(seconds, rows=0):
+    """Report SQLite time to the request metrics and, if enabled, the SQL profiler"""
+    add_db_time(seconds)
+    if SQL_PROFILER:
+        profiler.observe(seconds, rows)
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports time spent in SQLite to the request metrics"""
+    
+    def execute(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            observe_db(elapsed)
+            add_span('sqlite', sql, started, elapsed)
+    
+    def executemany(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            observe_db(elapsed)
+            add_span('sqlite', sql, started, elapsed, many=True)
+    
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        observe_db(time.perf_counter() - started, 1 if row is not None else 0)
+        return row
+    
+    def fetchmany(self, *args):
+        started = time.perf_counter()
+        rows = super().fetchmany(*args)
+        observe_db(time.perf_counter() - started, len(rows))
+        return rows
+    
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        observe_db(time.perf_counter() - started, len(rows))
+        return rows
+    
+    def __next__(self):
+        started = time.perf_counter()
+        row = super().__next__()
+        observe_db(time.perf_counter() - started, 1)
+        return row
+
+class ThreadConnection(sqlite3.Connection):
+    """Thread-local connection that forgets itself when closed"""
+    
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+    
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+    
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+    
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            elapsed = time.perf_counter() - started
+            observe_db(elapsed)
+            add_span('sqlite', 'COMMIT', started, elapsed)
+    
+    def close(self):
+        super().close()
+        if getattr(local_storage, 'conn', None) is self:
+            delattr(local_storage, 'conn')
+
 def get_db_connection():
     """Get database connection with thread safety"""
     if not hasattr(local_storage, 'conn'):
-        local_storage.conn = sqlite3.connect(DATABASE)
+        local_storage.conn = sqlite3.connect(DATABASE, factory=ThreadConnection)
         local_storage.conn.row_factory = sqlite3.Row
+        if SQL_PROFILER:
+            profiler.install(local_storage.conn, DATABASE)
     return local_storage.conn
 
 def close_db_connection():
     """Close database connection for current thread"""
-    if hasattr(local_storage, 'conn'):
-        local_storage.conn.close()
-        delattr(local_storage, 'conn')
+    conn = getattr(local_storage, 'conn', None)
+    if conn is not None:
+        # ThreadConnection.close forgets it
+        conn.close()
+
+def add_column(cursor, table, column, definition):
+    """ALTER TABLE ADD COLUMN unless the column already exists"""
+    columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
 
 def init_db():
     """Initialize database tables"""
@@ -26,6 +124,11 @@ def init_db():
         conn = sqlite3.connect(DATABASE)
         cursor = conn.cursor()
         
+        # Incremental auto-vacuum only takes effect on a new database file;
+        # WAL lets readers carry on while a writer commits
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('PRAGMA journal_mode = WAL')
+        
         # Players table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS players (
@@ -108,6 +211,115 @@ def init_db():
             )
         ''')
         
+        # Slash command registration state, one row per scope (global or guild)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS command_registrations (
+                scope TEXT PRIMARY KEY,
+                command_hash TEXT,
+                command_count INTEGER DEFAULT 0,
+                registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Small JSON values shared by every worker: bot status, cache versions, counters, claims
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shared_state (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Append-only per-player match history, clustered by player and time
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS player_history (
+                player_id TEXT,
+                ts INTEGER,
+                match_id TEXT,
+                team INTEGER,
+                kills INTEGER,
+                deaths INTEGER,
+                assists INTEGER,
+                won INTEGER,
+                lost INTEGER,
+                rating REAL,
+                PRIMARY KEY (player_id, ts, match_id)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Hourly/daily/weekly sums of player_history, kept up to date by finish_match
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS player_rollups (
+                player_id TEXT,
+                step TEXT,
+                bucket INTEGER,
+                matches INTEGER,
+                kills INTEGER,
+                deaths INTEGER,
+                assists INTEGER,
+                wins INTEGER,
+                losses INTEGER,
+                rating REAL,
+                PRIMARY KEY (player_id, step, bucket)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Per ordered pair of opponents: player_a's record in matches against player_b
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS head_to_head (
+                player_a TEXT,
+                player_b TEXT,
+                matches INTEGER,
+                wins INTEGER,
+                losses INTEGER,
+                kills INTEGER,
+                deaths INTEGER,
+                opponent_kills INTEGER,
+                opponent_deaths INTEGER,
+                last_played INTEGER,
+                PRIMARY KEY (player_a, player_b)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Archived seasons; each one's matches live in its own file (see seasons.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS seasons (
+                number INTEGER PRIMARY KEY,
+                starts_at INTEGER,
+                ends_at INTEGER,
+                file TEXT,
+                matches INTEGER,
+                players INTEGER,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_admin_channels_guild_type
+            ON admin_channels (guild_id, channel_type)
+        ''')
+        
+        # Columns added after the first release
+        add_column(cursor, 'players', 'rating', f'REAL DEFAULT {RATING_INITIAL}')
+        add_column(cursor, 'players', 'rating_games', 'INTEGER DEFAULT 0')
+        
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_players_rating ON players (rating DESC)')
+        # Guild boards and stats on the SQL path only touch that guild's rows
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_players_server_kills ON players (server_id, total_kills DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_players_server_rating ON players (server_id, rating DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_match_stats_match ON match_stats (match_id)')
+        # Window leaderboards load one step's recent buckets across all players
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_player_rollups_step_bucket ON player_rollups (step, bucket)')
+        
+        # Filled from older matches by the backfill_derived_tables job, after startup
+        if cursor.execute("SELECT 1 FROM matches WHERE status = 'finished' LIMIT 1").fetchone():
+            for table in BACKFILLED_TABLES:
+                if cursor.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone() is None:
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO shared_state (key, value, updated_at)
+                        VALUES (?, '[]', CURRENT_TIMESTAMP)
+                    ''', (f"backfill:{table}",))
+        
         conn.commit()
         conn.close()
         logger.info("Database initialized successfully")
@@ -146,7 +358,7 @@ def validate_api_key(api_key):
             conn.commit()
             
             player_dict = {key: player[key] for key in player.keys()}
-            logger.info(f"API key validated for user: {player_dict.get('in_game_name')}")
+            auth_logger.info(f"API key validated for user: {player_dict.get('in_game_name')}")
             return player_dict
         return None
         
@@ -181,16 +393,34 @@ def fix_existing_keys():
         logger.error(f"Error fixing keys: {e}")
         return 0
 
-def get_global_stats():
-    """Get global statistics"""
+def get_global_stats(guild=None):
+    """Get global (or one guild's) statistics, from the in-memory snapshot once it's loaded"""
+    if stats_snapshot.ready:
+        totals = stats_snapshot.aggregate(guild)
+        total_deaths = totals['total_deaths'] or 1
+        return {
+            'total_players': totals['players'],
+            'total_kills': totals['total_kills'],
+            'total_deaths': total_deaths,
+            'total_wins': totals['wins'],
+            'total_losses': totals['losses'],
+            'total_games': totals['wins'] + totals['losses'],
+            'avg_kd': totals['total_kills'] / total_deaths
+        }
+    
     try:
         conn = get_db_connection()
         
-        total_players = conn.execute('SELECT COUNT(*) as count FROM players').fetchone()['count']
-        total_kills = conn.execute('SELECT SUM(total_kills) as sum FROM players').fetchone()['sum'] or 0
-        total_deaths = conn.execute('SELECT SUM(total_deaths) as sum FROM players').fetchone()['sum'] or 1
-        total_wins = conn.execute('SELECT SUM(wins) as sum FROM players').fetchone()['sum'] or 0
-        total_losses = conn.execute('SELECT SUM(losses) as sum FROM players').fetchone()['sum'] or 0
+        where, params = ('WHERE server_id = ?', (guild,)) if guild else ('', ())
+        row = conn.execute(f'''
+            SELECT COUNT(*), SUM(total_kills), SUM(total_deaths), SUM(wins), SUM(losses)
+            FROM players {where}
+        ''', params).fetchone()
+        total_players = row[0]
+        total_kills = row[1] or 0
+        total_deaths = row[2] or 1
+        total_wins = row[3] or 0
+        total_losses = row[4] or 0
         
         conn.close()
         
@@ -216,39 +446,854 @@ def get_global_stats():
             'avg_kd': 0
         }
 
-def get_leaderboard(limit=10):
-    """Get leaderboard data"""
+# Leaderboard metric -> (sort expression, who appears on the board), for the SQL path
+LEADERBOARD_SQL = {
+    'kd': ('CAST(total_kills AS FLOAT) / MAX(total_deaths, 1)', 'total_kills >= 1'),
+    'kills': ('total_kills', 'total_kills >= 1'),
+    'wins': ('wins', 'wins + losses >= 1'),
+    'winrate': ('CAST(wins AS FLOAT) / MAX(wins + losses, 1)', f'wins + losses >= {LEADERBOARD_MIN_GAMES}'),
+    'prestige': ('prestige', 'wins + losses >= 1'),
+    'rating': ('rating', 'rating_games > 0')
+}
+
+def leaderboard_entry(player, rank):
+    games = (player['wins'] or 0) + (player['losses'] or 0)
+    return {
+        "rank": rank,
+        "name": player['in_game_name'] or player['discord_name'],
+        "kills": player['total_kills'],
+        "deaths": player['total_deaths'],
+        "kd": round((player['total_kills'] or 0) / max(player['total_deaths'] or 0, 1), 2),
+        "wins": player['wins'],
+        "losses": player['losses'],
+        "win_rate": round((player['wins'] or 0) / games * 100, 1) if games else 0.0,
+        "prestige": player['prestige'],
+        "rating": round(player['rating'] or RATING_INITIAL),
+        "api_key": player['api_key']
+    }
+
+def get_leaderboard_page(metric='kd', offset=0, limit=10, guild=None):
+    """One page of a leaderboard as (players on the board, entries)
+    
+    Served from the snapshot's maintained ordering once it's loaded, which
+    costs the same at any offset; until then from SQLite with LIMIT/OFFSET.
+    """
+    if metric not in LEADERBOARD_SQL:
+        metric = 'kd'
+    
+    if stats_snapshot.ready:
+        total, players = stats_snapshot.page(metric, offset, limit, guild)
+        return total, [leaderboard_entry(player, player['rank']) for player in players]
+    
     try:
         conn = get_db_connection()
+        expression, condition = LEADERBOARD_SQL[metric]
+        params = []
+        if guild is not None:
+            condition += ' AND server_id = ?'
+            params.append(guild)
+        
+        total = conn.execute(f'SELECT COUNT(*) FROM players WHERE {condition}', params).fetchone()[0]
+        players = conn.execute(f'''
+            SELECT discord_name, in_game_name, total_kills, total_deaths,
+                   wins, losses, prestige, rating, api_key
+            FROM players
+            WHERE {condition}
+            ORDER BY {expression} DESC, total_kills DESC, id
+            LIMIT ? OFFSET ?
+        ''', params + [limit, offset]).fetchall()
+        conn.close()
         
-        top_players = conn.execute('''
-            SELECT discord_name, in_game_name, total_kills, total_deaths, 
-                   CAST(total_kills AS FLOAT) / MAX(total_deaths, 1) as kd_ratio,
-                   wins, losses, prestige, api_key
-            FROM players 
-            WHERE total_kills >= 1
-            ORDER BY kd_ratio DESC, total_kills DESC
-            LIMIT ?
-        ''', (limit,)).fetchall()
+        return total, [leaderboard_entry(player, rank) for rank, player in enumerate(players, offset + 1)]
         
+    except Exception as e:
+        logger.error(f"Error getting {metric} leaderboard: {e}")
+        return 0, []
+
+def get_leaderboard(limit=10, sort='kd'):
+    """Get the top of the K/D (or rating) leaderboard"""
+    return get_leaderboard_page('rating' if sort == 'rating' else 'kd', 0, limit)[1]
+
+# Window leaderboard metric -> (sort expression, who appears), over summed rollups
+WINDOW_SQL = {
+    'kills': ('k', 'k >= 1'),
+    'kd': ('CAST(k AS FLOAT) / MAX(d, 1)', 'k >= 1'),
+    'wins': ('w', 'w + l >= 1'),
+    'winrate': ('CAST(w AS FLOAT) / MAX(w + l, 1)', f'w + l >= {LEADERBOARD_MIN_GAMES}')
+}
+
+def window_entry(rank, name, kills, deaths, wins, losses):
+    games = wins + losses
+    return {
+        "rank": rank,
+        "name": name,
+        "kills": kills,
+        "deaths": deaths,
+        "kd": round(kills / max(deaths, 1), 2),
+        "wins": wins,
+        "losses": losses,
+        "win_rate": round(wins / games * 100, 1) if games else 0.0
+    }
+
+def get_window_leaderboard_page(window='week', metric='kills', offset=0, limit=10, guild=None):
+    """One page of a day/week/season leaderboard as (players on the board, entries)
+    
+    Served from the rolling in-memory boards once loaded; until then by
+    summing that window's rollup buckets in SQLite.
+    """
+    if metric not in WINDOW_SQL:
+        metric = 'kills'
+    
+    try:
+        conn = get_db_connection()
+        
+        if window_boards.ready:
+            total, rows = window_boards.page(window, metric, offset, limit, guild)
+            placeholders = ','.join('?' * len(rows))
+            names = dict(conn.execute(
+                f'SELECT discord_id, COALESCE(in_game_name, discord_name) FROM players WHERE discord_id IN ({placeholders})',
+                [player_id for _, player_id, _ in rows]
+            ).fetchall()) if rows else {}
+            conn.close()
+            return total, [window_entry(rank, names.get(player_id, player_id), *counts)
+                           for rank, player_id, counts in rows]
+        
+        expression, condition = WINDOW_SQL[metric]
+        params = [WINDOWS[window][0], window_start(window, int(time.time()))]
+        where = 'r.step = ? AND r.bucket >= ?'
+        if guild is not None:
+            where += ' AND p.server_id = ?'
+            params.append(guild)
+        summed = f'''
+            SELECT r.player_id, COALESCE(p.in_game_name, p.discord_name) AS name,
+                   SUM(r.kills) AS k, SUM(r.deaths) AS d, SUM(r.wins) AS w, SUM(r.losses) AS l
+            FROM player_rollups r JOIN players p ON p.discord_id = r.player_id
+            WHERE {where}
+            GROUP BY r.player_id
+        '''
+        
+        total = conn.execute(f'SELECT COUNT(*) FROM ({summed}) WHERE {condition}', params).fetchone()[0]
+        rows = conn.execute(f'''
+            SELECT name, k, d, w, l FROM ({summed})
+            WHERE {condition}
+            ORDER BY {expression} DESC, k DESC, player_id
+            LIMIT ? OFFSET ?
+        ''', params + [limit, offset]).fetchall()
+        conn.close()
+        
+        return total, [window_entry(rank, *row) for rank, row in enumerate(rows, offset + 1)]
+        
+    except Exception as e:
+        logger.error(f"Error getting {window} {metric} leaderboard: {e}")
+        return 0, []
+
+def get_lobby_players(discord_ids):
+    """Rating and K/D for the given players, in request order; unknown ids are skipped"""
+    try:
+        conn = get_db_connection()
+        placeholders = ','.join('?' * len(discord_ids))
+        rows = conn.execute(f'''
+            SELECT discord_id, discord_name, in_game_name, rating,
+                   CAST(total_kills AS FLOAT) / MAX(total_deaths, 1) as kd_ratio
+            FROM players
+            WHERE discord_id IN ({placeholders})
+        ''', list(discord_ids)).fetchall()
         conn.close()
         
-        leaderboard = []
-        for i, player in enumerate(top_players, 1):
-            leaderboard.append({
-                "rank": i,
-                "name": player['in_game_name'] or player['discord_name'],
-                "kills": player['total_kills'],
-                "deaths": player['total_deaths'],
-                "kd": round(player['kd_ratio'], 2),
-                "wins": player['wins'],
-                "losses": player['losses'],
-                "prestige": player['prestige'],
-                "api_key": player['api_key']
-            })
-        
-        return leaderboard
-        
-    except Exception as e:
-        logger.error(f"Error getting leaderboard: {e}")
-        return []
\ No newline at end of file
+        found = {row['discord_id']: row for row in rows}
+        return [{
+            "discord_id": found[pid]['discord_id'],
+            "name": found[pid]['in_game_name'] or found[pid]['discord_name'],
+            "rating": round(found[pid]['rating'] or RATING_INITIAL, 1),
+            "kd": round(found[pid]['kd_ratio'] or 0.0, 2)
+        } for pid in discord_ids if pid in found]
+        
+    except Exception as e:
+        logger.error(f"Error getting lobby players: {e}")
+        return []
+
+# =============================================================================
+# MATCHES
+# =============================================================================
+
+def finish_match(match_id, team1_players, team2_players, team1_score, team2_score, player_stats,
+                 started_at=None, ended_at=None):
+    """Record a finished match in one transaction: match row, per-player stats,
+    lifetime totals and ratings. player_stats is a list of dicts with player_id,
+    player_name, team (1 or 2), kills, deaths, assists.
+    
+    Returns the rating changes, None if the match was already finished, or
+    False on error.
+    """
+    if team1_score > team2_score:
+        winner = 'team1'
+    elif team2_score > team1_score:
+        winner = 'team2'
+    else:
+        winner = 'draw'
+    ended_at = ended_at or datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        cursor = conn.execute('''
+            INSERT INTO matches (match_id, team1_players, team2_players, team1_score, team2_score,
+                                 status, winner, started_at, ended_at)
+            VALUES (?, ?, ?, ?, ?, 'finished', ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+            ON CONFLICT(match_id) DO UPDATE SET
+                team1_players = excluded.team1_players, team2_players = excluded.team2_players,
+                team1_score = excluded.team1_score, team2_score = excluded.team2_score,
+                status = 'finished', winner = excluded.winner, ended_at = excluded.ended_at
+            WHERE matches.status != 'finished'
+        ''', (match_id, json.dumps(team1_players), json.dumps(team2_players), team1_score, team2_score,
+              winner, started_at, ended_at))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return None
+        
+        conn.executemany('''
+            INSERT INTO match_stats (match_id, player_id, player_name, team, kills, deaths, assists)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(match_id, str(s['player_id']), s.get('player_name'), int(s['team']),
+               int(s.get('kills', 0)), int(s.get('deaths', 0)), int(s.get('assists', 0)))
+              for s in player_stats])
+        
+        for s in player_stats:
+            won = winner == f"team{int(s['team'])}"
+            lost = winner != 'draw' and not won
+            conn.execute('''
+                UPDATE players
+                SET total_kills = total_kills + ?, total_deaths = total_deaths + ?,
+                    wins = wins + ?, losses = losses + ?
+                WHERE discord_id = ?
+            ''', (int(s.get('kills', 0)), int(s.get('deaths', 0)), int(won), int(lost), str(s['player_id'])))
+        
+        changes = apply_match(conn, [str(p) for p in team1_players], [str(p) for p in team2_players], winner)
+        record_player_history(conn, match_id, ended_at, winner, player_stats, changes)
+        record_head_to_head(conn, ended_at, winner, player_stats)
+        conn.commit()
+        return changes
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error finishing match {match_id}: {e}")
+        return False
+
+# =============================================================================
+# SHARED STATE
+# =============================================================================
+
+# key -> (value, expires); reads may be up to SHARED_STATE_TTL seconds stale
+shared_state_cache = {}
+shared_state_lock = threading.Lock()
+
+def get_shared(key, default=None):
+    """Read a value every worker sees, through a short per-process cache"""
+    now = time.monotonic()
+    with shared_state_lock:
+        cached = shared_state_cache.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+    
+    try:
+        conn = get_db_connection()
+        row = conn.execute('SELECT value FROM shared_state WHERE key = ?', (key,)).fetchone()
+        value = json.loads(row['value']) if row else default
+    except Exception as e:
+        logger.error(f"Error reading shared state {key}: {e}")
+        return default
+    
+    with shared_state_lock:
+        shared_state_cache[key] = (value, now + SHARED_STATE_TTL)
+    return value
+
+def set_shared(key, value):
+    """Write a value for every worker"""
+    try:
+        conn = get_db_connection()
+        conn.execute('''
+            INSERT INTO shared_state (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+        ''', (key, json.dumps(value)))
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error writing shared state {key}: {e}")
+        return False
+    
+    with shared_state_lock:
+        shared_state_cache[key] = (value, time.monotonic() + SHARED_STATE_TTL)
+    return True
+
+def incr_shared(key, amount=1):
+    """Atomically add to a shared counter; returns the new value or None"""
+    try:
+        conn = get_db_connection()
+        # The upsert takes the write lock, so the read below sees exactly our increment
+        conn.execute('''
+            INSERT INTO shared_state (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + excluded.value,
+                                           updated_at = excluded.updated_at
+        ''', (key, amount))
+        value = int(conn.execute('SELECT value FROM shared_state WHERE key = ?', (key,)).fetchone()['value'])
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error incrementing shared counter {key}: {e}")
+        return None
+    
+    with shared_state_lock:
+        shared_state_cache[key] = (value, time.monotonic() + SHARED_STATE_TTL)
+    return value
+
+def get_version(name):
+    """Cache invalidation version for name; workers drop local copies when it moves"""
+    return get_shared(f"version:{name}", 0)
+
+def bump_version(name):
+    return incr_shared(f"version:{name}")
+
+def claim_shared(key):
+    """Claim key for this worker; False if any worker claimed it first"""
+    try:
+        conn = get_db_connection()
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO shared_state (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)',
+            (f"claim:{key}", json.dumps(os.getpid()))
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+    except Exception as e:
+        logger.error(f"Error claiming {key}: {e}")
+        # Fail open: doing the work twice beats dropping it
+        return True
+
+def release_shared(key):
+    """Drop this worker's claim on key so a retry can claim it again"""
+    try:
+        conn = get_db_connection()
+        conn.execute('DELETE FROM shared_state WHERE key = ?', (f"claim:{key}",))
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error releasing {key}: {e}")
+
+def finish_shared(key, result):
+    """Store the claimed work's result on the claim for other workers to read"""
+    try:
+        conn = get_db_connection()
+        conn.execute(
+            'UPDATE shared_state SET value = ?, updated_at = CURRENT_TIMESTAMP WHERE key = ?',
+            (json.dumps({"result": result}), f"claim:{key}")
+        )
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error finishing {key}: {e}")
+
+def wait_shared(key, timeout, poll=0.1):
+    """Wait up to timeout seconds for another worker's finish_shared result on key;
+    None if it's still working, gave up its claim, or the read fails
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        conn = get_db_connection()
+        while True:
+            row = conn.execute('SELECT value FROM shared_state WHERE key = ?', (f"claim:{key}",)).fetchone()
+            if row is None:
+                return None
+            value = json.loads(row['value'])
+            if isinstance(value, dict) and "result" in value:
+                return value["result"]
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(poll)
+    except Exception as e:
+        logger.error(f"Error waiting for {key}: {e}")
+        return None
+
+def purge_shared_claims(max_age_seconds):
+    """Delete claims older than max_age_seconds; returns how many"""
+    try:
+        conn = get_db_connection()
+        cursor = conn.execute(
+            "DELETE FROM shared_state WHERE key LIKE 'claim:%' AND updated_at < datetime('now', ?)",
+            (f"-{int(max_age_seconds)} seconds",)
+        )
+        conn.commit()
+        return cursor.rowcount
+    except Exception as e:
+        logger.error(f"Error purging shared claims: {e}")
+        return 0
+
+def set_bot_status(active, info=None):
+    """Record the Discord bot's status for every worker"""
+    return set_shared('bot_status', {
+        "active": bool(active),
+        "info": info or {},
+        "checked_at": datetime.utcnow().isoformat()
+    })
+
+def get_bot_status():
+    return get_shared('bot_status', {"active": False, "info": {}, "checked_at": None})
+
+def is_bot_active():
+    return get_bot_status().get('active', False)
+
+# =============================================================================
+# ADMIN CHANNEL INDEX
+# =============================================================================
+
+# (guild_id, channel_type) -> channel_id, backed by the admin_channels table and
+# dropped whenever another worker bumps the admin_channels version
+admin_channel_cache = {}
+admin_channel_lock = threading.Lock()
+admin_channel_version = [0]
+
+def sync_admin_channel_cache():
+    version = get_version('admin_channels')
+    with admin_channel_lock:
+        if version != admin_channel_version[0]:
+            admin_channel_cache.clear()
+            admin_channel_version[0] = version
+
+def publish_admin_channel_change(key, channel_id):
+    """Update this worker's entry and tell the other workers to drop theirs"""
+    version = bump_version('admin_channels')
+    with admin_channel_lock:
+        # Any other change since our last sync means our whole copy is suspect
+        if version is None or version != admin_channel_version[0] + 1:
+            admin_channel_cache.clear()
+        if version is not None:
+            admin_channel_version[0] = version
+        if channel_id is None:
+            admin_channel_cache.pop(key, None)
+        else:
+            admin_channel_cache[key] = channel_id
+
+def get_admin_channel(guild_id, channel_type):
+    """Look up a recorded admin channel, checking memory before SQLite"""
+    if not guild_id:
+        return None
+    
+    sync_admin_channel_cache()
+    key = (str(guild_id), channel_type)
+    with admin_channel_lock:
+        if key in admin_channel_cache:
+            return admin_channel_cache[key]
+    
+    try:
+        conn = get_db_connection()
+        row = conn.execute(
+            '''SELECT channel_id FROM admin_channels
+               WHERE guild_id = ? AND channel_type = ?
+               ORDER BY id DESC LIMIT 1''',
+            key
+        ).fetchone()
+    except Exception as e:
+        logger.error(f"Error looking up admin channel: {e}")
+        return None
+    
+    if not row:
+        return None
+    
+    with admin_channel_lock:
+        admin_channel_cache[key] = row['channel_id']
+    return row['channel_id']
+
+def save_admin_channel(channel_id, guild_id, channel_type, created_by_id=None, created_by_name=None):
+    """Record an admin channel, replacing any previous one of the same type in the guild"""
+    if not channel_id or not guild_id:
+        return False
+    
+    key = (str(guild_id), channel_type)
+    try:
+        conn = get_db_connection()
+        conn.execute(
+            'DELETE FROM admin_channels WHERE (guild_id = ? AND channel_type = ?) OR channel_id = ?',
+            (key[0], key[1], str(channel_id))
+        )
+        conn.execute('''
+            INSERT INTO admin_channels (channel_id, guild_id, created_by_id, created_by_name, channel_type)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (str(channel_id), key[0], created_by_id, created_by_name, channel_type))
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error saving admin channel: {e}")
+        return False
+    
+    publish_admin_channel_change(key, str(channel_id))
+    return True
+
+def forget_admin_channel(guild_id, channel_type):
+    """Drop a stale admin channel record from SQLite and the in-memory index"""
+    key = (str(guild_id), channel_type)
+    with admin_channel_lock:
+        admin_channel_cache.pop(key, None)
+    
+    try:
+        conn = get_db_connection()
+        conn.execute(
+            'DELETE FROM admin_channels WHERE guild_id = ? AND channel_type = ?',
+            key
+        )
+        conn.commit()
+        publish_admin_channel_change(key, None)
+        return True
+    except Exception as e:
+        logger.error(f"Error removing admin channel: {e}")
+        return False
+
+# =============================================================================
+# COMMAND REGISTRATION STATE
+# =============================================================================
+
+def get_command_hash(scope):
+    """Get the command definition hash last registered for a scope"""
+    try:
+        conn = get_db_connection()
+        row = conn.execute(
+            'SELECT command_hash FROM command_registrations WHERE scope = ?',
+            (scope,)
+        ).fetchone()
+        return row['command_hash'] if row else None
+    except Exception as e:
+        logger.error(f"Error reading command hash: {e}")
+        return None
+
+def save_command_hash(scope, command_hash, command_count):
+    """Remember the command definition hash registered for a scope"""
+    try:
+        conn = get_db_connection()
+        conn.execute('''
+            INSERT OR REPLACE INTO command_registrations (scope, command_hash, command_count, registered_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (scope, command_hash, command_count))
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error saving command hash: {e}")
+        return False
+
+# =============================================================================
+# PLAYER HISTORY
+# =============================================================================
+
+# Rollup steps and their bucket width in seconds; weeks start on Monday
+HISTORY_STEPS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+# 1970-01-05, the first Monday after the epoch
+WEEK_OFFSET = 4 * 86400
+
+def bucket_start(ts, step):
+    """Start (epoch seconds) of the rollup bucket holding ts"""
+    offset = WEEK_OFFSET if step == 'week' else 0
+    return ts - (ts - offset) % HISTORY_STEPS[step]
+
+def match_ts(ended_at):
+    """matches.ended_at text as epoch seconds"""
+    return calendar.timegm(datetime.strptime(ended_at[:19], '%Y-%m-%d %H:%M:%S').timetuple())
+
+def record_player_history(conn, match_id, ended_at, winner, player_stats, changes):
+    """Append a finished match to player_history and fold it into every rollup step
+    
+    Runs inside finish_match's transaction. changes holds ratings after the match.
+    """
+    ts = match_ts(ended_at)
+    rows = []
+    for s in player_stats:
+        player_id = str(s['player_id'])
+        won = int(winner == f"team{int(s['team'])}")
+        lost = int(winner != 'draw' and not won)
+        rating = changes.get(player_id, {}).get('new')
+        rows.append((player_id, int(s.get('kills', 0)), int(s.get('deaths', 0)), int(s.get('assists', 0)),
+                     won, lost, rating, int(s['team'])))
+    
+    conn.executemany('''
+        INSERT OR IGNORE INTO player_history (player_id, ts, match_id, team, kills, deaths, assists, won, lost, rating)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(pid, ts, match_id, team, k, d, a, w, l, r) for pid, k, d, a, w, l, r, team in rows])
+    conn.executemany('''
+        INSERT INTO player_rollups (player_id, step, bucket, matches, kills, deaths, assists, wins, losses, rating)
+        VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(player_id, step, bucket) DO UPDATE SET
+            matches = matches + 1,
+            kills = kills + excluded.kills, deaths = deaths + excluded.deaths,
+            assists = assists + excluded.assists,
+            wins = wins + excluded.wins, losses = losses + excluded.losses,
+            rating = COALESCE(excluded.rating, rating)
+    ''', [(pid, step, bucket_start(ts, step), k, d, a, w, l, r)
+          for pid, k, d, a, w, l, r, _ in rows for step in HISTORY_STEPS])
+
+def backfill_player_history(cursor):
+    """Build player_history and the rollups from matches recorded before they existed
+    
+    Historical ratings aren't known, so backfilled rows carry a NULL rating;
+    a rollup keeps the latest rating its bucket does have, from matches
+    finish_match recorded while the backfill was pending.
+    """
+    cursor.execute('''
+        INSERT OR IGNORE INTO player_history (player_id, ts, match_id, team, kills, deaths, assists, won, lost, rating)
+        SELECT s.player_id, CAST(strftime('%s', COALESCE(m.ended_at, m.started_at)) AS INTEGER), s.match_id,
+               s.team, s.kills, s.deaths, s.assists,
+               m.winner = 'team' || s.team,
+               m.winner IN ('team1', 'team2') AND m.winner != 'team' || s.team,
+               NULL
+        FROM match_stats s JOIN matches m ON m.match_id = s.match_id
+        WHERE m.status = 'finished'
+    ''')
+    backfilled = cursor.rowcount
+    if backfilled <= 0:
+        return
+    
+    for step, width in HISTORY_STEPS.items():
+        offset = WEEK_OFFSET if step == 'week' else 0
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO player_rollups
+                (player_id, step, bucket, matches, kills, deaths, assists, wins, losses, rating)
+            SELECT player_id, ?, ts - (ts - {offset}) % {width} AS bucket, COUNT(*),
+                   SUM(kills), SUM(deaths), SUM(assists), SUM(won), SUM(lost),
+                   (SELECT r.rating FROM player_history r
+                    WHERE r.player_id = h.player_id AND r.ts >= h.ts - (h.ts - {offset}) % {width}
+                      AND r.ts < h.ts - (h.ts - {offset}) % {width} + {width}
+                      AND r.rating IS NOT NULL
+                    ORDER BY r.ts DESC LIMIT 1)
+            FROM player_history h
+            GROUP BY player_id, bucket
+        ''', (step,))
+    logger.info(f"Backfilled player history with {backfilled} match rows")
+
+def get_player_history(player_id, since, step, limit):
+    """Up to limit of a player's most recent chart points from since (epoch seconds) on
+    
+    step is a rollup step, or 'match' for the raw per-match history.
+    Returns a list of dicts, oldest first; empty buckets are omitted.
+    """
+    try:
+        conn = get_db_connection()
+        if step == 'match':
+            rows = conn.execute('''
+                SELECT ts AS bucket, 1 AS matches, kills, deaths, assists, won AS wins, lost AS losses, rating
+                FROM player_history
+                WHERE player_id = ? AND ts >= ?
+                ORDER BY ts DESC
+                LIMIT ?
+            ''', (player_id, since, limit)).fetchall()
+        else:
+            rows = conn.execute('''
+                SELECT bucket, matches, kills, deaths, assists, wins, losses, rating
+                FROM player_rollups
+                WHERE player_id = ? AND step = ? AND bucket >= ?
+                ORDER BY bucket DESC
+                LIMIT ?
+            ''', (player_id, step, bucket_start(since, step), limit)).fetchall()
+        conn.close()
+        rows.reverse()
+        
+        return [{
+            "t": datetime.utcfromtimestamp(row['bucket']).isoformat(),
+            "matches": row['matches'],
+            "kills": row['kills'],
+            "deaths": row['deaths'],
+            "assists": row['assists'],
+            "wins": row['wins'],
+            "losses": row['losses'],
+            "kd": round(row['kills'] / max(row['deaths'], 1), 2),
+            "rating": row['rating']
+        } for row in rows]
+        
+    except Exception as e:
+        logger.error(f"Error getting history for {player_id}: {e}")
+        return []
+
+# =============================================================================
+# HEAD TO HEAD
+# =============================================================================
+
+# Adds one match (or a backfilled batch) to a pair's row
+HEAD_TO_HEAD_UPSERT = '''
+    ON CONFLICT(player_a, player_b) DO UPDATE SET
+        matches = matches + excluded.matches,
+        wins = wins + excluded.wins, losses = losses + excluded.losses,
+        kills = kills + excluded.kills, deaths = deaths + excluded.deaths,
+        opponent_kills = opponent_kills + excluded.opponent_kills,
+        opponent_deaths = opponent_deaths + excluded.opponent_deaths,
+        last_played = MAX(last_played, excluded.last_played)
+'''
+
+def record_head_to_head(conn, ended_at, winner, player_stats):
+    """Fold a finished match into head_to_head, both directions of every opposing pair
+    
+    Matches only report each player's totals, so kills and deaths are those
+    in games against the opponent rather than kills of that opponent.
+    Runs inside finish_match's transaction; skipped while the backfill is
+    pending, since that counts this match itself.
+    """
+    if conn.execute("SELECT 1 FROM shared_state WHERE key = 'backfill:head_to_head'").fetchone():
+        return
+    ts = match_ts(ended_at)
+    players = [(str(s['player_id']), int(s['team']), int(s.get('kills', 0)), int(s.get('deaths', 0)))
+               for s in player_stats]
+    rows = []
+    for a, team_a, kills_a, deaths_a in players:
+        won = int(winner == f"team{team_a}")
+        lost = int(winner != 'draw' and not won)
+        for b, team_b, kills_b, deaths_b in players:
+            if team_b != team_a:
+                rows.append((a, b, won, lost, kills_a, deaths_a, kills_b, deaths_b, ts))
+    
+    conn.executemany('''
+        INSERT INTO head_to_head (player_a, player_b, matches, wins, losses, kills, deaths,
+                                  opponent_kills, opponent_deaths, last_played)
+        VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+    ''' + HEAD_TO_HEAD_UPSERT, rows)
+
+def backfill_head_to_head(cursor, schema='main'):
+    """Add every finished match in schema (main or an attached archive) to head_to_head"""
+    cursor.execute(f'''
+        INSERT INTO main.head_to_head (player_a, player_b, matches, wins, losses, kills, deaths,
+                                       opponent_kills, opponent_deaths, last_played)
+        SELECT a.player_id, b.player_id, COUNT(*),
+               SUM(m.winner = ('team' || a.team)), SUM(m.winner = ('team' || b.team)),
+               SUM(a.kills), SUM(a.deaths), SUM(b.kills), SUM(b.deaths),
+               MAX(CAST(strftime('%s', COALESCE(m.ended_at, m.started_at)) AS INTEGER))
+        FROM {schema}.match_stats a
+        JOIN {schema}.match_stats b ON b.match_id = a.match_id AND b.team != a.team
+        JOIN {schema}.matches m ON m.match_id = a.match_id
+        WHERE m.status = 'finished'
+        GROUP BY a.player_id, b.player_id
+    ''' + HEAD_TO_HEAD_UPSERT)
+
+# =============================================================================
+# BACKFILLS
+# =============================================================================
+
+BACKFILLED_TABLES = ("player_history", "head_to_head")
+
+def backfill_derived_tables():
+    """Scheduler job: fill the tables init_db marked from matches recorded before they existed
+    
+    The marker (shared_state 'backfill:<table>') lists the sources already
+    done, so an interrupted run picks up where it stopped. head_to_head reads
+    each archived season in its own transaction (ATTACH can't happen inside
+    one), then the main database in the one that drops the marker.
+    """
+    from seasons import archived_seasons, attached, season_path
+    
+    conn = get_db_connection()
+    filled = False
+    try:
+        for table in BACKFILLED_TABLES:
+            key = f"backfill:{table}"
+            while True:
+                row = conn.execute('SELECT value FROM shared_state WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    break
+                done = json.loads(row['value'])
+                pending = [] if table == 'player_history' else \
+                    [s['file'] for s in archived_seasons(conn) if s['file'] not in done]
+                
+                if pending:
+                    with attached(conn, season_path(pending[0])) as alias:
+                        conn.execute('BEGIN IMMEDIATE')
+                        backfill_head_to_head(conn.cursor(), alias)
+                        conn.execute('UPDATE shared_state SET value = ?, updated_at = CURRENT_TIMESTAMP WHERE key = ?',
+                                     (json.dumps(done + pending[:1]), key))
+                        conn.commit()
+                    continue
+                
+                conn.execute('BEGIN IMMEDIATE')
+                # A season archived since the check is read on the next pass
+                if table == 'head_to_head' and any(s['file'] not in done for s in archived_seasons(conn)):
+                    conn.rollback()
+                    continue
+                if table == 'player_history':
+                    backfill_player_history(conn.cursor())
+                else:
+                    backfill_head_to_head(conn.cursor())
+                conn.execute('DELETE FROM shared_state WHERE key = ?', (key,))
+                conn.commit()
+                filled = True
+                logger.info(f"Backfilled {table}")
+        
+        if filled:
+            bump_version('player_stats')
+        return filled
+    except Exception as e:
+        logger.error(f"Backfill error: {e}")
+        if conn.in_transaction:
+            conn.rollback()
+        return False
+
+def get_head_to_head(player_a, player_b):
+    """player_a's record against player_b, or None if they've never met"""
+    try:
+        conn = get_db_connection()
+        row = conn.execute('''
+            SELECT h.*, COALESCE(pa.in_game_name, pa.discord_name) AS name_a,
+                   COALESCE(pb.in_game_name, pb.discord_name) AS name_b
+            FROM head_to_head h
+            LEFT JOIN players pa ON pa.discord_id = h.player_a
+            LEFT JOIN players pb ON pb.discord_id = h.player_b
+            WHERE h.player_a = ? AND h.player_b = ?
+        ''', (str(player_a), str(player_b))).fetchone()
+        conn.close()
+        
+        if row is None:
+            return None
+        return {
+            "player": {"id": row['player_a'], "name": row['name_a'], "kills": row['kills'], "deaths": row['deaths'],
+                       "kd": round(row['kills'] / max(row['deaths'], 1), 2)},
+            "opponent": {"id": row['player_b'], "name": row['name_b'], "kills": row['opponent_kills'],
+                         "deaths": row['opponent_deaths'],
+                         "kd": round(row['opponent_kills'] / max(row['opponent_deaths'], 1), 2)},
+            "matches": row['matches'],
+            "wins": row['wins'],
+            "losses": row['losses'],
+            "draws": row['matches'] - row['wins'] - row['losses'],
+            "last_played": row['last_played']
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting head-to-head for {player_a} vs {player_b}: {e}")
+        return None
+
+# =============================================================================
+# MAINTENANCE
+# =============================================================================
+
+def optimize_database():
+    """Refresh query planner statistics and return free pages to the OS"""
+    try:
+        conn = get_db_connection()
+        conn.execute('PRAGMA optimize')
+        # A no-op unless the file was created with auto_vacuum = INCREMENTAL
+        conn.execute('PRAGMA incremental_vacuum(500)').fetchall()
+        return True
+    except Exception as e:
+        logger.error(f"Error optimizing database: {e}")
+        return False
+
+def checkpoint_wal():
+    """Fold the WAL back into the database file and truncate it"""
+    try:
+        conn = get_db_connection()
+        busy, log_pages, checkpointed = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        if busy:
+            logger.warning(f"WAL checkpoint blocked by readers ({checkpointed}/{log_pages} pages)")
+        return not busy
+    except Exception as e:
+        logger.error(f"Error checkpointing WAL: {e}")
+        return False
+
+def sweep_orphan_tickets(max_age_minutes):
+    """Close open tickets whose channel was never created; returns how many"""
+    try:
+        conn = get_db_connection()
+        cursor = conn.execute('''
+            UPDATE tickets
+            SET status = "closed", resolved_at = CURRENT_TIMESTAMP, assigned_to = "system"
+            WHERE status = "open" AND channel_id IS NULL
+              AND created_at < datetime('now', ?)
+        ''', (f"-{int(max_age_minutes)} minutes",))
+        conn.commit()
+        if cursor.rowcount:
+            logger.info(f"Closed {cursor.rowcount} orphaned tickets")
+        return cursor.rowcount
+    except Exception as e:
+        logger.error(f"Error sweeping orphaned tickets: {e}")
+        return 0
@@ -1,33 +1,61 @@
 # discord_bot.py - Discord bot interactions and slash commands
+import re
 import time
+import json
 import random
+import hashlib
 import requests
 from datetime import datetime
 from config import (
-    DISCORD_TOKEN, DISCORD_CLIENT_ID, DISCORD_PUBLIC_KEY,
+    DISCORD_TOKEN, DISCORD_CLIENT_ID, DISCORD_PUBLIC_KEY, DISCORD_API_BASE,
     ADMIN_ROLE_ID, TICKET_WEBHOOK, SCORE_WEBHOOK,
     TOXIC_PING_RESPONSES, NORMAL_PING_RESPONSES, TICKET_CATEGORIES,
-    score_matches, stats_webhooks, bot_active, bot_info, logger,
-    generate_secure_key
+    KEY_DATABASE_CHANNEL_NAME, KEY_DATABASE_CHANNEL_TYPE,
+    INTERACTION_CACHE_SIZE, INTERACTION_CACHE_TTL, INTERACTION_DUPLICATE_WAIT,
+    BALANCE_MAX_PLAYERS, LEADERBOARD_PAGE_SIZE, logger, command_logger,
+    generate_secure_key, generate_ticket_id
+)
+from concurrency import CommandTimer, run_in_background, bot_budget
+from circuit_breaker import get_breaker, route_class
+from metrics import add_discord_time
+from tracing import add_span, set_attribute
+from interaction_cache import InteractionCache
+from balancer import balance_players
+from percentiles import player_percentiles
+from stats_snapshot import stats_snapshot
+from window_boards import window_boards
+from database import (
+    get_db_connection, validate_api_key,
+    get_admin_channel, save_admin_channel, forget_admin_channel,
+    get_command_hash, save_command_hash,
+    set_bot_status, claim_shared, release_shared, finish_shared, wait_shared, get_lobby_players, bump_version,
+    get_leaderboard_page, get_global_stats, get_window_leaderboard_page, WINDOW_SQL,
+    get_head_to_head
 )
-from database import get_db_connection, validate_api_key
 
 # =============================================================================
 # DISCORD API HELPERS
 # =============================================================================
 
 def discord_api_request(endpoint, method="GET", data=None):
-    """Make Discord API request"""
+    """Make Discord API request, failing fast while its route's circuit is open"""
     if not DISCORD_TOKEN:
         logger.error("DISCORD_TOKEN not set")
         return None
+    
+    breaker = get_breaker(route_class(endpoint))
+    if not breaker.allow():
+        logger.warning(f"Circuit {breaker.name} open - skipping {method} {endpoint}")
+        return None
         
     headers = {
         "Authorization": f"Bot {DISCORD_TOKEN}",
         "Content-Type": "application/json"
     }
     
-    url = f"https://discord.com/api/v10{endpoint}"
+    url = f"{DISCORD_API_BASE}{endpoint}"
+    started = time.perf_counter()
+    status = "error"
     
     try:
         if method == "GET":
@@ -42,6 +70,14 @@ def discord_api_request(endpoint, method="GET", data=None):
             response = requests.patch(url, headers=headers, json=data, timeout=5)
         else:
             return None
+        
+        status = response.status_code
+        
+        # Only rate limits and server errors count against the route; a 404 is an answer
+        if response.status_code == 429 or response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
             
         if response.status_code in [200, 201, 204]:
             return response.json() if response.content else True
@@ -49,8 +85,38 @@ def discord_api_request(endpoint, method="GET", data=None):
             logger.error(f"Discord API error {response.status_code}: {response.text}")
             return None
     except Exception as e:
+        breaker.record_failure()
         logger.error(f"Discord API request failed: {e}")
         return None
+    finally:
+        elapsed = time.perf_counter() - started
+        add_discord_time(elapsed, breaker.name, status)
+        add_span('discord', f"{method} {breaker.name}", started, elapsed, status=status)
+
+def post_webhook(url, data):
+    """POST to a webhook through the shared webhook circuit breaker"""
+    breaker = get_breaker("webhooks")
+    if not breaker.allow():
+        logger.warning("Circuit webhooks open - skipping webhook")
+        return None
+    
+    started = time.perf_counter()
+    try:
+        response = requests.post(url, json=data, timeout=5)
+    except Exception:
+        breaker.record_failure()
+        add_discord_time(time.perf_counter() - started, breaker.name, "error")
+        add_span('discord', "POST webhook", started, time.perf_counter() - started, status="error")
+        raise
+    elapsed = time.perf_counter() - started
+    add_discord_time(elapsed, breaker.name, response.status_code)
+    add_span('discord', "POST webhook", started, elapsed, status=response.status_code)
+    
+    if response.status_code == 429 or response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
 
 def get_guild_member(guild_id, user_id):
     """Get guild member info"""
@@ -80,8 +146,9 @@ def delete_channel(channel_id):
     """Delete a channel"""
     if not channel_id:
         return False
+    # Discord answers a channel delete with the deleted channel object
     result = discord_api_request(f"/channels/{channel_id}", "DELETE")
-    return result is True
+    return result is not None
 
 def get_discord_user(user_id):
     """Get Discord user info including avatar"""
@@ -165,8 +232,8 @@ def send_ticket_webhook(ticket_id, user_name, user_id, category, issue, channel_
             "avatar_url": "https://i.imgur.com/Lg9YqZm.png"
         }
         
-        response = requests.post(TICKET_WEBHOOK, json=data, timeout=5)
-        if response.status_code not in [200, 204]:
+        response = post_webhook(TICKET_WEBHOOK, data)
+        if response is not None and response.status_code not in [200, 204]:
             logger.error(f"Webhook failed: {response.status_code}")
             
     except Exception as e:
@@ -204,8 +271,8 @@ def send_score_update(match_id, team1_score, team2_score, team1_players, team2_p
             "avatar_url": "https://i.imgur.com/Lg9YqZm.png"
         }
         
-        response = requests.post(SCORE_WEBHOOK, json=data, timeout=5)
-        if response.status_code not in [200, 204]:
+        response = post_webhook(SCORE_WEBHOOK, data)
+        if response is not None and response.status_code not in [200, 204]:
             logger.error(f"Score webhook failed: {response.status_code}")
             
     except Exception as e:
@@ -215,8 +282,9 @@ def send_score_update(match_id, team1_score, team2_score, team1_players, team2_p
 # CHANNEL MANAGEMENT
 # =============================================================================
 
-def create_ticket_channel(guild_id, user_id, user_name, ticket_id, issue, category):
+def create_ticket_channel(guild_id, user_id, user_name, ticket_id, issue, category, timer=None):
     """Create private ticket channel with bot permissions"""
+    timer = timer or CommandTimer('ticket')
     try:
         if not guild_id:
             return None
@@ -266,7 +334,8 @@ def create_ticket_channel(guild_id, user_id, user_name, ticket_id, issue, catego
                 "deny": "0"
             })
         
-        channel = create_guild_channel(guild_id, channel_data)
+        with timer.step('create_channel'):
+            channel = create_guild_channel(guild_id, channel_data)
         if not channel:
             return None
         
@@ -288,9 +357,11 @@ def create_ticket_channel(guild_id, user_id, user_name, ticket_id, issue, catego
             "embeds": [embed]
         }
         
-        discord_api_request(f"/channels/{channel['id']}/messages", "POST", welcome_message)
-        
-        send_ticket_webhook(ticket_id, user_name, user_id, category, issue, channel['id'], "created")
+        # Welcome message and webhook only need the channel id, so send them together
+        timer.parallel({
+            "welcome_message": (discord_api_request, f"/channels/{channel['id']}/messages", "POST", welcome_message),
+            "ticket_webhook": (send_ticket_webhook, ticket_id, user_name, user_id, category, issue, channel['id'], "created")
+        })
         
         logger.info(f"Created ticket channel: {channel['id']} for ticket {ticket_id}")
         return channel['id']
@@ -299,8 +370,20 @@ def create_ticket_channel(guild_id, user_id, user_name, ticket_id, issue, catego
         logger.error(f"Error creating ticket channel: {e}")
         return None
 
-def close_ticket_channel(channel_id, ticket_id, closed_by):
+def mark_ticket_closed(ticket_id, closed_by):
+    """Mark a ticket closed in the database"""
+    conn = get_db_connection()
+    conn.execute('''
+        UPDATE tickets 
+        SET status = "closed", resolved_at = CURRENT_TIMESTAMP, assigned_to = ?
+        WHERE ticket_id = ?
+    ''', (closed_by, ticket_id))
+    conn.commit()
+    return True
+
+def close_ticket_channel(channel_id, ticket_id, closed_by, timer=None):
     """Close ticket channel - bot has permission to delete"""
+    timer = timer or CommandTimer('close')
     try:
         if not channel_id or not ticket_id:
             return False
@@ -311,22 +394,19 @@ def close_ticket_channel(channel_id, ticket_id, closed_by):
             (ticket_id,)
         ).fetchone()
         
+        # Record the close first (a local write) so a failure never leaves an
+        # open ticket without its channel
         if ticket:
-            conn.execute('''
-                UPDATE tickets 
-                SET status = "closed", resolved_at = CURRENT_TIMESTAMP, assigned_to = ?
-                WHERE ticket_id = ?
-            ''', (closed_by, ticket_id))
-            conn.commit()
-        
-        conn.close()
+            with timer.step('db_update'):
+                mark_ticket_closed(ticket_id, closed_by)
         
-        # Bot always has permission to delete
-        delete_result = delete_channel(channel_id)
+        with timer.step('delete_channel'):
+            delete_result = delete_channel(channel_id)
         
         if ticket and delete_result:
-            send_ticket_webhook(ticket_id, ticket['discord_name'], ticket['discord_id'], 
-                              ticket['category'], ticket['issue'], None, "closed")
+            # Nobody waits on the webhook, so keep it off the critical path
+            run_in_background("ticket_webhook", send_ticket_webhook, ticket_id, ticket['discord_name'],
+                              ticket['discord_id'], ticket['category'], ticket['issue'], None, "closed")
             logger.info(f"Closed ticket {ticket_id} and deleted channel {channel_id}")
         elif not delete_result:
             logger.error(f"Failed to delete channel {channel_id}")
@@ -337,7 +417,7 @@ def close_ticket_channel(channel_id, ticket_id, closed_by):
         logger.error(f"Error closing ticket channel: {e}")
         return False
 
-def setup_key_database(guild_id, user_id):
+def setup_key_database(guild_id, user_id, user_name=None):
     """Setup a key database channel with bot permissions"""
     try:
         if not guild_id:
@@ -345,7 +425,7 @@ def setup_key_database(guild_id, user_id):
             
         # Create channel
         channel_data = {
-            "name": "api-key-database",
+            "name": KEY_DATABASE_CHANNEL_NAME,
             "type": 0,
             "topic": "API Keys Database - Private - DO NOT SHARE",
             "permission_overwrites": [
@@ -404,6 +484,8 @@ def setup_key_database(guild_id, user_id):
             "content": "# 🔐 API KEY DATABASE"
         })
         
+        save_admin_channel(channel['id'], guild_id, KEY_DATABASE_CHANNEL_TYPE, user_id, user_name)
+        
         logger.info(f"Created key database channel: {channel['id']}")
         return channel['id']
         
@@ -411,6 +493,30 @@ def setup_key_database(guild_id, user_id):
         logger.error(f"Error creating key database: {e}")
         return None
 
+def find_key_database_channel(guild_id, refresh=False):
+    """Find the key database channel via the admin_channels index, scanning the guild only on a miss"""
+    if not guild_id:
+        return None
+    
+    if not refresh:
+        channel_id = get_admin_channel(guild_id, KEY_DATABASE_CHANNEL_TYPE)
+        if channel_id:
+            return channel_id
+    
+    # Fallback: full channel scan, which re-records whatever it finds
+    channels = discord_api_request(f"/guilds/{guild_id}/channels")
+    if channels is None:
+        return None
+    
+    for channel in channels:
+        if channel.get('name') == KEY_DATABASE_CHANNEL_NAME:
+            save_admin_channel(channel['id'], guild_id, KEY_DATABASE_CHANNEL_TYPE)
+            logger.info(f"Indexed key database channel {channel['id']} for guild {guild_id}")
+            return channel['id']
+    
+    forget_admin_channel(guild_id, KEY_DATABASE_CHANNEL_TYPE)
+    return None
+
 def update_key_database(channel_id):
     """Update key database channel with current player keys"""
     try:
@@ -423,6 +529,9 @@ def update_key_database(channel_id):
         
         # Clear existing messages
         messages = discord_api_request(f"/channels/{channel_id}/messages?limit=50")
+        if messages is None:
+            # Channel is gone or unreadable; let the caller re-resolve it
+            return False
         if messages:
             for msg in messages:
                 discord_api_request(f"/channels/{channel_id}/messages/{msg['id']}", "DELETE")
@@ -468,128 +577,292 @@ Admin: {'Yes' if player['is_admin'] else 'No'}
 # =============================================================================
 
 def test_discord_token():
-    """Test if Discord token is valid"""
-    global bot_active, bot_info
-    
+    """Test if Discord token is valid and publish the bot status to every worker"""
     if not DISCORD_TOKEN:
         logger.warning("DISCORD_TOKEN not set")
-        bot_active = False
+        set_bot_status(False)
         return False
     
     try:
-        url = "https://discord.com/api/v10/users/@me"
+        url = f"{DISCORD_API_BASE}/users/@me"
         headers = {"Authorization": f"Bot {DISCORD_TOKEN}"}
         response = requests.get(url, headers=headers, timeout=10)
         
         if response.status_code == 200:
             bot_info = response.json()
-            bot_active = True
+            set_bot_status(True, {"id": bot_info.get('id'), "username": bot_info.get('username')})
             logger.info(f"✅ Discord bot connected: {bot_info['username']} ({bot_info['id']})")
             return True
         else:
             logger.error(f"❌ Invalid Discord token: {response.status_code}")
-            bot_active = False
+            set_bot_status(False)
             return False
             
     except Exception as e:
         logger.error(f"❌ Discord API error: {e}")
-        bot_active = False
+        set_bot_status(False)
         return False
 
-def register_commands():
-    """Register slash commands"""
+# /leaderboard metric -> (label, entry field, value suffix)
+LEADERBOARD_LABELS = {
+    "kd": ("K/D", "kd", ""),
+    "kills": ("Kills", "kills", ""),
+    "wins": ("Wins", "wins", ""),
+    "winrate": ("Win Rate", "win_rate", "%"),
+    "prestige": ("Prestige", "prestige", ""),
+    "rating": ("Rating", "rating", "")
+}
+
+# /top window -> title
+WINDOW_TITLES = {"day": "Today", "week": "This Week", "season": "This Season"}
+
+# Slash command definitions; their hash decides whether startup re-registers
+SLASH_COMMANDS = [
+    {
+        "name": "ping",
+        "description": "Check if bot is online",
+        "type": 1
+    },
+    {
+        "name": "register",
+        "description": "Register and get API key",
+        "type": 1,
+        "options": [
+            {
+                "name": "name",
+                "description": "Your in-game name",
+                "type": 3,
+                "required": True
+            }
+        ]
+    },
+    {
+        "name": "ticket",
+        "description": "Create a support ticket",
+        "type": 1,
+        "options": [
+            {
+                "name": "issue",
+                "description": "Describe your issue",
+                "type": 3,
+                "required": True
+            },
+            {
+                "name": "category",
+                "description": "Ticket category",
+                "type": 3,
+                "required": False,
+                "choices": [
+                    {"name": "Bug Report", "value": "Bug Report"},
+                    {"name": "Feature Request", "value": "Feature Request"},
+                    {"name": "Account Issue", "value": "Account Issue"},
+                    {"name": "Technical Support", "value": "Technical Support"},
+                    {"name": "Other", "value": "Other"}
+                ]
+            }
+        ]
+    },
+    {
+        "name": "close",
+        "description": "Close current ticket",
+        "type": 1
+    },
+    {
+        "name": "profile",
+        "description": "Show your profile and stats",
+        "type": 1
+    },
+    {
+        "name": "key",
+        "description": "Show your API key",
+        "type": 1
+    },
+    {
+        "name": "leaderboard",
+        "description": "Show this server's leaderboard",
+        "type": 1,
+        "options": [
+            {
+                "name": "metric",
+                "description": "What to rank by",
+                "type": 3,
+                "required": False,
+                "choices": [
+                    {"name": "K/D", "value": "kd"},
+                    {"name": "Kills", "value": "kills"},
+                    {"name": "Wins", "value": "wins"},
+                    {"name": "Win Rate", "value": "winrate"},
+                    {"name": "Prestige", "value": "prestige"},
+                    {"name": "Rating", "value": "rating"}
+                ]
+            },
+            {
+                "name": "page",
+                "description": "Page number",
+                "type": 4,
+                "required": False
+            }
+        ]
+    },
+    {
+        "name": "top",
+        "description": "Show this server's best players today, this week or this season",
+        "type": 1,
+        "options": [
+            {
+                "name": "window",
+                "description": "Which matches count",
+                "type": 3,
+                "required": False,
+                "choices": [
+                    {"name": "Today", "value": "day"},
+                    {"name": "This Week", "value": "week"},
+                    {"name": "This Season", "value": "season"}
+                ]
+            },
+            {
+                "name": "metric",
+                "description": "What to rank by",
+                "type": 3,
+                "required": False,
+                "choices": [
+                    {"name": "Kills", "value": "kills"},
+                    {"name": "K/D", "value": "kd"},
+                    {"name": "Wins", "value": "wins"},
+                    {"name": "Win Rate", "value": "winrate"}
+                ]
+            }
+        ]
+    },
+    {
+        "name": "vs",
+        "description": "Your record against another player",
+        "type": 1,
+        "options": [
+            {
+                "name": "opponent",
+                "description": "Who to compare against",
+                "type": 6,
+                "required": True
+            }
+        ]
+    },
+    {
+        "name": "balance",
+        "description": "Split mentioned players into two even teams",
+        "type": 1,
+        "options": [
+            {
+                "name": "players",
+                "description": "Mention every player in the lobby",
+                "type": 3,
+                "required": True
+            },
+            {
+                "name": "by",
+                "description": "What to balance on",
+                "type": 3,
+                "required": False,
+                "choices": [
+                    {"name": "Rating", "value": "rating"},
+                    {"name": "K/D", "value": "kd"}
+                ]
+            }
+        ]
+    },
+    {
+        "name": "setup-keys",
+        "description": "Setup API key database (Admin only)",
+        "type": 1
+    },
+    {
+        "name": "update-keys",
+        "description": "Update key database (Admin only)",
+        "type": 1
+    }
+]
+
+def command_definitions_hash(commands):
+    """Content hash of command definitions, independent of key order"""
+    canonical = json.dumps(commands, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def normalize_command(command):
+    """Reduce a command (local or as returned by Discord) to the fields we define"""
+    normalized = {
+        "name": command.get('name'),
+        "description": command.get('description', ''),
+        "type": command.get('type', 1)
+    }
+    
+    options = []
+    for option in command.get('options') or []:
+        normalized_option = {
+            "name": option.get('name'),
+            "description": option.get('description', ''),
+            "type": option.get('type'),
+            "required": bool(option.get('required', False)),
+            "choices": [
+                {"name": c.get('name'), "value": c.get('value')}
+                for c in option.get('choices') or []
+            ]
+        }
+        if option.get('options'):
+            normalized_option["options"] = normalize_command(option)["options"]
+        options.append(normalized_option)
+    normalized["options"] = options
+    
+    return normalized
+
+def commands_match(remote_commands, local_commands):
+    """Check whether the commands registered on Discord match our definitions"""
+    remote = sorted((normalize_command(c) for c in remote_commands), key=lambda c: c['name'])
+    local = sorted((normalize_command(c) for c in local_commands), key=lambda c: c['name'])
+    return remote == local
+
+def register_commands(guild_id=None, force=False):
+    """Register slash commands, skipping Discord entirely when nothing changed"""
     if not DISCORD_TOKEN or not DISCORD_CLIENT_ID:
         logger.error("Cannot register commands - missing token or client ID")
         return False
     
-    commands = [
-        {
-            "name": "ping",
-            "description": "Check if bot is online",
-            "type": 1
-        },
-        {
-            "name": "register",
-            "description": "Register and get API key",
-            "type": 1,
-            "options": [
-                {
-                    "name": "name",
-                    "description": "Your in-game name",
-                    "type": 3,
-                    "required": True
-                }
-            ]
-        },
-        {
-            "name": "ticket",
-            "description": "Create a support ticket",
-            "type": 1,
-            "options": [
-                {
-                    "name": "issue",
-                    "description": "Describe your issue",
-                    "type": 3,
-                    "required": True
-                },
-                {
-                    "name": "category",
-                    "description": "Ticket category",
-                    "type": 3,
-                    "required": False,
-                    "choices": [
-                        {"name": "Bug Report", "value": "Bug Report"},
-                        {"name": "Feature Request", "value": "Feature Request"},
-                        {"name": "Account Issue", "value": "Account Issue"},
-                        {"name": "Technical Support", "value": "Technical Support"},
-                        {"name": "Other", "value": "Other"}
-                    ]
-                }
-            ]
-        },
-        {
-            "name": "close",
-            "description": "Close current ticket",
-            "type": 1
-        },
-        {
-            "name": "profile",
-            "description": "Show your profile and stats",
-            "type": 1
-        },
-        {
-            "name": "key",
-            "description": "Show your API key",
-            "type": 1
-        },
-        {
-            "name": "setup-keys",
-            "description": "Setup API key database (Admin only)",
-            "type": 1
-        },
-        {
-            "name": "update-keys",
-            "description": "Update key database (Admin only)",
-            "type": 1
-        }
-    ]
+    if guild_id:
+        scope = f"guild:{guild_id}"
+        endpoint = f"/applications/{DISCORD_CLIENT_ID}/guilds/{guild_id}/commands"
+    else:
+        scope = "global"
+        endpoint = f"/applications/{DISCORD_CLIENT_ID}/commands"
+    
+    local_hash = command_definitions_hash(SLASH_COMMANDS)
+    
+    if not force and get_command_hash(scope) == local_hash:
+        logger.info(f"✅ Commands unchanged for {scope} - skipping registration")
+        return True
+    
+    # Hash changed (or first run): compare with what Discord already has
+    remote_commands = discord_api_request(endpoint)
+    if isinstance(remote_commands, list) and commands_match(remote_commands, SLASH_COMMANDS):
+        save_command_hash(scope, local_hash, len(SLASH_COMMANDS))
+        logger.info(f"✅ Remote commands already up to date for {scope}")
+        return True
     
     try:
-        url = f"https://discord.com/api/v10/applications/{DISCORD_CLIENT_ID}/commands"
+        url = f"{DISCORD_API_BASE}{endpoint}"
         headers = {
             "Authorization": f"Bot {DISCORD_TOKEN}",
             "Content-Type": "application/json"
         }
         
-        response = requests.put(url, headers=headers, json=commands, timeout=10)
+        response = requests.put(url, headers=headers, json=SLASH_COMMANDS, timeout=10)
         
         if response.status_code in [200, 201]:
-            logger.info(f"✅ Registered {len(commands)} commands")
+            save_command_hash(scope, local_hash, len(SLASH_COMMANDS))
+            logger.info(f"✅ Registered {len(SLASH_COMMANDS)} commands for {scope}")
             return True
         else:
             logger.error(f"❌ Failed to register commands: {response.status_code}")
             return False
-            
+    
     except Exception as e:
         logger.error(f"❌ Error registering commands: {e}")
         return False
@@ -598,6 +871,12 @@ def register_commands():
 # INTERACTION HANDLERS
 # =============================================================================
 
+# Responses by interaction id, so redelivered interactions don't redo their work
+interaction_cache = InteractionCache(INTERACTION_CACHE_SIZE, INTERACTION_CACHE_TTL)
+
+IN_FLIGHT_RESPONSE = {"type": 4, "data": {"content": "⏳ Still working on that command...", "flags": 64}}
+BUSY_RESPONSE = {"type": 4, "data": {"content": "⏳ Bot is busy right now, please try again in a moment.", "flags": 64}}
+
 def handle_interaction(data):
     """Handle Discord slash commands"""
     interaction_type = data.get('type')
@@ -606,10 +885,58 @@ def handle_interaction(data):
         return {"type": 1}
     
     elif interaction_type == 2:  # SLASH COMMAND
-        return handle_slash_command(data)
+        # Shed instead of queueing so bot traffic can't take every web thread
+        if not bot_budget.try_acquire():
+            return BUSY_RESPONSE
+        try:
+            return handle_slash_command_once(data)
+        finally:
+            bot_budget.release()
     
     return {"type": 4, "data": {"content": "Unknown command", "flags": 64}}
 
+def handle_slash_command_once(data):
+    """Handle a slash command, absorbing duplicate deliveries of the same interaction"""
+    interaction_id = data.get('id')
+    if not interaction_id:
+        return handle_slash_command(data)
+    
+    is_first, entry = interaction_cache.begin(interaction_id)
+    if not is_first:
+        logger.info(f"Duplicate delivery of interaction {interaction_id}")
+        return interaction_cache.wait(entry, INTERACTION_DUPLICATE_WAIT) or IN_FLIGHT_RESPONSE
+    
+    # The redelivery may land on a different gunicorn worker than the original
+    key = f"interaction:{interaction_id}"
+    if not claim_shared(key):
+        logger.info(f"Interaction {interaction_id} is being handled by another worker")
+        response = wait_shared(key, INTERACTION_DUPLICATE_WAIT)
+        if response is None:
+            # Not the final answer; a later redelivery here should ask again
+            interaction_cache.discard(interaction_id, entry)
+            return IN_FLIGHT_RESPONSE
+        interaction_cache.complete(entry, response)
+        return response
+    
+    try:
+        response = handle_slash_command(data)
+    except Exception:
+        interaction_cache.discard(interaction_id, entry)
+        release_shared(key)
+        raise
+    
+    interaction_cache.complete(entry, response)
+    finish_shared(key, response)
+    return response
+
+def purge_interaction_cache():
+    """Drop expired interaction responses (scheduled per worker)"""
+    return interaction_cache.purge_expired()
+
+def get_interaction_cache_stats():
+    """Duplicate delivery counters for monitoring"""
+    return interaction_cache.get_stats()
+
 def handle_slash_command(data):
     """Handle slash commands"""
     command = data.get('data', {}).get('name')
@@ -617,7 +944,8 @@ def handle_slash_command(data):
     user_name = data.get('member', {}).get('user', {}).get('global_name', 'Unknown')
     server_id = data.get('guild_id')
     
-    logger.info(f"Command: {command} from {user_name} ({user_id}) in {server_id}")
+    set_attribute('command', command)
+    command_logger.info(f"Command: {command} from {user_name} ({user_id}) in {server_id}")
     
     if command == 'ping':
         response = random.choice(TOXIC_PING_RESPONSES) if random.random() < 0.3 else random.choice(NORMAL_PING_RESPONSES)
@@ -638,6 +966,18 @@ def handle_slash_command(data):
     elif command == 'key':
         return handle_key_command(user_id, user_name)
     
+    elif command == 'leaderboard':
+        return handle_leaderboard_command(data, server_id)
+    
+    elif command == 'top':
+        return handle_top_command(data, server_id)
+    
+    elif command == 'vs':
+        return handle_vs_command(data, user_id)
+    
+    elif command == 'balance':
+        return handle_balance_command(data)
+    
     elif command == 'setup-keys':
         return handle_setup_keys_command(data, user_id, user_name, server_id)
     
@@ -681,6 +1021,10 @@ def handle_register_command(data, user_id, user_name, server_id):
         VALUES (?, ?, ?, ?, ?, ?)
     ''', (user_id, user_name, in_game_name, api_key, server_id, 1 if is_admin else 0))
     conn.commit()
+    version = bump_version('player_stats')
+    stats_snapshot.refresh_players(conn, [user_id], version)
+    # A new player has no matches, so no window board moves
+    window_boards.adopt(version)
     conn.close()
     
     return {
@@ -704,24 +1048,28 @@ def handle_ticket_command(data, user_id, user_name, server_id):
     if not server_id:
         return {"type": 4, "data": {"content": "Tickets can only be created in servers", "flags": 64}}
     
-    ticket_id = f"T{int(time.time()) % 10000:04d}"
+    ticket_id = generate_ticket_id()
+    timer = CommandTimer('ticket')
     
     conn = get_db_connection()
-    conn.execute('''
-        INSERT INTO tickets (ticket_id, discord_id, discord_name, issue, category)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (ticket_id, user_id, user_name, issue, category))
-    conn.commit()
+    with timer.step('db_insert'):
+        conn.execute('''
+            INSERT INTO tickets (ticket_id, discord_id, discord_name, issue, category)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (ticket_id, user_id, user_name, issue, category))
+        conn.commit()
     
-    channel_id = create_ticket_channel(server_id, user_id, user_name, ticket_id, issue, category)
+    channel_id = create_ticket_channel(server_id, user_id, user_name, ticket_id, issue, category, timer)
     
     if channel_id:
-        conn.execute(
-            'UPDATE tickets SET channel_id = ? WHERE ticket_id = ?',
-            (channel_id, ticket_id)
-        )
-        conn.commit()
+        with timer.step('db_update'):
+            conn.execute(
+                'UPDATE tickets SET channel_id = ? WHERE ticket_id = ?',
+                (channel_id, ticket_id)
+            )
+            conn.commit()
         conn.close()
+        timer.report()
         
         return {
             "type": 4,
@@ -732,6 +1080,7 @@ def handle_ticket_command(data, user_id, user_name, server_id):
         }
     else:
         conn.close()
+        timer.report()
         return {
             "type": 4,
             "data": {
@@ -747,6 +1096,7 @@ def handle_close_command(data, user_id, user_name, server_id):
     if not channel_id:
         return {"type": 4, "data": {"content": "No channel specified", "flags": 64}}
     
+    timer = CommandTimer('close')
     conn = get_db_connection()
     ticket = conn.execute(
         'SELECT * FROM tickets WHERE channel_id = ? AND status = "open"',
@@ -767,13 +1117,15 @@ def handle_close_command(data, user_id, user_name, server_id):
     elif str(user_id) == str(ticket['discord_id']):
         can_close = True
     # Admin can close
-    elif is_user_admin_in_guild(server_id, user_id):
-        can_close = True
+    else:
+        with timer.step('admin_check'):
+            can_close = is_user_admin_in_guild(server_id, user_id)
     
     if not can_close:
         return {"type": 4, "data": {"content": "You don't have permission to close this ticket", "flags": 64}}
     
-    success = close_ticket_channel(channel_id, ticket['ticket_id'], user_id)
+    success = close_ticket_channel(channel_id, ticket['ticket_id'], user_id, timer)
+    timer.report()
     
     if success:
         return {
@@ -813,6 +1165,8 @@ def handle_profile_command(user_id, user_name):
     total_games = wins + losses
     win_rate = (wins / total_games * 100) if total_games > 0 else 0
     
+    standing = player_percentiles.standing(total_kills, total_deaths, wins, losses)
+    
     embed = {
         "title": f"Profile: {player['in_game_name']}",
         "color": 0x00ff9d,
@@ -827,6 +1181,14 @@ def handle_profile_command(user_id, user_name):
         "timestamp": datetime.utcnow().isoformat()
     }
     
+    if standing:
+        labels = {"kd": "K/D", "kills": "kills", "win_rate": "win rate"}
+        embed["fields"].append({
+            "name": "Standing",
+            "value": " · ".join(f"Top **{standing[name]}%** {label}" for name, label in labels.items() if name in standing),
+            "inline": False
+        })
+    
     return {"type": 4, "data": {"embeds": [embed], "flags": 64}}
 
 def handle_key_command(user_id, user_name):
@@ -849,6 +1211,119 @@ def handle_key_command(user_id, user_name):
         }
     }
 
+def handle_leaderboard_command(data, server_id):
+    """Handle /leaderboard command: the board of the server it's used in"""
+    options = {o.get('name'): o.get('value') for o in data.get('data', {}).get('options', [])}
+    metric = options.get('metric') if options.get('metric') in LEADERBOARD_LABELS else 'kd'
+    page = max(1, int(options.get('page') or 1))
+    
+    total, entries = get_leaderboard_page(metric, (page - 1) * LEADERBOARD_PAGE_SIZE, LEADERBOARD_PAGE_SIZE, server_id)
+    pages = max(1, -(-total // LEADERBOARD_PAGE_SIZE))
+    if not entries:
+        return {"type": 4, "data": {"content": f"Nothing on page {page} (of {pages})", "flags": 64}}
+    
+    label, field, suffix = LEADERBOARD_LABELS[metric]
+    lines = '\n'.join(f"`#{e['rank']}` **{e['name']}** — {e[field]}{suffix} {label}" for e in entries)
+    stats = get_global_stats(server_id)
+    
+    embed = {
+        "title": f"{'Server' if server_id else 'Global'} Leaderboard — {label}",
+        "color": 0x00ff9d,
+        "description": lines,
+        "footer": {"text": f"Page {page}/{pages} · {stats['total_players']} players · "
+                           f"{stats['total_kills']} kills · avg K/D {stats['avg_kd']:.2f}"},
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    
+    return {"type": 4, "data": {"embeds": [embed]}}
+
+def handle_top_command(data, server_id):
+    """Handle /top command: this server's best over a rolling window"""
+    options = {o.get('name'): o.get('value') for o in data.get('data', {}).get('options', [])}
+    window = options.get('window') if options.get('window') in WINDOW_TITLES else 'week'
+    metric = options.get('metric') if options.get('metric') in WINDOW_SQL else 'kills'
+    
+    total, entries = get_window_leaderboard_page(window, metric, 0, LEADERBOARD_PAGE_SIZE, server_id)
+    if not entries:
+        return {"type": 4, "data": {"content": f"No ranked players {WINDOW_TITLES[window].lower()} yet", "flags": 64}}
+    
+    label, field, suffix = LEADERBOARD_LABELS[metric]
+    lines = '\n'.join(f"`#{e['rank']}` **{e['name']}** — {e[field]}{suffix} {label} · {e['wins'] + e['losses']} GP"
+                      for e in entries)
+    
+    embed = {
+        "title": f"Top {label} — {WINDOW_TITLES[window]}",
+        "color": 0x00ff9d,
+        "description": lines,
+        "footer": {"text": f"{total} players ranked"},
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    
+    return {"type": 4, "data": {"embeds": [embed]}}
+
+def handle_vs_command(data, user_id):
+    """Handle /vs command"""
+    options = {o.get('name'): o.get('value') for o in data.get('data', {}).get('options', [])}
+    opponent = options.get('opponent')
+    if not opponent or opponent == user_id:
+        return {"type": 4, "data": {"content": "Pick someone other than yourself", "flags": 64}}
+    
+    record = get_head_to_head(user_id, opponent)
+    if record is None:
+        return {"type": 4, "data": {"content": f"You haven't played against <@{opponent}> yet", "flags": 64}}
+    
+    you, them = record['player'], record['opponent']
+    embed = {
+        "title": f"{you['name'] or 'You'} vs {them['name'] or 'Opponent'}",
+        "color": 0x00ff9d,
+        "fields": [
+            {"name": "Record", "value": f"**{record['wins']}W / {record['losses']}L / {record['draws']}D**", "inline": True},
+            {"name": "Matches", "value": f"**{record['matches']}**", "inline": True},
+            {"name": "\u200b", "value": "\u200b", "inline": True},
+            {"name": "Your K/D", "value": f"**{you['kd']:.2f}** ({you['kills']}/{you['deaths']})", "inline": True},
+            {"name": "Their K/D", "value": f"**{them['kd']:.2f}** ({them['kills']}/{them['deaths']})", "inline": True}
+        ],
+        "footer": {"text": "Kills and deaths in matches against each other · last played"},
+        "timestamp": datetime.utcfromtimestamp(record['last_played'] or 0).isoformat()
+    }
+    
+    return {"type": 4, "data": {"embeds": [embed]}}
+
+def handle_balance_command(data):
+    """Handle /balance command"""
+    options = {o.get('name'): o.get('value') for o in data.get('data', {}).get('options', [])}
+    mentioned = list(dict.fromkeys(re.findall(r'<@!?(\d+)>', options.get('players') or '')))
+    metric = 'kd' if options.get('by') == 'kd' else 'rating'
+    
+    if len(mentioned) < 2 or len(mentioned) > BALANCE_MAX_PLAYERS:
+        return {"type": 4, "data": {"content": f"Mention between 2 and {BALANCE_MAX_PLAYERS} players", "flags": 64}}
+    
+    players = get_lobby_players(mentioned)
+    missing = [pid for pid in mentioned if pid not in {p['discord_id'] for p in players}]
+    if missing:
+        names = ' '.join(f"<@{pid}>" for pid in missing)
+        return {"type": 4, "data": {"content": f"Not registered yet: {names}", "flags": 64}}
+    
+    result = balance_players(players, metric)
+    label = "Rating" if metric == 'rating' else "K/D"
+    
+    def team_field(name, team):
+        lines = '\n'.join(f"<@{p['discord_id']}> ({p[metric]})" for p in team['players'])
+        return {"name": f"{name} — avg {label} {team['mean']}", "value": lines, "inline": True}
+    
+    embed = {
+        "title": f"Balanced Teams by {label}",
+        "color": 0x00ff9d,
+        "fields": [
+            team_field("Team 1", result['team1']),
+            team_field("Team 2", result['team2'])
+        ],
+        "footer": {"text": f"Difference {result['difference']} ({result['method']}, {result['elapsed_ms']:.1f}ms)"},
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    
+    return {"type": 4, "data": {"embeds": [embed]}}
+
 def handle_setup_keys_command(data, user_id, user_name, server_id):
     """Handle /setup-keys command"""
     if not server_id:
@@ -857,7 +1332,7 @@ def handle_setup_keys_command(data, user_id, user_name, server_id):
     if not is_user_admin_in_guild(server_id, user_id):
         return {"type": 4, "data": {"content": "Admin only command", "flags": 64}}
     
-    channel_id = setup_key_database(server_id, user_id)
+    channel_id = setup_key_database(server_id, user_id, user_name)
     
     if channel_id:
         return {
@@ -884,20 +1359,20 @@ def handle_update_keys_command(data, user_id, user_name, server_id):
     if not is_user_admin_in_guild(server_id, user_id):
         return {"type": 4, "data": {"content": "Admin only command", "flags": 64}}
     
-    # Find key database channel
-    channel_id = None
-    channels = discord_api_request(f"/guilds/{server_id}/channels")
-    if channels:
-        for channel in channels:
-            if channel.get('name') == 'api-key-database':
-                channel_id = channel['id']
-                break
+    channel_id = find_key_database_channel(server_id)
     
     if not channel_id:
         return {"type": 4, "data": {"content": "No key database found. Use `/setup-keys` first.", "flags": 64}}
     
     success = update_key_database(channel_id)
     
+    if not success:
+        # Indexed channel may have been deleted or recreated; rescan once
+        fresh_id = find_key_database_channel(server_id, refresh=True)
+        if fresh_id and fresh_id != channel_id:
+            channel_id = fresh_id
+            success = update_key_database(channel_id)
+    
     if success:
         return {
             "type": 4,
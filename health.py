@@ -0,0 +1,120 @@
+# health.py - Background health checks served from memory
+import os
+import sys
+import time
+import shutil
+import threading
+from datetime import datetime
+from circuit_breaker import get_breaker_states, OPEN
+from config import DATABASE, HEALTH_CHECK_INTERVAL, HEALTH_MIN_FREE_MB, get_logging_stats, logger
+
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+UNHEALTHY = "unhealthy"
+
+def check_database():
+    """SELECT 1 on this thread's connection, which stays open for the next check"""
+    from database import get_db_connection
+    
+    started = time.perf_counter()
+    try:
+        get_db_connection().execute('SELECT 1').fetchone()
+    except Exception as e:
+        return {"status": UNHEALTHY, "error": str(e)}
+    return {"status": HEALTHY, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+def check_log_queue():
+    """The log writer falls behind when its queue fills"""
+    stats = get_logging_stats()
+    fill = stats["queue_depth"] / stats["queue_size"] if stats["queue_size"] else 0.0
+    return dict(stats, status=DEGRADED if fill >= 0.8 else HEALTHY, fill=round(fill, 3))
+
+def check_discord():
+    """Degraded while any Discord route's circuit is open"""
+    states = get_breaker_states()
+    open_routes = sorted(name for name, state in states.items() if state["state"] == OPEN)
+    return {"status": DEGRADED if open_routes else HEALTHY, "open_circuits": open_routes}
+
+def check_disk():
+    """Free space where the database lives"""
+    try:
+        usage = shutil.disk_usage(os.path.dirname(os.path.abspath(DATABASE)))
+    except OSError as e:
+        return {"status": DEGRADED, "error": str(e)}
+    free_mb = usage.free // (1024 * 1024)
+    return {"status": DEGRADED if free_mb < HEALTH_MIN_FREE_MB else HEALTHY, "free_mb": free_mb}
+
+def check_bot():
+    """Bot status as last recorded in shared state; informational, the app runs without it"""
+    from database import is_bot_active
+    
+    return {"status": HEALTHY, "active": is_bot_active()}
+
+def check_interactions():
+    """Duplicate delivery counters, once this worker has loaded discord_bot"""
+    bot = sys.modules.get('discord_bot')
+    if bot is None:
+        return {"status": HEALTHY, "loaded": False}
+    return dict(bot.get_interaction_cache_stats(), status=HEALTHY, loaded=True)
+
+CHECKS = {
+    "database": check_database,
+    "log_queue": check_log_queue,
+    "discord": check_discord,
+    "disk": check_disk,
+    "bot": check_bot,
+    "interactions": check_interactions
+}
+
+def run_checks():
+    """Run every check; overall status is the worst of them"""
+    started = time.perf_counter()
+    results = {}
+    for name, check in CHECKS.items():
+        try:
+            results[name] = check()
+        except Exception as e:
+            logger.error(f"Health check {name} failed: {e}")
+            results[name] = {"status": UNHEALTHY, "error": str(e)}
+    
+    statuses = {result["status"] for result in results.values()}
+    if UNHEALTHY in statuses:
+        status = UNHEALTHY
+    elif DEGRADED in statuses:
+        status = DEGRADED
+    else:
+        status = HEALTHY
+    
+    return {
+        "status": status,
+        "checks": results,
+        "checked_at": datetime.utcnow().isoformat(),
+        "check_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+class HealthChecker:
+    """Holds the latest check results, refreshed by a scheduler job"""
+    
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.latest = None
+        self.refreshed = 0.0
+    
+    def refresh(self):
+        result = run_checks()
+        with self.lock:
+            self.latest = result
+            self.refreshed = time.monotonic()
+        return result
+    
+    def get(self, deep=False):
+        """Cached results, or an inline run when asked for or when the cache is stale"""
+        with self.lock:
+            latest = self.latest
+            age = time.monotonic() - self.refreshed
+        if deep or latest is None or age > self.interval * 3:
+            return dict(self.refresh(), cached=False)
+        return dict(latest, cached=True, age_s=round(age, 1))
+
+health_checker = HealthChecker(HEALTH_CHECK_INTERVAL)
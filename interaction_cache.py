@@ -0,0 +1,80 @@
+# interaction_cache.py - Idempotency cache for duplicate Discord interaction deliveries
+import time
+import threading
+from collections import OrderedDict
+
+class InteractionCache:
+    """Bounded LRU/TTL cache of interaction responses keyed on interaction id
+    
+    The first delivery of an id owns the work; duplicates get the stored
+    response, or wait briefly while the first delivery is still in flight.
+    """
+    
+    def __init__(self, max_entries=1024, ttl=900):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {
+            "first_deliveries": 0,
+            "duplicates_replayed": 0,
+            "duplicates_in_flight": 0,
+            "evictions": 0
+        }
+    
+    def begin(self, interaction_id):
+        """Claim an interaction id; returns (is_first_delivery, entry)"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(interaction_id)
+            if entry and entry["expires"] > now:
+                self.entries.move_to_end(interaction_id)
+                return False, entry
+            
+            entry = {"done": threading.Event(), "response": None, "expires": now + self.ttl}
+            self.entries[interaction_id] = entry
+            self.entries.move_to_end(interaction_id)
+            self.stats["first_deliveries"] += 1
+            
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            
+            return True, entry
+    
+    def complete(self, entry, response):
+        """Store the computed response and release waiting duplicates"""
+        entry["response"] = response
+        entry["done"].set()
+    
+    def discard(self, interaction_id, entry):
+        """Forget a failed delivery so a retry can redo the work"""
+        with self.lock:
+            if self.entries.get(interaction_id) is entry:
+                del self.entries[interaction_id]
+        entry["done"].set()
+    
+    def wait(self, entry, timeout):
+        """Wait for the first delivery's response; None if still in flight"""
+        finished = entry["done"].wait(timeout)
+        with self.lock:
+            if finished and entry["response"] is not None:
+                self.stats["duplicates_replayed"] += 1
+                return entry["response"]
+            self.stats["duplicates_in_flight"] += 1
+            return None
+    
+    def purge_expired(self):
+        """Drop finished entries past their TTL; returns how many were removed"""
+        now = time.monotonic()
+        with self.lock:
+            expired = [key for key, entry in self.entries.items()
+                       if entry["expires"] <= now and entry["done"].is_set()]
+            for key in expired:
+                del self.entries[key]
+        return len(expired)
+    
+    def get_stats(self):
+        """Counters plus current size"""
+        with self.lock:
+            return dict(self.stats, size=len(self.entries))
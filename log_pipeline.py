@@ -0,0 +1,177 @@
+# log_pipeline.py - Non-blocking JSON logging through a bounded queue
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from datetime import datetime, timezone
+
+# Seconds a WARNING+ record may wait for room in a full queue before it is dropped
+ERROR_ENQUEUE_WAIT = 0.1
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+    
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+            "thread": record.threadName
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def parse_sample_rates(spec):
+    """'config.auth=0.1,config.commands=0.5' -> {'config.auth': 0.1, ...}"""
+    rates = {}
+    for part in spec.split(','):
+        name, _, rate = part.partition('=')
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+class SamplingFilter(logging.Filter):
+    """Keeps 1 in N INFO/DEBUG records per configured logger; warnings always pass"""
+    
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self.lock = threading.Lock()
+        self.seen = {}
+        self.sampled_out = 0
+    
+    def rate_for(self, name):
+        # Most specific configured logger wins: config.auth.keys -> config.auth -> config
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+    
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1.0:
+            return True
+        
+        with self.lock:
+            count = self.seen.get(record.name, 0)
+            self.seen[record.name] = count + 1
+            # Deterministic 1-in-N keeps the first record and is cheaper than random()
+            keep = rate > 0 and count % round(1 / rate) == 0
+            if not keep:
+                self.sampled_out += 1
+        return keep
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler over a bounded queue that drops, and counts, records when full"""
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        # Counters are updated in emit(), which Handler.handle() already runs under self.lock
+        self.enqueued = 0
+        self.dropped = 0
+    
+    def prepare(self, record):
+        # Merge args now (they may not be thread-safe later) but leave JSON formatting to the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+    
+    def enqueue(self, record):
+        try:
+            # Warnings and errors may wait briefly for room; routine records never block
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=ERROR_ENQUEUE_WAIT)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.enqueued += 1
+
+class DropReportingHandler(logging.StreamHandler):
+    """Stream handler on the listener thread that also reports new drops"""
+    
+    def __init__(self, stream, queue_handler):
+        super().__init__(stream)
+        self.queue_handler = queue_handler
+        self.reported = 0
+    
+    def emit(self, record):
+        dropped = self.queue_handler.dropped
+        if dropped > self.reported:
+            notice = logging.LogRecord(__name__, logging.WARNING, __file__, 0,
+                                       f"Log queue full: dropped {dropped - self.reported} records", None, None)
+            self.reported = dropped
+            super().emit(notice)
+        super().emit(record)
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop() waits for room instead of failing on a full queue"""
+    
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+class LogPipeline:
+    """Owns the queue, its handler and the background listener for one process"""
+    
+    def __init__(self, level, json_format, queue_size, sample_rates):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.sampler = SamplingFilter(sample_rates)
+        self.handler.addFilter(self.sampler)
+        
+        self.output = DropReportingHandler(sys.stderr, self.handler)
+        if json_format:
+            self.output.setFormatter(JsonFormatter())
+        else:
+            self.output.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        
+        root = logging.getLogger()
+        root.setLevel(level)
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(self.handler)
+        
+        self.listener = None
+        self.start()
+        atexit.register(self.stop)
+        # A forked worker (gunicorn --preload) inherits the queue but not the listener thread
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.start)
+    
+    def start(self):
+        self.listener = DrainingQueueListener(self.queue, self.output, respect_handler_level=True)
+        self.listener.start()
+    
+    def stop(self):
+        """Drain everything still queued, then stop the listener thread"""
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+            self.output.flush()
+    
+    def get_stats(self):
+        return {
+            "enqueued": self.handler.enqueued,
+            "dropped": self.handler.dropped,
+            "sampled_out": self.sampler.sampled_out,
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize
+        }
@@ -0,0 +1,229 @@
+# metrics.py - Request metrics with a Prometheus text exposition
+import os
+import json
+import time
+import threading
+from config import METRICS_DIR, METRICS_FLUSH_INTERVAL, logger
+
+# Latency buckets in seconds, shared by every histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "sot_http_requests_total": "Requests by endpoint, method and status",
+    "sot_http_requests_in_flight": "Requests currently being served by endpoint",
+    "sot_http_request_duration_seconds": "Request latency by endpoint",
+    "sot_http_request_db_seconds": "SQLite time spent per request by endpoint",
+    "sot_http_request_discord_seconds": "Discord REST time spent per request by endpoint",
+    "sot_discord_requests_total": "Discord REST calls by route class and status",
+    "sot_discord_request_seconds_total": "Time spent in Discord REST calls by route class",
+    "sot_scheduler_job_runs_total": "Scheduler job runs by job and result",
+    "sot_scheduler_job_duration_seconds": "Scheduler job run time"
+}
+
+class RequestTimings:
+    """DB and Discord time accumulated for one request, possibly across threads"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.db = 0.0
+        self.discord = 0.0
+    
+    def add(self, kind, seconds):
+        with self.lock:
+            setattr(self, kind, getattr(self, kind) + seconds)
+
+class MetricsRegistry:
+    """This worker's counters, histograms and gauges"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self.gauges = {}      # (name, labels) -> value
+        self.last_flush = 0.0
+    
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+    
+    def gauge_add(self, name, labels, amount):
+        key = (name, labels)
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + amount
+    
+    def observe(self, name, labels, seconds):
+        key = (name, labels)
+        with self.lock:
+            values = self.histograms.get(key)
+            if values is None:
+                values = self.histograms[key] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    values[i] += 1
+            values[-2] += seconds
+            values[-1] += 1
+    
+    def snapshot(self):
+        """Plain, JSON-friendly copy of every series"""
+        with self.lock:
+            return {
+                "pid": os.getpid(),
+                "counters": [[n, list(l), v] for (n, l), v in self.counters.items()],
+                "histograms": [[n, list(l), list(v)] for (n, l), v in self.histograms.items()],
+                "gauges": [[n, list(l), v] for (n, l), v in self.gauges.items()]
+            }
+
+registry = MetricsRegistry()
+request_local = threading.local()
+
+# =============================================================================
+# PER-REQUEST TIMING
+# =============================================================================
+
+def begin_request(endpoint):
+    """Start timing a request on this thread"""
+    request_local.timings = RequestTimings()
+    request_local.started = time.perf_counter()
+    registry.gauge_add("sot_http_requests_in_flight", (("endpoint", endpoint),), 1)
+
+def end_request(endpoint, method, status):
+    """Record a finished request and flush this worker's metrics if due"""
+    timings = getattr(request_local, 'timings', None)
+    started = getattr(request_local, 'started', None)
+    request_local.timings = None
+    if timings is None or started is None:
+        return
+    
+    labels = (("endpoint", endpoint),)
+    registry.gauge_add("sot_http_requests_in_flight", labels, -1)
+    registry.inc("sot_http_requests_total", (("endpoint", endpoint), ("method", method), ("status", str(status))))
+    registry.observe("sot_http_request_duration_seconds", labels, time.perf_counter() - started)
+    registry.observe("sot_http_request_db_seconds", labels, timings.db)
+    registry.observe("sot_http_request_discord_seconds", labels, timings.discord)
+    
+    if time.monotonic() - registry.last_flush >= METRICS_FLUSH_INTERVAL:
+        flush_worker_metrics()
+
+def current_timings():
+    """The active request's accumulator, for handing to worker threads"""
+    return getattr(request_local, 'timings', None)
+
+def bind_timings(timings):
+    """Attribute this thread's DB and Discord time to another thread's request"""
+    request_local.timings = timings
+
+def add_db_time(seconds):
+    timings = getattr(request_local, 'timings', None)
+    if timings is not None:
+        timings.add('db', seconds)
+
+def add_discord_time(seconds, route, status):
+    """Record one Discord REST call against its route class and the current request"""
+    registry.inc("sot_discord_requests_total", (("route", route), ("status", str(status))))
+    registry.inc("sot_discord_request_seconds_total", (("route", route),), seconds)
+    timings = getattr(request_local, 'timings', None)
+    if timings is not None:
+        timings.add('discord', seconds)
+
+# =============================================================================
+# CROSS-WORKER AGGREGATION
+# =============================================================================
+
+def worker_file(pid):
+    return os.path.join(METRICS_DIR, f"worker-{pid}.json")
+
+def flush_worker_metrics():
+    """Atomically write this worker's snapshot for other workers to merge"""
+    registry.last_flush = time.monotonic()
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = worker_file(os.getpid())
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(registry.snapshot(), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"Error writing metrics snapshot: {e}")
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+
+def load_snapshots():
+    """This worker's live snapshot plus the last flushed snapshot of every other worker"""
+    snapshots = [registry.snapshot()]
+    own = os.path.basename(worker_file(os.getpid()))
+    try:
+        names = os.listdir(METRICS_DIR)
+    except OSError:
+        return snapshots
+    
+    for name in names:
+        if name == own or not name.startswith('worker-') or not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        # Counters from exited workers still count; their in-flight gauges don't
+        if not pid_alive(snapshot.get("pid", 0)):
+            snapshot["gauges"] = []
+        snapshots.append(snapshot)
+    return snapshots
+
+def format_labels(labels, extra=None):
+    pairs = list(labels) + (list(extra) if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def render_prometheus():
+    """Merge every worker's metrics into Prometheus text format"""
+    counters, gauges, histograms = {}, {}, {}
+    for snapshot in load_snapshots():
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(tuple(p) for p in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot["gauges"]:
+            key = (name, tuple(tuple(p) for p in labels))
+            gauges[key] = gauges.get(key, 0) + value
+        for name, labels, values in snapshot["histograms"]:
+            key = (name, tuple(tuple(p) for p in labels))
+            merged = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                merged[i] += value
+    
+    lines = []
+    emitted = set()
+    
+    def header(name, kind, help_text):
+        if name not in emitted:
+            emitted.add(name)
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+    
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter", HELP.get(name, name))
+        lines.append(f"{name}{format_labels(labels)} {value:g}")
+    
+    for (name, labels), value in sorted(gauges.items()):
+        header(name, "gauge", HELP.get(name, name))
+        lines.append(f"{name}{format_labels(labels)} {value:g}")
+    
+    for (name, labels), values in sorted(histograms.items()):
+        header(name, "histogram", HELP.get(name, name))
+        for bound, count in zip(BUCKETS, values):
+            lines.append(f"{name}_bucket{format_labels(labels, [('le', f'{bound:g}')])} {count}")
+        lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {values[-1]}")
+        lines.append(f"{name}_sum{format_labels(labels)} {values[-2]:.6f}")
+        lines.append(f"{name}_count{format_labels(labels)} {values[-1]}")
+    
+    return "\n".join(lines) + "\n"
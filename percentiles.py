@@ -0,0 +1,177 @@
+# percentiles.py - "Top X%" standings from per-metric KLL quantile sketches
+"""
+Each metric keeps a KLL sketch of every active player's value. A sketch holds
+O(k log(n/k)) items however many players there are, and ranks are accurate
+to about 1.7/k of the population (k=256: within 1%, usually much closer).
+
+Sketches are built from the players table by a scheduler job, take new values
+as matches come in, and are rebuilt when another worker records a match or
+enough in-place updates have piled up (a sketch can't forget a player's old
+value, so updates slowly over-count until the next rebuild).
+"""
+import math
+import random
+import threading
+from bisect import bisect_left
+from config import PERCENTILE_SKETCH_K, logger
+
+class KLLSketch:
+    """Streaming quantile sketch: levels of compactors, each item at level h weighing 2^h"""
+    
+    def __init__(self, k=256, seed=None):
+        self.k = k
+        self.random = random.Random(seed)
+        self.levels = []
+        self.count = 0
+        self.held = 0
+        self.capacity_total = 0
+        self.cdf = None
+        self.grow()
+    
+    def capacity(self, level):
+        # Lower levels get geometrically smaller buffers (factor 2/3)
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+    
+    def grow(self):
+        self.levels.append([])
+        self.capacity_total = sum(self.capacity(level) for level in range(len(self.levels)))
+    
+    def update(self, value):
+        self.levels[0].append(value)
+        self.count += 1
+        self.held += 1
+        self.cdf = None
+        if self.held >= self.capacity_total:
+            self.compress()
+    
+    def compress(self):
+        """Halve the first full level: sort it and promote every other item"""
+        for level in range(len(self.levels)):
+            if len(self.levels[level]) < self.capacity(level):
+                continue
+            if level + 1 == len(self.levels):
+                self.grow()
+            items = sorted(self.levels[level])
+            # An odd item out stays behind so weight is conserved exactly
+            keep = [items.pop()] if len(items) % 2 else []
+            self.levels[level + 1].extend(items[self.random.randint(0, 1)::2])
+            self.levels[level] = keep
+            self.held = sum(len(items) for items in self.levels)
+            return
+    
+    def build_cdf(self):
+        weighted = sorted((value, 1 << level) for level, items in enumerate(self.levels) for value in items)
+        values, cumulative, total = [], [], 0
+        for value, weight in weighted:
+            values.append(value)
+            cumulative.append(total)
+            total += weight
+        self.cdf = (values, cumulative, total)
+        return self.cdf
+    
+    def fraction_below(self, value):
+        """Estimated share of updates strictly less than value"""
+        values, cumulative, total = self.cdf or self.build_cdf()
+        if not total:
+            return None
+        i = bisect_left(values, value)
+        return (cumulative[i] if i < len(values) else total) / total
+
+def player_metrics(kills, deaths, wins, losses):
+    """The metrics a player is ranked on; win rate only once they have games"""
+    metrics = {"kd": kills / max(deaths, 1), "kills": kills}
+    if wins + losses:
+        metrics["win_rate"] = wins / (wins + losses)
+    return metrics
+
+class PlayerPercentiles:
+    """One sketch per metric over active players, swapped wholesale on rebuild"""
+    
+    def __init__(self, k):
+        self.k = k
+        self.lock = threading.Lock()
+        self.sketches = None
+        self.version = None
+        self.updates = 0
+        self.players = 0
+    
+    def rebuild(self, conn, version=None):
+        sketches = {name: KLLSketch(self.k) for name in ("kd", "kills", "win_rate")}
+        players = 0
+        for row in conn.execute('''
+            SELECT total_kills, total_deaths, wins, losses FROM players
+            WHERE total_kills + total_deaths + wins + losses > 0
+        '''):
+            players += 1
+            for name, value in player_metrics(row[0] or 0, row[1] or 0, row[2] or 0, row[3] or 0).items():
+                sketches[name].update(value)
+        for sketch in sketches.values():
+            sketch.build_cdf()
+        
+        with self.lock:
+            self.sketches = sketches
+            self.version = version
+            self.updates = 0
+            self.players = players
+        logger.info(f"Built percentile sketches for {players} players")
+    
+    def observe_players(self, conn, player_ids, version):
+        """Add the new totals of a match's players; version is the bumped
+        'player_stats' version, adopted if nothing else changed in between
+        """
+        placeholders = ','.join('?' * len(player_ids))
+        rows = conn.execute(f'''
+            SELECT total_kills, total_deaths, wins, losses FROM players
+            WHERE discord_id IN ({placeholders})
+        ''', list(player_ids)).fetchall()
+        
+        with self.lock:
+            if self.sketches is None:
+                return
+            for row in rows:
+                for name, value in player_metrics(row[0] or 0, row[1] or 0, row[2] or 0, row[3] or 0).items():
+                    self.sketches[name].update(value)
+            self.updates += len(rows)
+            if self.version is not None and version == self.version + 1:
+                self.version = version
+    
+    def needs_rebuild(self, version):
+        with self.lock:
+            return (self.sketches is None or version != self.version
+                    or self.updates > max(100, self.players // 20))
+    
+    def standing(self, kills, deaths, wins, losses):
+        """{"kd": 12, ...}: the "top X%" a player is in per metric, or {} before the first build"""
+        with self.lock:
+            sketches = self.sketches
+            if sketches is None:
+                return {}
+            result = {}
+            for name, value in player_metrics(kills, deaths, wins, losses).items():
+                below = sketches[name].fraction_below(value)
+                if below is not None:
+                    result[name] = max(1, min(100, int(math.ceil((1 - below) * 100))))
+            return result
+    
+    def get_stats(self):
+        with self.lock:
+            if self.sketches is None:
+                return {"built": False}
+            return {
+                "built": True,
+                "players": self.players,
+                "updates_since_build": self.updates,
+                "k": self.k,
+                "retained": {name: sketch.held for name, sketch in self.sketches.items()}
+            }
+
+player_percentiles = PlayerPercentiles(PERCENTILE_SKETCH_K)
+
+def refresh_percentiles():
+    """Scheduler job: (re)build this worker's sketches when they're missing or stale"""
+    from database import get_db_connection, get_version
+    
+    version = get_version('player_stats')
+    if player_percentiles.needs_rebuild(version):
+        player_percentiles.rebuild(get_db_connection(), version)
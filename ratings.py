@@ -0,0 +1,269 @@
+# ratings.py - Team Elo ratings: incremental per match, vectorized full-history replay
+"""
+Each team's strength is the mean rating of its players. A finished match moves
+every player by K * (actual - expected), with a larger K for their first
+RATING_PROVISIONAL_GAMES matches so new players find their level quickly.
+Unregistered players count at the initial rating in every match, both live
+and in the replay, so a replay reproduces the incremental ratings.
+
+    python -m ratings --db sot_tdm.db    # replay every finished match
+"""
+import json
+import time
+from config import RATING_INITIAL, RATING_K, RATING_PROVISIONAL_GAMES, RATING_PROVISIONAL_K, logger
+
+def expected_score(rating, opponent):
+    return 1.0 / (1.0 + 10 ** ((opponent - rating) / 400.0))
+
+def k_factor(games):
+    return RATING_PROVISIONAL_K if games < RATING_PROVISIONAL_GAMES else RATING_K
+
+def outcome(winner):
+    """Team 1's score for a match: 1 win, 0 loss, 0.5 draw"""
+    if winner == 'team1':
+        return 1.0
+    if winner == 'team2':
+        return 0.0
+    return 0.5
+
+def rate_match(team1, team2, score1):
+    """New (rating, games) for each player, given lists of (rating, games) per team"""
+    mean1 = sum(r for r, _ in team1) / len(team1)
+    mean2 = sum(r for r, _ in team2) / len(team2)
+    surprise = score1 - expected_score(mean1, mean2)
+    return (
+        [(r + k_factor(g) * surprise, g + 1) for r, g in team1],
+        [(r - k_factor(g) * surprise, g + 1) for r, g in team2]
+    )
+
+# =============================================================================
+# INCREMENTAL UPDATE
+# =============================================================================
+
+def apply_match(conn, team1_ids, team2_ids, winner):
+    """Update the ratings of a just-finished match's players inside the caller's transaction
+    
+    Unregistered players count at the initial rating but aren't stored.
+    Returns {discord_id: {"old": rating, "new": rating}} for registered players.
+    """
+    if not team1_ids or not team2_ids:
+        return {}
+    
+    ids = list(team1_ids) + list(team2_ids)
+    placeholders = ','.join('?' * len(ids))
+    current = {
+        row[0]: (row[1], row[2]) for row in conn.execute(
+            f'SELECT discord_id, rating, rating_games FROM players WHERE discord_id IN ({placeholders})', ids
+        )
+    }
+    
+    before1 = [current.get(pid, (RATING_INITIAL, 0)) for pid in team1_ids]
+    before2 = [current.get(pid, (RATING_INITIAL, 0)) for pid in team2_ids]
+    after1, after2 = rate_match(before1, before2, outcome(winner))
+    
+    changes = {}
+    updates = []
+    for pid, before, after in zip(ids, before1 + before2, after1 + after2):
+        if pid in current:
+            changes[pid] = {"old": round(before[0], 1), "new": round(after[0], 1)}
+            updates.append((after[0], after[1], pid))
+    conn.executemany('UPDATE players SET rating = ?, rating_games = ? WHERE discord_id = ?', updates)
+    return changes
+
+# =============================================================================
+# FULL-HISTORY REPLAY
+# =============================================================================
+
+def load_history(conn, schema='main'):
+    """Finished matches in play order as (team1_ids, team2_ids, team1_score)"""
+    history = []
+    for row in conn.execute(f'''
+        SELECT team1_players, team2_players, winner FROM {schema}.matches
+        WHERE status = 'finished'
+        ORDER BY COALESCE(ended_at, started_at), id
+    '''):
+        try:
+            team1, team2 = json.loads(row[0] or '[]'), json.loads(row[1] or '[]')
+        except ValueError:
+            continue
+        if team1 and team2:
+            history.append(([str(p) for p in team1], [str(p) for p in team2], outcome(row[2])))
+    return history
+
+def replay_python(history, registered):
+    """Sequential replay; the reference the vectorized path must agree with
+    
+    Like apply_match, only ids in registered carry a rating between matches.
+    """
+    state = {}
+    for team1, team2, score1 in history:
+        before1 = [state.get(pid, (RATING_INITIAL, 0)) for pid in team1]
+        before2 = [state.get(pid, (RATING_INITIAL, 0)) for pid in team2]
+        after1, after2 = rate_match(before1, before2, score1)
+        state.update((pid, after) for pid, after in zip(team1 + team2, after1 + after2) if pid in registered)
+    return state
+
+def replay_numpy(history, registered, np):
+    """Vectorized replay in waves of matches that share no registered players
+    
+    A match's wave is one more than the latest wave any of its players was in,
+    so each player's matches stay in order and a whole wave can be rated at
+    once with array operations. Unregistered players never move, so they
+    don't order the waves. The result equals the sequential replay.
+    """
+    if not history:
+        return {}
+    
+    # Dense player indices for every slot, matches laid out team 1 then team 2
+    index = {}
+    flat = [index.setdefault(pid, len(index)) for team1, team2, _ in history for pid in team1 + team2]
+    team_sizes = [n for team1, team2, _ in history for n in (len(team1), len(team2))]
+    tracked = [False] * len(index)
+    for pid, i in index.items():
+        tracked[i] = pid in registered
+    
+    last_wave = [-1] * len(index)
+    match_wave = []
+    pos = 0
+    for size1, size2 in zip(team_sizes[0::2], team_sizes[1::2]):
+        players = flat[pos:pos + size1 + size2]
+        pos += size1 + size2
+        wave = 1 + max(map(last_wave.__getitem__, players))
+        for i in players:
+            if tracked[i]:
+                last_wave[i] = wave
+        match_wave.append(wave)
+    
+    scores = [score1 for _, _, score1 in history]
+    group_sizes = np.array(team_sizes, dtype=np.int64)
+    slot_player = np.array(flat, dtype=np.int64)
+    slot_group = np.repeat(np.arange(len(team_sizes), dtype=np.int64), group_sizes)
+    
+    match_wave = np.array(match_wave, dtype=np.int64)
+    scores = np.array(scores, dtype=np.float64)
+    
+    # Order matches by wave (stable, so play order within a wave is kept) and
+    # lay their slots out contiguously, team 1 then team 2
+    match_order = np.argsort(match_wave, kind='stable')
+    group_order = np.empty(2 * len(match_order), dtype=np.int64)
+    group_order[0::2] = 2 * match_order
+    group_order[1::2] = 2 * match_order + 1
+    group_rank = np.empty_like(group_order)
+    group_rank[group_order] = np.arange(len(group_order))
+    slot_order = np.argsort(group_rank[slot_group], kind='stable')
+    slot_player = slot_player[slot_order]
+    
+    sizes = group_sizes[group_order]
+    group_starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    wave_sorted = match_wave[match_order]
+    scores = scores[match_order]
+    # Match boundaries of each wave
+    bounds = np.flatnonzero(np.diff(wave_sorted)) + 1
+    match_bounds = np.concatenate(([0], bounds, [len(wave_sorted)]))
+    
+    rating = np.full(len(last_wave), float(RATING_INITIAL))
+    games = np.zeros(len(last_wave), dtype=np.int64)
+    tracked = np.array(tracked, dtype=bool)
+    
+    for w in range(len(match_bounds) - 1):
+        m0, m1 = match_bounds[w], match_bounds[w + 1]
+        g0, g1 = 2 * m0, 2 * m1
+        s0 = group_starts[g0]
+        s1 = group_starts[g1] if g1 < len(group_starts) else len(slot_player)
+        players = slot_player[s0:s1]
+        wave_sizes = sizes[g0:g1]
+        
+        means = np.add.reduceat(rating[players], group_starts[g0:g1] - s0) / wave_sizes
+        expected1 = 1.0 / (1.0 + 10 ** ((means[1::2] - means[0::2]) / 400.0))
+        surprise = scores[m0:m1] - expected1
+        per_group = np.empty(g1 - g0)
+        per_group[0::2] = surprise
+        per_group[1::2] = -surprise
+        
+        k = np.where(games[players] < RATING_PROVISIONAL_GAMES, RATING_PROVISIONAL_K, RATING_K)
+        moves = tracked[players]
+        rating[players] += k * np.repeat(per_group, wave_sizes) * moves
+        games[players] += moves
+    
+    ids = [None] * len(index)
+    for pid, i in index.items():
+        ids[i] = pid
+    return {pid: (float(r), int(g)) for pid, r, g, keep in
+            zip(ids, rating.tolist(), games.tolist(), tracked.tolist()) if keep}
+
+def history_version(conn):
+    """Moves whenever a match finishes or is archived"""
+    return tuple(conn.execute("SELECT COUNT(*), SUM(id) FROM matches WHERE status = 'finished'").fetchone())
+
+def replay_ratings(conn, attempts=3):
+    """Recompute every player's rating from the full match history
+    
+    Uses the NumPy wave replay when NumPy is installed, else the sequential
+    loop. The history is read without a lock, so the write only goes ahead
+    if no match finished meanwhile (its rating change would be lost);
+    otherwise the replay starts over, up to attempts times. Returns a
+    summary dict; the caller's connection is committed.
+    """
+    from seasons import archived_seasons, attached, season_path
+    
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    
+    for attempt in range(1, attempts + 1):
+        started = time.perf_counter()
+        version = history_version(conn)
+        # Archived seasons first, oldest to newest, then the main database
+        history = []
+        for season in archived_seasons(conn):
+            with attached(conn, season_path(season['file'])) as schema:
+                history.extend(load_history(conn, schema))
+        history.extend(load_history(conn))
+        registered = {row[0] for row in conn.execute('SELECT discord_id FROM players')}
+        loaded = time.perf_counter()
+        
+        state = replay_numpy(history, registered, numpy) if numpy is not None else replay_python(history, registered)
+        computed = time.perf_counter()
+        
+        conn.execute('BEGIN IMMEDIATE')
+        if history_version(conn) != version:
+            conn.rollback()
+            logger.warning(f"Matches finished during rating replay attempt {attempt}; starting over")
+            continue
+        conn.execute('UPDATE players SET rating = ?, rating_games = 0', (RATING_INITIAL,))
+        conn.executemany(
+            'UPDATE players SET rating = ?, rating_games = ? WHERE discord_id = ?',
+            ((r, g, pid) for pid, (r, g) in state.items())
+        )
+        conn.commit()
+        
+        summary = {
+            "matches": len(history),
+            "players": len(state),
+            "engine": "numpy" if numpy is not None else "python",
+            "attempts": attempt,
+            "load_s": round(loaded - started, 3),
+            "compute_s": round(computed - loaded, 3),
+            "write_s": round(time.perf_counter() - computed, 3)
+        }
+        logger.info(f"Replayed ratings: {summary}")
+        return summary
+    
+    raise RuntimeError(f"Matches kept finishing during {attempts} rating replays")
+
+def main():
+    import argparse
+    import sqlite3
+    from config import DATABASE
+    
+    parser = argparse.ArgumentParser(description="Recompute player ratings from every finished match")
+    parser.add_argument('--db', default=DATABASE)
+    args = parser.parse_args()
+    
+    conn = sqlite3.connect(args.db)
+    print(json.dumps(replay_ratings(conn)))
+    conn.close()
+
+if __name__ == '__main__':
+    main()
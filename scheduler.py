@@ -0,0 +1,172 @@
+# scheduler.py - In-process scheduler for periodic maintenance jobs
+import os
+import time
+import random
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from metrics import registry
+from config import SCHEDULER_LOCK_PATH, logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so every process leads
+    fcntl = None
+
+class Job:
+    """A named job with its interval, jitter and run statistics"""
+    
+    def __init__(self, name, func, interval, jitter=0.1, leader_only=True, initial_delay=None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.leader_only = leader_only
+        self.next_run = time.monotonic() + (interval if initial_delay is None else initial_delay)
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_run_at = None
+        self.last_duration_ms = None
+        self.max_duration_ms = 0.0
+        self.last_error = None
+    
+    def schedule_next(self):
+        # Jitter spreads jobs that share an interval so they don't all fire together
+        spread = self.interval * self.jitter
+        self.next_run = time.monotonic() + self.interval + random.uniform(-spread, spread)
+    
+    def snapshot(self):
+        return {
+            "interval": self.interval,
+            "leader_only": self.leader_only,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped_overlaps": self.skipped,
+            "last_run_at": self.last_run_at,
+            "last_duration_ms": self.last_duration_ms,
+            "max_duration_ms": round(self.max_duration_ms, 2),
+            "last_error": self.last_error,
+            "next_run_in": round(max(0, self.next_run - time.monotonic()), 1)
+        }
+
+class Scheduler:
+    """Runs jobs on a small pool; leader-only jobs run in one process per host
+    
+    Leadership is an exclusive flock on lock_path. The kernel releases it when
+    the leading process exits, and another worker takes over on its next tick.
+    """
+    
+    def __init__(self, lock_path, tick=1.0, workers=2):
+        self.lock_path = lock_path
+        self.tick = tick
+        self.workers = workers
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.executor = None
+        self.lock_file = None
+        self.is_leader = False
+        self.next_leader_attempt = 0.0
+    
+    def add(self, name, func, interval, jitter=0.1, leader_only=True, initial_delay=None):
+        """Register func to run every interval seconds (+/- jitter as a fraction)"""
+        with self.lock:
+            self.jobs[name] = Job(name, func, interval, jitter, leader_only, initial_delay)
+    
+    def try_lead(self):
+        """Take the leader lock if no other live process holds it"""
+        if self.is_leader:
+            return True
+        if fcntl is None:
+            self.is_leader = True
+            return True
+        
+        try:
+            if self.lock_file is None:
+                self.lock_file = open(self.lock_path, 'a+')
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        
+        self.is_leader = True
+        self.lock_file.seek(0)
+        self.lock_file.truncate()
+        self.lock_file.write(str(os.getpid()))
+        self.lock_file.flush()
+        logger.info(f"Scheduler leader is pid {os.getpid()}")
+        return True
+    
+    def start(self):
+        if self.thread is not None:
+            return
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='scheduler')
+        self.thread = threading.Thread(target=self.loop, name='scheduler', daemon=True)
+        self.thread.start()
+    
+    def loop(self):
+        while not self.stopping.wait(self.tick):
+            now = time.monotonic()
+            if not self.is_leader and now >= self.next_leader_attempt:
+                self.next_leader_attempt = now + 10
+                self.try_lead()
+            
+            with self.lock:
+                due = [job for job in self.jobs.values() if job.next_run <= now]
+            for job in due:
+                if job.leader_only and not self.is_leader:
+                    job.schedule_next()
+                    continue
+                # Overlap prevention: a job still running from its last slot skips this one
+                if job.running:
+                    job.skipped += 1
+                    job.schedule_next()
+                    logger.warning(f"Scheduler job {job.name} still running - skipping this run")
+                    continue
+                job.running = True
+                job.schedule_next()
+                self.executor.submit(self.run_job, job)
+    
+    def run_job(self, job):
+        started = time.perf_counter()
+        result = "ok"
+        try:
+            job.func()
+            job.last_error = None
+        except Exception as e:
+            result = "error"
+            job.failures += 1
+            job.last_error = str(e)
+            logger.error(f"Scheduler job {job.name} failed: {e}")
+        finally:
+            elapsed = time.perf_counter() - started
+            job.runs += 1
+            job.running = False
+            job.last_run_at = datetime.utcnow().isoformat()
+            job.last_duration_ms = round(elapsed * 1000, 2)
+            job.max_duration_ms = max(job.max_duration_ms, elapsed * 1000)
+            registry.inc("sot_scheduler_job_runs_total", (("job", job.name), ("result", result)))
+            registry.observe("sot_scheduler_job_duration_seconds", (("job", job.name),), elapsed)
+    
+    def stop(self, timeout=10):
+        """Stop scheduling, wait for running jobs, and give up leadership"""
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        if self.lock_file is not None:
+            # Closing the file releases the flock for the next leader
+            self.lock_file.close()
+            self.lock_file = None
+        self.is_leader = False
+    
+    def get_stats(self):
+        with self.lock:
+            jobs = {name: job.snapshot() for name, job in self.jobs.items()}
+        return {"leader": self.is_leader, "pid": os.getpid(), "jobs": jobs}
+
+scheduler = Scheduler(SCHEDULER_LOCK_PATH)
@@ -0,0 +1,237 @@
+# seasons.py - Move finished seasons' matches into per-season archive files
+"""
+Seasons are fixed-length periods (config.season_bounds). Once a season has
+been over for SEASON_ARCHIVE_GRACE_HOURS, its matches, match_stats and
+player_history rows are copied into SEASON_ARCHIVE_DIR/season_NNN.db and
+deleted from the main database, which then only holds recent seasons.
+Lifetime totals on players and the hourly/daily/weekly rollups stay put.
+
+Each archive also gets season_totals (one row per player) and season_ranks
+(metric, rank) -> player, so an archived leaderboard page is a primary-key
+range scan at any offset. Archives are read by ATTACHing them to the
+caller's connection for the one query that needs them.
+
+The copy and the delete are separate transactions: a crash in between
+leaves rows in both files, and the next run skips the copied ones and
+finishes the delete.
+"""
+import os
+import time
+import calendar
+from contextlib import contextmanager
+from datetime import datetime
+from config import SEASON_ARCHIVE_DIR, SEASON_ARCHIVE_GRACE_HOURS, season_bounds, logger
+from database import get_db_connection, window_entry
+from window_boards import WINDOW_METRICS, board_key
+
+ARCHIVED_TABLES = ("matches", "match_stats", "player_history")
+SEASON_METRICS = WINDOW_METRICS + ("rating",)
+
+def season_file(number):
+    return f"season_{number:03d}.db"
+
+def season_path(file):
+    return os.path.join(SEASON_ARCHIVE_DIR, file)
+
+def season_range(number):
+    """(start, end) epoch seconds of season number"""
+    current, start, end = season_bounds()
+    starts_at = start + (number - current) * (end - start)
+    return starts_at, starts_at + (end - start)
+
+def timestamp_text(ts):
+    """Epoch seconds as matches.ended_at text, for range comparisons"""
+    return datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+
+@contextmanager
+def attached(conn, path, alias='archive'):
+    """ATTACH an archive file to conn for the duration of the block
+    
+    A transaction the block left open is rolled back first; DETACH fails
+    while the archive is locked, which would hide the original error and
+    leave it attached to a long-lived connection.
+    """
+    conn.execute(f'ATTACH DATABASE ? AS {alias}', (path,))
+    try:
+        yield alias
+    finally:
+        connection = getattr(conn, 'connection', conn)
+        if connection.in_transaction:
+            connection.rollback()
+        conn.execute(f'DETACH DATABASE {alias}')
+
+SEASON_COLUMNS = ("number", "starts_at", "ends_at", "file", "matches", "players", "archived_at")
+
+def archived_seasons(conn):
+    return [dict(zip(SEASON_COLUMNS, row))
+            for row in conn.execute(f'SELECT {", ".join(SEASON_COLUMNS)} FROM seasons ORDER BY number')]
+
+# =============================================================================
+# ARCHIVING
+# =============================================================================
+
+def create_archive_schema(conn, alias):
+    """Mirror the main database's tables (including added columns) in the archive"""
+    for name, sql in conn.execute(
+        f"SELECT name, sql FROM main.sqlite_master WHERE type = 'table' AND name IN ({','.join('?' * len(ARCHIVED_TABLES))})",
+        ARCHIVED_TABLES
+    ).fetchall():
+        conn.execute(sql.replace(f'CREATE TABLE {name}', f'CREATE TABLE IF NOT EXISTS {alias}.{name}', 1))
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {alias}.season_totals (
+            player_id TEXT PRIMARY KEY,
+            name TEXT,
+            matches INTEGER,
+            kills INTEGER,
+            deaths INTEGER,
+            assists INTEGER,
+            wins INTEGER,
+            losses INTEGER,
+            rating REAL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {alias}.season_ranks (
+            metric TEXT,
+            rank INTEGER,
+            player_id TEXT,
+            PRIMARY KEY (metric, rank)
+        ) WITHOUT ROWID
+    ''')
+
+def build_season_totals(conn, alias):
+    """Recompute season_totals and season_ranks from the archived matches"""
+    ratings = {row[0]: row[1] for row in conn.execute(f'''
+        SELECT player_id, rating, MAX(ts) FROM {alias}.player_history
+        WHERE rating IS NOT NULL GROUP BY player_id
+    ''')}
+    totals = conn.execute(f'''
+        SELECT s.player_id,
+               COALESCE((SELECT in_game_name FROM main.players WHERE discord_id = s.player_id), MAX(s.player_name)),
+               COUNT(*), SUM(s.kills), SUM(s.deaths), SUM(s.assists),
+               SUM(m.winner = ('team' || s.team)),
+               SUM(m.winner != 'draw' AND m.winner != ('team' || s.team))
+        FROM {alias}.match_stats s JOIN {alias}.matches m ON m.match_id = s.match_id
+        GROUP BY s.player_id
+    ''').fetchall()
+    rows = [tuple(row) + (ratings.get(row[0]),) for row in totals]
+    
+    ranks = []
+    for metric in SEASON_METRICS:
+        keys = []
+        for player_id, _, _, kills, deaths, _, wins, losses, rating in rows:
+            if metric == "rating":
+                keys.append((-rating, -(kills or 0), player_id) if rating is not None else None)
+            else:
+                keys.append(board_key(metric, player_id, (kills or 0, deaths or 0, wins or 0, losses or 0)))
+        ranks.extend((metric, rank, key[2]) for rank, key in enumerate(sorted(k for k in keys if k), 1))
+    
+    conn.execute(f'DELETE FROM {alias}.season_totals')
+    conn.execute(f'DELETE FROM {alias}.season_ranks')
+    conn.executemany(f'INSERT INTO {alias}.season_totals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    conn.executemany(f'INSERT INTO {alias}.season_ranks VALUES (?, ?, ?)', ranks)
+    return len(rows)
+
+def archive_season(conn, number):
+    """Move one finished season out of the main database; returns its summary"""
+    starts_at, ends_at = season_range(number)
+    file = season_file(number)
+    os.makedirs(SEASON_ARCHIVE_DIR, exist_ok=True)
+    in_season = "status = 'finished' AND COALESCE(ended_at, started_at) >= ? AND COALESCE(ended_at, started_at) < ?"
+    bounds = (timestamp_text(starts_at), timestamp_text(ends_at))
+    
+    pending = conn.execute(f'SELECT COUNT(*) FROM main.matches WHERE {in_season}', bounds).fetchone()[0]
+    if not pending:
+        return None
+    
+    with attached(conn, season_path(file)) as alias:
+        create_archive_schema(conn, alias)
+        conn.commit()
+        
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute(f'INSERT OR IGNORE INTO {alias}.matches SELECT * FROM main.matches WHERE {in_season}', bounds)
+        conn.execute(f'''
+            INSERT OR IGNORE INTO {alias}.match_stats SELECT * FROM main.match_stats
+            WHERE match_id IN (SELECT match_id FROM main.matches WHERE {in_season})
+        ''', bounds)
+        conn.execute(f'''
+            INSERT OR IGNORE INTO {alias}.player_history SELECT * FROM main.player_history
+            WHERE match_id IN (SELECT match_id FROM {alias}.matches)
+        ''')
+        players = build_season_totals(conn, alias)
+        matches = conn.execute(f'SELECT COUNT(*) FROM {alias}.matches').fetchone()[0]
+        conn.commit()
+        
+        # Only rows the archive holds: a late report for the season can land
+        # between the two transactions and waits for the next run
+        conn.execute('BEGIN IMMEDIATE')
+        archived = f'SELECT match_id FROM {alias}.matches'
+        conn.execute(f'DELETE FROM main.match_stats WHERE match_id IN ({archived})')
+        moved = conn.execute(f'DELETE FROM main.matches WHERE match_id IN ({archived})').rowcount
+        conn.execute(f'DELETE FROM main.player_history WHERE match_id IN ({archived})')
+        conn.execute('''
+            INSERT OR REPLACE INTO main.seasons (number, starts_at, ends_at, file, matches, players)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (number, starts_at, ends_at, file, matches, players))
+        conn.commit()
+    
+    logger.info(f"Archived season {number}: moved {moved} matches to {file} ({matches} matches, {players} players)")
+    return {"season": number, "file": file, "moved": moved, "matches": matches, "players": players}
+
+def archive_seasons(now=None):
+    """Scheduler job: archive every finished season still in the main database"""
+    now = int(now or time.time())
+    conn = get_db_connection()
+    try:
+        oldest = conn.execute('''
+            SELECT MIN(COALESCE(ended_at, started_at)) FROM matches WHERE status = 'finished'
+        ''').fetchone()[0]
+        if oldest is None:
+            return []
+        first = season_bounds(calendar.timegm(datetime.strptime(oldest[:19], '%Y-%m-%d %H:%M:%S').timetuple()))[0]
+        last = season_bounds(now - SEASON_ARCHIVE_GRACE_HOURS * 3600)[0] - 1
+        archived = [archive_season(conn, number) for number in range(first, last + 1)]
+        return [summary for summary in archived if summary]
+    except Exception as e:
+        logger.error(f"Season archive error: {e}")
+        if conn.in_transaction:
+            conn.rollback()
+        return None
+
+# =============================================================================
+# ARCHIVED LEADERBOARDS
+# =============================================================================
+
+def get_season_leaderboard_page(number, metric='kills', offset=0, limit=10):
+    """One page of an archived season's leaderboard as (players on the board, entries),
+    or None if the season isn't archived
+    """
+    if metric not in SEASON_METRICS:
+        metric = 'kills'
+    
+    try:
+        conn = get_db_connection()
+        season = conn.execute('SELECT file FROM seasons WHERE number = ?', (number,)).fetchone()
+        if season is None:
+            return None
+        
+        with attached(conn, season_path(season[0])) as alias:
+            total = conn.execute(f'SELECT MAX(rank) FROM {alias}.season_ranks WHERE metric = ?', (metric,)).fetchone()[0]
+            rows = conn.execute(f'''
+                SELECT r.rank, t.name, t.kills, t.deaths, t.wins, t.losses, t.matches, t.rating
+                FROM {alias}.season_ranks r JOIN {alias}.season_totals t ON t.player_id = r.player_id
+                WHERE r.metric = ? AND r.rank > ? AND r.rank <= ?
+                ORDER BY r.rank
+            ''', (metric, offset, offset + limit)).fetchall()
+        
+        entries = []
+        for rank, name, kills, deaths, wins, losses, matches, rating in rows:
+            entry = window_entry(rank, name, kills or 0, deaths or 0, wins or 0, losses or 0)
+            entry["matches"] = matches
+            entry["rating"] = round(rating) if rating is not None else None
+            entries.append(entry)
+        return total or 0, entries
+    
+    except Exception as e:
+        logger.error(f"Error getting season {number} {metric} leaderboard: {e}")
+        return 0, []
@@ -0,0 +1,153 @@
+# sql_profiler.py - Opt-in SQL statement profiler built on sqlite3 trace callbacks
+import re
+import json
+import sqlite3
+import threading
+from config import DATABASE, SQL_PROFILE_PATH, logger
+
+# Literals and IN-lists collapse so statements group by shape, not by values
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+WHITESPACE = re.compile(r"\s+")
+FULL_SCAN = re.compile(r"SCAN (?:TABLE )?(\w+)")
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'WITH', 'INSERT')
+
+def normalize(sql):
+    """Reduce a statement to its shape: literals become ?, whitespace collapses"""
+    shape = STRING_LITERAL.sub('?', sql)
+    shape = NUMBER_LITERAL.sub('?', shape)
+    shape = IN_LIST.sub('(?...)', shape)
+    return WHITESPACE.sub(' ', shape).strip()
+
+class StatementStats:
+    """Aggregates for one statement shape"""
+    
+    def __init__(self, shape, sample):
+        self.shape = shape
+        self.sample = sample
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.plan = None
+        self.full_scans = []
+        self.temp_sorts = 0
+    
+    def to_dict(self):
+        return {
+            "statement": self.shape,
+            "count": self.count,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "avg_ms": round(self.total_seconds * 1000 / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "rows": self.rows,
+            "plan": self.plan,
+            "full_scans": self.full_scans,
+            "temp_sorts": self.temp_sorts
+        }
+
+class SQLProfiler:
+    """Per-shape statement stats collected from every profiled connection"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.local = threading.local()
+    
+    def install(self, conn, database):
+        """Start profiling a connection to the given database file"""
+        self.local.database = database
+        conn.set_trace_callback(self.on_statement)
+    
+    def on_statement(self, sql):
+        """Trace callback: SQLite is about to run sql (with bound values expanded)"""
+        if getattr(self.local, 'explaining', False):
+            return
+        
+        shape = normalize(sql)
+        with self.lock:
+            stats = self.stats.get(shape)
+            if stats is None:
+                stats = self.stats[shape] = StatementStats(shape, sql)
+            stats.count += 1
+        self.local.current = stats
+    
+    def observe(self, seconds, rows=0):
+        """Charge time (and rows returned) to the statement this thread last ran"""
+        stats = getattr(self.local, 'current', None)
+        if stats is None:
+            return
+        with self.lock:
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.rows += rows
+            needs_plan = stats.plan is None
+            if needs_plan:
+                stats.plan = []
+        if needs_plan:
+            self.explain(stats)
+    
+    def explain(self, stats):
+        """Run EXPLAIN QUERY PLAN the first time a shape is seen and flag table scans"""
+        if not stats.sample.lstrip().upper().startswith(EXPLAINABLE):
+            return
+        
+        self.local.explaining = True
+        try:
+            # A separate, untraced connection so the plan lookup doesn't profile itself
+            database = getattr(self.local, 'database', DATABASE)
+            conns = self.local.__dict__.setdefault('explain_conns', {})
+            if database not in conns:
+                conns[database] = sqlite3.connect(database)
+            conn = conns[database]
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {stats.sample}")]
+        except sqlite3.Error as e:
+            plan = [f"unavailable: {e}"]
+        finally:
+            self.local.explaining = False
+        
+        # "SCAN players" is a full table scan; "SCAN ... USING INDEX" and SEARCH are not
+        full_scans = []
+        for detail in plan:
+            match = FULL_SCAN.match(detail)
+            if match and ' USING ' not in detail and match.group(1) != 'CONSTANT':
+                full_scans.append(match.group(1))
+        
+        with self.lock:
+            stats.plan = plan
+            stats.full_scans = full_scans
+            stats.temp_sorts = sum(1 for detail in plan if 'TEMP B-TREE' in detail)
+        if full_scans:
+            logger.warning(f"Full table scan on {', '.join(full_scans)}: {stats.shape}")
+    
+    def report(self, sort='total_ms', limit=50):
+        """Statement stats, most expensive first"""
+        with self.lock:
+            rows = [stats.to_dict() for stats in self.stats.values()]
+        rows.sort(key=lambda r: r.get(sort, 0), reverse=True)
+        return rows[:limit] if limit else rows
+    
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+        self.local.current = None
+    
+    def dump(self):
+        """Log the top statements and write the full report to SQL_PROFILE_PATH"""
+        rows = self.report(limit=0)
+        if not rows:
+            return
+        for row in rows[:10]:
+            scans = f" FULL SCAN {','.join(row['full_scans'])}" if row['full_scans'] else ""
+            logger.info(f"SQL {row['total_ms']:.1f}ms total, {row['count']}x, max {row['max_ms']:.1f}ms, "
+                        f"{row['rows']} rows{scans}: {row['statement'][:200]}")
+        if SQL_PROFILE_PATH:
+            try:
+                with open(SQL_PROFILE_PATH, 'w') as f:
+                    json.dump(rows, f, indent=2)
+                logger.info(f"SQL profile written to {SQL_PROFILE_PATH}")
+            except OSError as e:
+                logger.error(f"Error writing SQL profile: {e}")
+
+profiler = SQLProfiler()
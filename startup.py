@@ -0,0 +1,60 @@
+# startup.py - Startup phase timing and readiness state
+import time
+import threading
+from contextlib import contextmanager
+
+class StartupReport:
+    """Wall time per startup phase, and whether the app can serve traffic yet"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.phases = []
+        self.ready = False
+        self.ready_ms = None
+        self.errors = {}
+    
+    @contextmanager
+    def phase(self, name):
+        """Time a startup phase; an exception is recorded and re-raised"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            with self.lock:
+                self.errors[name] = str(e)
+            raise
+        finally:
+            with self.lock:
+                self.phases.append((name, (time.perf_counter() - started) * 1000,
+                                    threading.current_thread().name))
+    
+    def record(self, name, started):
+        """Record a phase that began at a perf_counter value taken earlier"""
+        with self.lock:
+            self.phases.append((name, (time.perf_counter() - started) * 1000,
+                                threading.current_thread().name))
+    
+    def mark_ready(self):
+        with self.lock:
+            if not self.ready:
+                self.ready = True
+                self.ready_ms = (time.perf_counter() - self.started) * 1000
+    
+    def summary(self):
+        """Phases joined for a single log line"""
+        with self.lock:
+            return " → ".join(f"{name} {ms:.0f}ms" for name, ms, _ in self.phases)
+    
+    def snapshot(self):
+        with self.lock:
+            return {
+                "ready": self.ready,
+                "ready_ms": round(self.ready_ms, 1) if self.ready_ms is not None else None,
+                "uptime_s": round(time.perf_counter() - self.started, 1),
+                "phases": [{"name": name, "ms": round(ms, 1), "thread": thread}
+                           for name, ms, thread in self.phases],
+                "errors": dict(self.errors)
+            }
+
+startup = StartupReport()
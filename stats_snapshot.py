@@ -0,0 +1,381 @@
+# stats_snapshot.py - Column-oriented in-memory copy of player stats for analytics
+"""
+Holds every player's stats as NumPy columns so sorts, filters and aggregates
+run as vectorized passes instead of SQLite scans plus per-row dicts.
+
+Leaderboards keep a maintained ordering per (guild, metric): an array of
+row indices sorted by the metric, patched in place when players change, so
+any page is a slice whatever its offset.
+
+A scheduler job loads the snapshot and reloads it when the shared
+'player_stats' version moves (another worker wrote). The worker that makes
+a write patches just the affected rows with refresh_players/remove_player.
+Without NumPy the snapshot never becomes ready and callers stay on SQL.
+"""
+import threading
+from bisect import bisect_left
+from config import LEADERBOARD_MIN_GAMES, logger
+
+# Imported by load_numpy on the first load, so importing this module stays cheap
+np = None
+
+def load_numpy():
+    """Import NumPy into the module on first use; False if it isn't installed"""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+INT_COLUMNS = ("id", "total_kills", "total_deaths", "wins", "losses", "prestige", "rating_games")
+FLOAT_COLUMNS = ("rating",)
+TEXT_COLUMNS = ("discord_id", "discord_name", "in_game_name", "api_key", "server_id")
+SELECT_COLUMNS = INT_COLUMNS + FLOAT_COLUMNS + TEXT_COLUMNS
+
+# Sort keys on top of the stored columns
+DERIVED = ("kd", "win_rate", "games")
+SORT_KEYS = ("kills", "deaths", "wins", "losses", "prestige", "rating") + DERIVED
+COLUMN_ALIASES = {"kills": "total_kills", "deaths": "total_deaths"}
+
+# Summed per guild (and overall) for get_global_stats
+TOTAL_COLUMNS = ("total_kills", "total_deaths", "wins", "losses")
+
+# Leaderboard metrics; each board is ordered by the metric, then kills, then id
+LEADERBOARD_METRICS = ("kd", "kills", "wins", "winrate", "prestige", "rating")
+
+class StatsSnapshot:
+    """Player stats as parallel arrays; row i of every column is one player"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.columns = None
+        self.text = None
+        self.active = None
+        self.size = 0
+        self.rows = {}
+        self.rankings = {}
+        self.totals = {}
+        self.version = None
+    
+    @property
+    def ready(self):
+        return self.columns is not None
+    
+    # =========================================================================
+    # LOADING AND INCREMENTAL UPDATES
+    # =========================================================================
+    
+    def load(self, conn, version=None):
+        """Replace the snapshot with the whole players table (a no-op without NumPy)"""
+        if not load_numpy():
+            return
+        rows = conn.execute(f'SELECT {", ".join(SELECT_COLUMNS)} FROM players ORDER BY id').fetchall()
+        fields = list(zip(*rows)) if rows else [() for _ in SELECT_COLUMNS]
+        values = dict(zip(SELECT_COLUMNS, fields))
+        
+        columns = {name: np.array([v or 0 for v in values[name]], dtype=np.int64) for name in INT_COLUMNS}
+        columns.update({name: np.array([v or 0.0 for v in values[name]], dtype=np.float64) for name in FLOAT_COLUMNS})
+        text = {name: list(values[name]) for name in TEXT_COLUMNS}
+        
+        with self.lock:
+            self.columns = columns
+            self.text = text
+            self.active = np.ones(len(rows), dtype=bool)
+            self.size = len(rows)
+            self.rows = {discord_id: i for i, discord_id in enumerate(text["discord_id"])}
+            self.rankings = {(None, metric): self.build_ranking(metric) for metric in LEADERBOARD_METRICS}
+            self.totals = self.build_totals()
+            self.version = version
+        logger.info(f"Loaded stats snapshot of {len(rows)} players")
+    
+    def grow(self, needed):
+        """Make room for needed rows, doubling capacity like a list"""
+        capacity = len(self.active)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 16)
+        for name, column in self.columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+        active = np.zeros(capacity, dtype=bool)
+        active[:self.size] = self.active[:self.size]
+        self.active = active
+    
+    def refresh_players(self, conn, discord_ids, version=None):
+        """Re-read the given players after a write; new ones are appended
+        
+        version is the bumped 'player_stats' version, adopted if nothing else
+        changed in between.
+        """
+        if not self.ready or not discord_ids:
+            return
+        placeholders = ','.join('?' * len(discord_ids))
+        rows = conn.execute(
+            f'SELECT {", ".join(SELECT_COLUMNS)} FROM players WHERE discord_id IN ({placeholders})',
+            list(discord_ids)
+        ).fetchall()
+        
+        with self.lock:
+            seen = set()
+            changed = []
+            guilds = set()
+            for row in rows:
+                values = dict(zip(SELECT_COLUMNS, row))
+                i = self.rows.get(values["discord_id"])
+                if i is not None:
+                    guilds.add(self.text["server_id"][i])
+                    self.account(i, -1)
+                else:
+                    i = self.size
+                    self.grow(i + 1)
+                    self.size += 1
+                    self.rows[values["discord_id"]] = i
+                    for name in TEXT_COLUMNS:
+                        self.text[name].append(None)
+                for name in INT_COLUMNS + FLOAT_COLUMNS:
+                    self.columns[name][i] = values[name] or 0
+                for name in TEXT_COLUMNS:
+                    self.text[name][i] = values[name]
+                self.active[i] = True
+                self.account(i, 1)
+                seen.add(values["discord_id"])
+                changed.append(i)
+                guilds.add(values["server_id"])
+            for discord_id in set(discord_ids) - seen:
+                if discord_id in self.rows:
+                    i = self.rows[discord_id]
+                    self.account(i, -1)
+                    self.active[i] = False
+                    changed.append(i)
+                    guilds.add(self.text["server_id"][i])
+            self.update_rankings(changed, guilds)
+            self.adopt(version)
+    
+    def remove_player(self, player_id, version=None):
+        """Drop a deleted player (by players.id)"""
+        if not self.ready:
+            return
+        with self.lock:
+            matches = np.flatnonzero(self.columns["id"][:self.size] == player_id).tolist()
+            for i in matches:
+                self.account(i, -1)
+            self.active[matches] = False
+            self.update_rankings(matches, {self.text["server_id"][i] for i in matches})
+            self.adopt(version)
+    
+    def adopt(self, version):
+        if version is not None and self.version is not None and version == self.version + 1:
+            self.version = version
+    
+    def needs_reload(self, version):
+        return not self.ready or version != self.version
+    
+    # =========================================================================
+    # MAINTAINED LEADERBOARD ORDERINGS
+    # =========================================================================
+    
+    def metric_values(self, metric, rows):
+        """Sort value and board eligibility of metric for an array of row indices"""
+        c = self.columns
+        kills = c["total_kills"][rows]
+        games = c["wins"][rows] + c["losses"][rows]
+        if metric == "kd":
+            value, eligible = kills / np.maximum(c["total_deaths"][rows], 1), kills >= 1
+        elif metric == "kills":
+            value, eligible = kills, kills >= 1
+        elif metric == "wins":
+            value, eligible = c["wins"][rows], games >= 1
+        elif metric == "winrate":
+            value = np.divide(c["wins"][rows], games, out=np.zeros(len(rows)), where=games > 0)
+            eligible = games >= LEADERBOARD_MIN_GAMES
+        elif metric == "prestige":
+            value, eligible = c["prestige"][rows], games >= 1
+        else:
+            value, eligible = c["rating"][rows], c["rating_games"][rows] > 0
+        return value.astype(np.float64), eligible & self.active[rows]
+    
+    def sort_key(self, metric, i):
+        """Scalar ordering key of row i on a board: metric desc, kills desc, id asc"""
+        c = self.columns
+        kills = int(c["total_kills"][i])
+        if metric == "kd":
+            value = kills / max(int(c["total_deaths"][i]), 1)
+        elif metric == "kills":
+            value = kills
+        elif metric == "winrate":
+            wins = int(c["wins"][i])
+            games = wins + int(c["losses"][i])
+            value = wins / games if games else 0.0
+        else:
+            value = c["wins" if metric == "wins" else metric][i].item()
+        return (-value, -kills, int(c["id"][i]))
+    
+    def build_ranking(self, metric, guild=None):
+        """Row indices on the board, best first; O(n log n), done once per load"""
+        rows = np.arange(self.size)
+        value, eligible = self.metric_values(metric, rows)
+        if guild is not None:
+            eligible &= np.fromiter((s == guild for s in self.text["server_id"][:self.size]), bool, self.size)
+        candidates = rows[eligible]
+        order = np.lexsort((self.columns["id"][candidates], -self.columns["total_kills"][candidates],
+                            -value[eligible]))
+        return candidates[order]
+    
+    def update_rankings(self, changed, guilds):
+        """Move changed rows to their new places on every affected board"""
+        if not changed:
+            return
+        changed = np.array(sorted(set(changed)), dtype=np.int64)
+        moved = np.zeros(self.size, dtype=bool)
+        moved[changed] = True
+        for (guild, metric), ranked in list(self.rankings.items()):
+            if guild is not None and guild not in guilds:
+                continue
+            base = ranked[~moved[ranked]]
+            _, eligible = self.metric_values(metric, changed)
+            if guild is not None:
+                eligible &= np.array([self.text["server_id"][i] == guild for i in changed.tolist()], dtype=bool)
+            key = lambda i: self.sort_key(metric, i)
+            entries = sorted(changed[eligible].tolist(), key=key)
+            positions = [bisect_left(base, key(i), key=key) for i in entries]
+            self.rankings[(guild, metric)] = np.insert(base, positions, entries)
+    
+    def page(self, metric, offset=0, limit=10, guild=None):
+        """One leaderboard page as (total on the board, row dicts with rank)
+        
+        A board is built on first use (per guild) and maintained after that,
+        so the cost is O(limit) for any offset. Only guilds with active
+        players get one; any other guild id is an empty page, so arbitrary
+        ids can't grow the cache.
+        """
+        with self.lock:
+            if guild is not None and not (self.totals.get(guild) or [0])[-1]:
+                return 0, []
+            ranked = self.rankings.get((guild, metric))
+            if ranked is None:
+                ranked = self.rankings[(guild, metric)] = self.build_ranking(metric, guild)
+            rows = []
+            for rank, i in enumerate(ranked[offset:offset + limit].tolist(), offset + 1):
+                player = self.row(i)
+                player["rank"] = rank
+                rows.append(player)
+            return len(ranked), rows
+    
+    # =========================================================================
+    # QUERIES
+    # =========================================================================
+    
+    def column(self, name):
+        """A stored or derived column over the current rows"""
+        n = self.size
+        if name == "kd":
+            return self.columns["total_kills"][:n] / np.maximum(self.columns["total_deaths"][:n], 1)
+        if name == "games":
+            return self.columns["wins"][:n] + self.columns["losses"][:n]
+        if name == "win_rate":
+            games = self.columns["wins"][:n] + self.columns["losses"][:n]
+            return np.divide(self.columns["wins"][:n], games, out=np.zeros(n), where=games > 0)
+        return self.columns[COLUMN_ALIASES.get(name, name)][:n]
+    
+    def query(self, sort="kd", descending=True, limit=10, offset=0, min_kills=0, min_games=0, rated_only=False):
+        """Players matching the filters, ordered by sort (ties: more kills first)
+        
+        Returns (total matching, list of row dicts).
+        """
+        with self.lock:
+            n = self.size
+            mask = self.active[:n].copy()
+            if min_kills:
+                mask &= self.columns["total_kills"][:n] >= min_kills
+            if min_games:
+                mask &= self.column("games") >= min_games
+            if rated_only:
+                mask &= self.columns["rating_games"][:n] > 0
+            
+            candidates = np.flatnonzero(mask)
+            total = len(candidates)
+            key = self.column(sort)[candidates]
+            kills = self.columns["total_kills"][candidates]
+            if descending:
+                key, kills = -key, -kills
+            
+            if key.dtype.kind == 'i' and len(kills):
+                # Integer keys fold the kills tie-break into one exact sort key
+                key = key * (int(kills.max()) - int(kills.min()) + 1) + (kills - kills.min())
+            
+            # Only the first offset + limit rows need a full sort: partition on
+            # the sort key, keeping every row tied with the cut-off so the
+            # kills tie-break still sees them all
+            wanted = min(offset + limit, total)
+            if 0 < wanted < total:
+                cutoff = key[np.argpartition(key, wanted - 1)[wanted - 1]]
+                top = key <= cutoff
+                candidates, key, kills = candidates[top], key[top], kills[top]
+            order = candidates[np.lexsort((kills, key))][offset:offset + limit]
+            
+            return total, [self.row(i) for i in order.tolist()]
+    
+    def row(self, i):
+        player = {name: self.columns[name][i].item() for name in INT_COLUMNS + FLOAT_COLUMNS}
+        player.update({name: self.text[name][i] for name in TEXT_COLUMNS})
+        deaths = max(player["total_deaths"], 1)
+        games = player["wins"] + player["losses"]
+        player["kd"] = player["total_kills"] / deaths
+        player["win_rate"] = player["wins"] / games if games else 0.0
+        return player
+    
+    # =========================================================================
+    # AGGREGATES
+    # =========================================================================
+    
+    def build_totals(self):
+        """{None: overall, guild: per guild} sums of TOTAL_COLUMNS plus a player count"""
+        n = self.size
+        active = self.active[:n]
+        codes = {}
+        guild_of = np.array([codes.setdefault(s, len(codes)) for s in self.text["server_id"][:n]], dtype=np.int64)
+        weights = active.astype(np.int64)
+        per_guild = [np.bincount(guild_of, weights=self.columns[name][:n] * weights, minlength=len(codes))
+                     for name in TOTAL_COLUMNS]
+        counts = np.bincount(guild_of, weights=weights, minlength=len(codes))
+        
+        totals = {None: [int(self.columns[name][:n][active].sum()) for name in TOTAL_COLUMNS] + [int(active.sum())]}
+        for guild, code in codes.items():
+            if guild:
+                totals[guild] = [int(column[code]) for column in per_guild] + [int(counts[code])]
+        return totals
+    
+    def account(self, i, sign):
+        """Add (sign=1) or remove (sign=-1) an active row's share of the totals"""
+        if not self.active[i]:
+            return
+        values = [int(self.columns[name][i]) for name in TOTAL_COLUMNS] + [1]
+        guild = self.text["server_id"][i]
+        for key in ((None, guild) if guild else (None,)):
+            totals = self.totals.setdefault(key, [0] * (len(TOTAL_COLUMNS) + 1))
+            for n, value in enumerate(values):
+                totals[n] += sign * value
+    
+    def aggregate(self, guild=None):
+        """Totals across active players (of one guild), as get_global_stats reports them"""
+        with self.lock:
+            totals = self.totals.get(guild) or [0] * (len(TOTAL_COLUMNS) + 1)
+            result = dict(zip(TOTAL_COLUMNS, totals))
+            result["players"] = totals[-1]
+            return result
+
+stats_snapshot = StatsSnapshot()
+
+def refresh_stats_snapshot():
+    """Scheduler job: (re)load this worker's snapshot when it's missing or stale"""
+    if not load_numpy():
+        return
+    from database import get_db_connection, get_version
+    
+    version = get_version('player_stats')
+    if stats_snapshot.needs_reload(version):
+        stats_snapshot.load(get_db_connection(), version)
@@ -0,0 +1,196 @@
+# tracing.py - Lightweight in-process request tracing with tail sampling
+import os
+import json
+import time
+import random
+import logging
+import threading
+import itertools
+import logging.handlers
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from config import (
+    TRACE_ENABLED, TRACE_SLOW_MS, TRACE_SAMPLE_RATE, TRACE_BUFFER_SIZE, TRACE_MAX_SPANS,
+    TRACE_FILE, logger
+)
+
+span_ids = itertools.count(1)
+
+class Trace:
+    """One request: a root plus flat spans that point at their parent"""
+    
+    def __init__(self, name, method, path):
+        self.trace_id = f"{os.getpid():x}-{int(time.time() * 1000):x}-{random.getrandbits(24):06x}"
+        self.name = name
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow().isoformat()
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.spans = []
+        self.dropped_spans = 0
+        self.attributes = {}
+        self.status = None
+        self.duration_ms = None
+    
+    def add(self, span_id, parent_id, kind, name, started, seconds, attributes):
+        with self.lock:
+            if len(self.spans) >= TRACE_MAX_SPANS:
+                self.dropped_spans += 1
+                return
+            self.spans.append((span_id, parent_id, kind, name, started, seconds,
+                               threading.current_thread().name, attributes))
+    
+    def summary(self):
+        kinds = {}
+        for span in self.spans:
+            kind = kinds.setdefault(span[2], {"count": 0, "ms": 0.0})
+            kind["count"] += 1
+            kind["ms"] += span[5] * 1000
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 2),
+            "attributes": self.attributes,
+            "spans": len(self.spans),
+            "by_kind": {k: {"count": v["count"], "ms": round(v["ms"], 2)} for k, v in kinds.items()}
+        }
+    
+    def to_dict(self):
+        data = self.summary()
+        data["dropped_spans"] = self.dropped_spans
+        data["spans"] = [{
+            "id": span_id,
+            "parent": parent_id,
+            "kind": kind,
+            "name": " ".join(name.split())[:300],
+            "offset_ms": round((started - self.started) * 1000, 3),
+            "duration_ms": round(seconds * 1000, 3),
+            "thread": thread,
+            "attributes": attributes
+        } for span_id, parent_id, kind, name, started, seconds, thread, attributes in self.spans]
+        return data
+
+trace_local = threading.local()
+finished_traces = deque(maxlen=TRACE_BUFFER_SIZE)
+finished_lock = threading.Lock()
+
+def trace_file_logger():
+    """Rotating JSON-lines file for kept traces, when TRACE_FILE is set"""
+    if not TRACE_FILE:
+        return None
+    file_logger = logging.getLogger('traces')
+    file_logger.propagate = False
+    try:
+        handler = logging.handlers.RotatingFileHandler(TRACE_FILE, maxBytes=10 * 1024 * 1024, backupCount=3)
+    except OSError as e:
+        logger.error(f"Error opening trace file {TRACE_FILE}: {e}")
+        return None
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    file_logger.addHandler(handler)
+    return file_logger
+
+trace_file = trace_file_logger()
+
+# =============================================================================
+# TRACE CONTEXT
+# =============================================================================
+
+def begin_trace(name, method, path):
+    """Start a trace for the request on this thread"""
+    trace_local.trace = Trace(name, method, path) if TRACE_ENABLED else None
+    trace_local.stack = []
+
+def end_trace(status):
+    """Finish this thread's trace; keep it if it was slow, failed or sampled"""
+    trace = getattr(trace_local, 'trace', None)
+    trace_local.trace = None
+    if trace is None:
+        return
+    
+    trace.status = status
+    trace.duration_ms = (time.perf_counter() - trace.started) * 1000
+    # Tail sampling: the decision is made once the outcome is known
+    if trace.duration_ms < TRACE_SLOW_MS and status < 500 and random.random() >= TRACE_SAMPLE_RATE:
+        return
+    
+    with finished_lock:
+        finished_traces.append(trace)
+    if trace_file is not None:
+        trace_file.info(json.dumps(trace.to_dict(), default=str))
+
+def current_context():
+    """The active trace and span, for handing to worker threads"""
+    trace = getattr(trace_local, 'trace', None)
+    if trace is None:
+        return None
+    stack = getattr(trace_local, 'stack', None)
+    return trace, stack[-1] if stack else None
+
+def bind_context(context):
+    """Make this thread's spans children of another thread's span"""
+    if context is None:
+        trace_local.trace = None
+        trace_local.stack = []
+    else:
+        trace_local.trace = context[0]
+        trace_local.stack = [context[1]] if context[1] else []
+
+def set_attribute(key, value):
+    trace = getattr(trace_local, 'trace', None)
+    if trace is not None:
+        trace.attributes[key] = value
+
+# =============================================================================
+# SPANS
+# =============================================================================
+
+def add_span(kind, name, started, seconds, **attributes):
+    """Record an already-timed leaf span (started is a perf_counter value)"""
+    trace = getattr(trace_local, 'trace', None)
+    if trace is None:
+        return
+    stack = trace_local.stack
+    trace.add(next(span_ids), stack[-1] if stack else None, kind, name, started, seconds, attributes)
+
+@contextmanager
+def span(kind, name, **attributes):
+    """Time a block as a span; spans recorded inside it become its children"""
+    trace = getattr(trace_local, 'trace', None)
+    if trace is None:
+        yield
+        return
+    
+    stack = trace_local.stack
+    span_id = next(span_ids)
+    parent_id = stack[-1] if stack else None
+    stack.append(span_id)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stack.pop()
+        trace.add(span_id, parent_id, kind, name, started, time.perf_counter() - started, attributes)
+
+# =============================================================================
+# BROWSING
+# =============================================================================
+
+def get_traces(limit=50, min_ms=0):
+    """Kept traces, newest first"""
+    with finished_lock:
+        traces = list(finished_traces)
+    traces.reverse()
+    return [t.summary() for t in traces if t.duration_ms >= min_ms][:limit]
+
+def get_trace(trace_id):
+    with finished_lock:
+        for trace in finished_traces:
+            if trace.trace_id == trace_id:
+                return trace.to_dict()
+    return None
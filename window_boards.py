@@ -0,0 +1,240 @@
+# window_boards.py - Rolling daily/weekly/season leaderboards from rollup buckets
+"""
+Each window keeps the player_rollups buckets it spans in memory, keyed by
+bucket start, plus every player's running totals across them. When the
+clock moves a window, the buckets falling out subtract their counts from
+those totals; new matches add theirs through refresh_players. Nothing is
+rescanned from match_stats.
+
+Boards are sorted lists of (-value, -kills, player_id) keys per
+(guild, metric), patched with bisect as totals change, so any page is a
+list slice. Guild boards are built the first time they're asked for.
+
+Like the stats snapshot, a scheduler job loads the boards and reloads them
+when the shared 'player_stats' version moves under another worker.
+"""
+import time
+import threading
+from bisect import bisect_left, insort
+from config import LEADERBOARD_MIN_GAMES, season_bounds, logger
+
+# Window -> (rollup step, bucket width, buckets spanned); None spans the current season
+WINDOWS = {
+    "day": ("hour", 3600, 24),
+    "week": ("day", 86400, 7),
+    "season": ("day", 86400, None)
+}
+WINDOW_METRICS = ("kills", "kd", "wins", "winrate")
+
+ROLLUP_SQL = '''
+    SELECT r.player_id, r.bucket, r.kills, r.deaths, r.wins, r.losses, p.server_id
+    FROM player_rollups r JOIN players p ON p.discord_id = r.player_id
+    WHERE r.step = ? AND r.bucket >= ?
+'''
+
+def window_start(window, now):
+    """First bucket start inside window at time now"""
+    step, width, count = WINDOWS[window]
+    if count is None:
+        return season_bounds(now)[1]
+    return now - now % width - (count - 1) * width
+
+def board_key(metric, player_id, counts):
+    """Sort key of a player's window totals on a board, or None if not eligible"""
+    kills, deaths, wins, losses = counts
+    games = wins + losses
+    if metric == "kills":
+        eligible, value = kills >= 1, kills
+    elif metric == "kd":
+        eligible, value = kills >= 1, kills / max(deaths, 1)
+    elif metric == "wins":
+        eligible, value = games >= 1, wins
+    else:
+        eligible, value = games >= LEADERBOARD_MIN_GAMES, wins / games if games else 0.0
+    return (-value, -kills, player_id) if eligible else None
+
+class RollingWindow:
+    """One window: its buckets, each player's totals over them, and the boards"""
+    
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+        self.buckets = {}
+        self.totals = {}
+        self.guilds = {}
+        self.guild_players = {}
+        self.boards = {}
+    
+    def load(self, rows, start):
+        self.start = start
+        for player_id, bucket, kills, deaths, wins, losses, guild in rows:
+            counts = (kills or 0, deaths or 0, wins or 0, losses or 0)
+            self.buckets.setdefault(bucket, {})[player_id] = counts
+            totals = self.totals.setdefault(player_id, [0, 0, 0, 0])
+            for n, value in enumerate(counts):
+                totals[n] += value
+            self.guilds[player_id] = guild
+        for guild in self.guilds.values():
+            self.guild_players[guild] = self.guild_players.get(guild, 0) + 1
+        self.boards = {(None, metric): self.build_board(None, metric) for metric in WINDOW_METRICS}
+    
+    def build_board(self, guild, metric):
+        keys = (board_key(metric, player_id, counts) for player_id, counts in self.totals.items()
+                if guild is None or self.guilds.get(player_id) == guild)
+        return sorted(key for key in keys if key is not None)
+    
+    def set_totals(self, player_id, counts, guild):
+        """Move a player to new totals (None: off every board), patching the boards"""
+        old, old_guild = self.totals.get(player_id), self.guilds.get(player_id)
+        for (board_guild, metric), board in self.boards.items():
+            if old is not None and board_guild in (None, old_guild):
+                key = board_key(metric, player_id, old)
+                if key is not None:
+                    i = bisect_left(board, key)
+                    if i < len(board) and board[i] == key:
+                        del board[i]
+            if counts is not None and board_guild in (None, guild):
+                key = board_key(metric, player_id, counts)
+                if key is not None:
+                    insort(board, key)
+        if old is not None and (counts is None or guild != old_guild):
+            self.count_guild(old_guild, -1)
+        if counts is not None and (old is None or guild != old_guild):
+            self.count_guild(guild, 1)
+        if counts is None:
+            self.totals.pop(player_id, None)
+            self.guilds.pop(player_id, None)
+        else:
+            self.totals[player_id] = list(counts)
+            self.guilds[player_id] = guild
+    
+    def count_guild(self, guild, delta):
+        """Track players per guild; a guild that empties loses its boards"""
+        players = self.guild_players.get(guild, 0) + delta
+        if players > 0:
+            self.guild_players[guild] = players
+            return
+        self.guild_players.pop(guild, None)
+        for key in [key for key in self.boards if key[0] is not None and key[0] == guild]:
+            del self.boards[key]
+    
+    def advance(self, start):
+        """Slide the window forward: subtract every bucket that fell out of it"""
+        if start == self.start:
+            return
+        self.start = start
+        changed = {}
+        for bucket in [b for b in self.buckets if b < start]:
+            for player_id, counts in self.buckets.pop(bucket).items():
+                totals = changed.setdefault(player_id, list(self.totals[player_id]))
+                for n, value in enumerate(counts):
+                    totals[n] -= value
+        for player_id, totals in changed.items():
+            held = any(player_id in bucket for bucket in self.buckets.values())
+            self.set_totals(player_id, totals if held else None, self.guilds.get(player_id))
+    
+    def replace_players(self, player_ids, rows):
+        """Swap in freshly read buckets for these players (every bucket they have in the window)"""
+        fresh = {player_id: ([0, 0, 0, 0], self.guilds.get(player_id)) for player_id in player_ids}
+        for bucket in self.buckets.values():
+            for player_id in player_ids:
+                bucket.pop(player_id, None)
+        for player_id, bucket, kills, deaths, wins, losses, guild in rows:
+            if bucket < self.start:
+                continue
+            counts = (kills or 0, deaths or 0, wins or 0, losses or 0)
+            self.buckets.setdefault(bucket, {})[player_id] = counts
+            totals = fresh.setdefault(player_id, ([0, 0, 0, 0], guild))[0]
+            for n, value in enumerate(counts):
+                totals[n] += value
+            fresh[player_id] = (totals, guild)
+        for player_id, (totals, guild) in fresh.items():
+            held = any(player_id in bucket for bucket in self.buckets.values())
+            self.set_totals(player_id, totals if held else None, guild)
+    
+    def page(self, metric, offset, limit, guild):
+        # Unknown guild ids get an empty page rather than a cached empty board
+        if guild is not None and guild not in self.guild_players:
+            return 0, []
+        board = self.boards.get((guild, metric))
+        if board is None:
+            board = self.boards[(guild, metric)] = self.build_board(guild, metric)
+        return len(board), [(rank, key[2], tuple(self.totals[key[2]]))
+                            for rank, key in enumerate(board[offset:offset + limit], offset + 1)]
+
+class WindowBoards:
+    """Every window's boards, swapped wholesale on reload"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.windows = None
+        self.version = None
+    
+    @property
+    def ready(self):
+        return self.windows is not None
+    
+    def load(self, conn, version=None, now=None):
+        now = int(now or time.time())
+        windows = {}
+        for name, (step, _, _) in WINDOWS.items():
+            start = window_start(name, now)
+            windows[name] = RollingWindow(name)
+            windows[name].load(conn.execute(ROLLUP_SQL, (step, start)).fetchall(), start)
+        
+        with self.lock:
+            self.windows = windows
+            self.version = version
+        logger.info(f"Loaded window leaderboards ({', '.join(f'{n}: {len(w.totals)} players' for n, w in windows.items())})")
+    
+    def refresh_players(self, conn, player_ids, version=None, now=None):
+        """Re-read the given players' buckets after a match; version as in StatsSnapshot"""
+        if not self.ready or not player_ids:
+            return
+        now = int(now or time.time())
+        placeholders = ','.join('?' * len(player_ids))
+        fresh = {}
+        for name, (step, _, _) in WINDOWS.items():
+            start = window_start(name, now)
+            fresh[name] = (start, conn.execute(
+                f'{ROLLUP_SQL} AND r.player_id IN ({placeholders})', [step, start] + list(player_ids)
+            ).fetchall())
+        
+        with self.lock:
+            for name, (start, rows) in fresh.items():
+                self.windows[name].advance(start)
+                self.windows[name].replace_players(list(player_ids), rows)
+            self.adopt(version)
+    
+    def advance(self, now=None):
+        now = int(now or time.time())
+        with self.lock:
+            for name, window in self.windows.items():
+                window.advance(window_start(name, now))
+    
+    def adopt(self, version):
+        if version is not None and self.version is not None and version == self.version + 1:
+            self.version = version
+    
+    def needs_reload(self, version):
+        return not self.ready or version != self.version
+    
+    def page(self, window, metric, offset=0, limit=10, guild=None, now=None):
+        """(players on the board, [(rank, player_id, (kills, deaths, wins, losses)), ...])"""
+        now = int(now or time.time())
+        with self.lock:
+            rolling = self.windows[window]
+            rolling.advance(window_start(window, now))
+            return rolling.page(metric, offset, limit, guild)
+
+window_boards = WindowBoards()
+
+def refresh_window_boards():
+    """Scheduler job: (re)load this worker's boards when stale, else slide them forward"""
+    from database import get_db_connection, get_version
+    
+    version = get_version('player_stats')
+    if window_boards.needs_reload(version):
+        window_boards.load(get_db_connection(), version)
+    else:
+        window_boards.advance()